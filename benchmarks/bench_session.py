@@ -0,0 +1,79 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""bench_session.py - per-call latency with and without the pooled session
+
+Run from the top of the source tree::
+
+    python -m benchmarks.bench_session [calls]
+
+The "before" column replays what :meth:`seeddms.SeedDMS.rest_get` used to do
+(module level :func:`requests.get` with the cookie passed on every call, so
+every call opens a new connection). The "after" column uses
+:meth:`seeddms.SeedDMS.get_category` on a logged in client.
+"""
+
+__author__ = "John van Zantvoort"
+
+import sys
+import time
+import requests
+import seeddms
+
+from tests.standin import start_server, ok
+
+
+def timed(func, calls):
+    """call ``func`` ``calls`` times and return the latencies in ms."""
+    retv = list()
+    for _ in range(calls):
+        start = time.time()
+        func()
+        retv.append((time.time() - start) * 1000.0)
+    return sorted(retv)
+
+
+def report(label, latencies):
+    count = len(latencies)
+    mean = sum(latencies) / count
+    median = latencies[count // 2]
+    p95 = latencies[int(count * 0.95) - 1]
+    print "%-8s %8.3f %8.3f %8.3f" % (label, mean, median, p95)
+    return mean
+
+
+def main(calls=500):
+    server, baseurl = start_server()
+    server.routes['GET /categories/1'] = lambda handler, query: ok(
+        {'id': 1, 'name': 'category01'})
+
+    sdms = seeddms.SeedDMS(baseurl=baseurl, username='admin', password='admin')
+    sdms.do_login()
+    cookies = requests.utils.dict_from_cookiejar(sdms.cookies)
+    url = baseurl + '/categories/1'
+
+    def before():
+        requests.get(url, cookies=cookies).json()
+
+    def after():
+        sdms.get_category(1)
+
+    # warm up both paths
+    before()
+    after()
+
+    print "%d calls against %s" % (calls, baseurl)
+    print "%-8s %8s %8s %8s" % ('ms/call', 'mean', 'median', 'p95')
+    mean_before = report('before', timed(before, calls))
+    mean_after = report('after', timed(after, calls))
+    print "speedup  %8.2fx" % (mean_before / mean_after)
+
+    sdms.do_logout()
+    sdms.close()
+    server.shutdown()
+
+
+if __name__ == '__main__':
+    if len(sys.argv) > 1:
+        main(int(sys.argv[1]))
+    else:
+        main()
@@ -9,3 +9,10 @@ __license__ = "MIT"
 
 from .config import Config
 from .rest import SeedDMS
+from .asyncrest import AsyncSeedDMS
+from .bulk import BulkImporter
+from .export import Exporter
+from .search import batch_search
+from .tree import walk
+from .replica import Replica
+from .sessionpool import SessionPool
@@ -0,0 +1,168 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""asyncrest.py - non-blocking interface for the raw REST interfaces"""
+
+import time
+import threading
+from contextlib import contextmanager
+from multiprocessing.pool import ThreadPool
+
+from .rest import SeedDMS
+
+#: methods that return a lazy iterator, passed through unchanged; the
+#: requests are made by the thread that consumes the iterator
+ITERATORS = ('walk', 'iter_search', 'iter_search_by_attr')
+
+
+class AsyncSeedDMS(object):
+    """Non-blocking interface for SeedDMS
+
+    Every public method of :class:`seeddms.rest.SeedDMS` is available with
+    the same arguments, but returns an :class:`multiprocessing.pool.AsyncResult`
+    immediately instead of the result. Calls are run by a pool of
+    ``workers`` threads on one shared :class:`seeddms.rest.SeedDMS`, so URL
+    translation, result handling and the pooled keep-alive connections are
+    the same as for the blocking interface.
+
+    :param workers: number of requests in flight at the same time
+             (default: ``10``)
+    :type workers: int
+
+    Other keyword arguments are passed to :class:`seeddms.rest.SeedDMS`;
+    ``pool_maxsize`` defaults to ``workers``. The iterators of
+    :meth:`~seeddms.rest.SeedDMS.walk`, :meth:`~seeddms.rest.SeedDMS.iter_search`
+    and :meth:`~seeddms.rest.SeedDMS.iter_search_by_attr` are returned as
+    they are.
+
+    Example::
+
+        asdms = AsyncSeedDMS(baseurl=config.baseurl,
+                             username=config.username,
+                             password=config.password,
+                             workers=32)
+        asdms.do_login().get()
+
+        pending = [asdms.get_document(idn) for idn in document_ids]
+        for document in asdms.gather(pending):
+            print document.get('name')
+
+        asdms.close()
+
+    .. note:: :mod:`asyncio` is not available on Python 2. Code running on a
+       :mod:`concurrent.futures` based event loop can use the ``callback``
+       argument of :meth:`submit` to resolve its own futures.
+    """
+
+    def __init__(self, workers=10, **kwargs):
+        kwargs.setdefault('pool_maxsize', workers)
+        self.workers = workers
+        self.sdms = SeedDMS(**kwargs)
+        self.pool = ThreadPool(workers)
+        self.__local = threading.local()
+
+    def __getattr__(self, name):
+        if name.startswith('_') or name in ('sdms', 'pool'):
+            raise AttributeError(name)
+
+        attr = getattr(self.sdms, name)
+        if not callable(attr) or name in ITERATORS:
+            return attr
+
+        def wrapper(*args, **kwargs):
+            return self.pool.apply_async(self.__bind(attr), args, kwargs)
+
+        wrapper.__name__ = name
+        wrapper.__doc__ = attr.__doc__
+        return wrapper
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def __bind(self, method):
+        """return ``method`` limited by the deadline of the calling thread."""
+        deadline = getattr(self.__local, 'deadline', None)
+        if deadline is None:
+            return method
+
+        def call(*args, **kwargs):
+            with self.sdms.deadline(deadline - time.time()):
+                return method(*args, **kwargs)
+        return call
+
+    @contextmanager
+    def deadline(self, seconds):
+        """limit the time the calls scheduled by the current thread within
+        the block may take, counted from entering the block, see
+        :meth:`seeddms.rest.SeedDMS.deadline`.
+
+        .. code-block:: python
+
+           with asdms.deadline(10):
+               pending = [asdms.get_document(idn) for idn in document_ids]
+           documents = asdms.gather(pending)
+        """
+        previous = getattr(self.__local, 'deadline', None)
+        deadline = time.time() + seconds
+        if previous is not None and previous < deadline:
+            deadline = previous
+
+        self.__local.deadline = deadline
+        try:
+            yield
+        finally:
+            self.__local.deadline = previous
+
+    def submit(self, name, *args, **kwargs):
+        """schedule method ``name`` of :class:`seeddms.rest.SeedDMS`.
+
+        :param name: method name, e.g. ``get_document``
+        :type name: str
+        :param callback: optional function called with the result once it
+                 is available
+        :returns: handle to the pending result
+        :rtype: :class:`multiprocessing.pool.AsyncResult`
+        """
+        callback = kwargs.pop('callback', None)
+        return self.pool.apply_async(self.__bind(getattr(self.sdms, name)),
+                                     args, kwargs, callback)
+
+    def imap(self, name, iterable):
+        """call method ``name`` once for every item in ``iterable`` and yield
+        the results in completion order.
+
+        :param name: method name, e.g. ``get_folder_children``
+        :type name: str
+        :param iterable: single arguments for the method
+        :returns: generator of results
+
+        .. code-block:: python
+
+           for children in asdms.imap('get_folder_children', folder_ids):
+               print len(children)
+        """
+        return self.pool.imap_unordered(self.__bind(getattr(self.sdms, name)),
+                                        iterable)
+
+    @staticmethod
+    def gather(results, timeout=None):
+        """wait for a list of pending results.
+
+        :param results: handles returned by the methods of this class
+        :type results: list
+        :param timeout: seconds to wait for each result
+        :type timeout: float
+        :returns: results in the order of ``results``
+        :rtype: list
+        :raises: the exception raised by a failed call
+        """
+        return [x.get(timeout) for x in results]
+
+    def close(self):
+        """wait for pending calls and close the worker and connection
+        pools."""
+        self.pool.close()
+        self.pool.join()
+        self.sdms.close()
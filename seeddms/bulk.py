@@ -0,0 +1,225 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""bulk.py - import local directory trees into the DMS"""
+
+import os
+import json
+import time
+import threading
+from multiprocessing.pool import ThreadPool
+
+import requests
+
+from .exceptions import SeedDMSException
+
+
+class BulkImporter(object):
+    """Import a local directory tree into a folder of the DMS
+
+    Files are uploaded by ``workers`` threads sharing one client. Created
+    folders and uploaded files are appended to the ``journal``; a restarted
+    import skips them, and files named like a document in the target folder.
+
+    :param sdms: logged in client
+    :param workers: number of concurrent uploads (default: ``4``)
+    :param retries: number of attempts per file (default: ``3``)
+    :param retry_delay: seconds to wait before the first retry, doubled for
+             every next attempt (default: ``1.0``)
+    :param journal: path of the journal file (default: no journal)
+    :param callback: called with :py:attr:`~stats` after every file
+    :type sdms: :class:`seeddms.rest.SeedDMS`
+    :type workers: int
+    :type retries: int
+    :type retry_delay: float
+    :type journal: str
+    :type callback: callable
+
+    Example::
+
+        importer = BulkImporter(sdms, workers=8,
+                                journal='/var/tmp/scans-2014.journal')
+        stats = importer.run('/srv/scans/2014', sdms.get_folder_id('2014'))
+        print "%(files)d files, %(files_per_second).1f files/s, " \\
+              "%(mb_per_second).1f MB/s" % stats
+
+    """
+
+    def __init__(self, sdms, workers=4, retries=3, retry_delay=1.0,
+                 journal=None, callback=None):
+        if retries < 1:
+            raise ValueError("retries must be at least 1")
+        self.sdms = sdms
+        self.workers = workers
+        self.retries = retries
+        self.retry_delay = retry_delay
+        self.journal = journal
+        self.callback = callback
+
+        self.done = dict()
+        self.stats = dict()
+        self.lock = threading.Lock()
+        self.slots = threading.BoundedSemaphore(workers * 2)
+        self.started = None
+
+    def load_journal(self, folder_id):
+        """read the journal entries for an import into ``folder_id``."""
+        self.done = dict()
+        if self.journal is None or not os.path.exists(self.journal):
+            return
+
+        with open(self.journal) as ifh:
+            for line in ifh:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    # a line cut short by a crash
+                    continue
+                if entry.get('target') == folder_id:
+                    self.done[(entry['type'], entry['path'])] = entry['id']
+
+    def write_journal(self, folder_id, entrytype, path, idn):
+        """append an entry to the journal."""
+        with self.lock:
+            self.done[(entrytype, path)] = idn
+            if self.journal is None:
+                return
+            with open(self.journal, 'a') as ofh:
+                ofh.write(json.dumps({'target': folder_id, 'type': entrytype,
+                                      'path': path, 'id': idn}) + "\n")
+
+    def update_stats(self, **kwargs):
+        """add values to :py:attr:`~stats` and recalculate the throughput."""
+        with self.lock:
+            for keyname, keyvalue in kwargs.items():
+                self.stats[keyname] += keyvalue
+
+            elapsed = max(time.time() - self.started, 1e-6)
+            self.stats['elapsed'] = elapsed
+            self.stats['files_per_second'] = self.stats['files'] / elapsed
+            self.stats['mb_per_second'] = self.stats['bytes'] / elapsed / 1048576.0
+            stats = dict(self.stats)
+
+        if self.callback is not None:
+            self.callback(stats)
+
+    def children_by_name(self, folder_id):
+        """return the folders and documents in a DMS folder by name."""
+        folders = dict()
+        documents = dict()
+        for row in self.sdms.get_folder_children(folder_id) or []:
+            if row.get('type') == 'folder':
+                folders[row.get('name')] = row.get('id')
+            elif row.get('type') == 'document':
+                documents[row.get('name')] = row.get('id')
+        return folders, documents
+
+    def upload(self, target, folder_id, localpath, relpath):
+        """upload one file with retries, runs in a worker thread."""
+        try:
+            size = os.path.getsize(localpath)
+            delay = self.retry_delay
+            for attempt in range(1, self.retries + 1):
+                try:
+                    data = self.sdms.upload_document(folder_id, localpath)
+                    if not isinstance(data, dict):
+                        raise SeedDMSException("upload of %s was not accepted"
+                                               % relpath)
+                    break
+                except (SeedDMSException, requests.RequestException,
+                        IOError, OSError) as err:
+                    if attempt == self.retries:
+                        with self.lock:
+                            self.stats['errors'].append((relpath, str(err)))
+                        self.update_stats(failed=1)
+                        return
+                    self.update_stats(retries=1)
+                    time.sleep(delay)
+                    delay *= 2
+
+            self.write_journal(target, 'document', relpath, data.get('id'))
+            self.update_stats(files=1, bytes=size)
+        finally:
+            self.slots.release()
+
+    def collect(self, pending):
+        """record the errors of finished uploads.
+
+        :param pending: ``(relpath, result)`` of the uploads started
+        :returns: the uploads that have not finished
+        """
+        running = list()
+        for relpath, result in pending:
+            if not result.ready():
+                running.append((relpath, result))
+                continue
+            try:
+                result.get()
+            except Exception as err:
+                with self.lock:
+                    self.stats['errors'].append((relpath, str(err)))
+                self.update_stats(failed=1)
+        return running
+
+    def run(self, localpath, folder_id):
+        """import ``localpath`` into the DMS folder ``folder_id``.
+
+        :param localpath: local directory to import
+        :type localpath: str
+        :param folder_id: nummeric id of the target folder
+        :type folder_id: int
+        :returns: statistics (``files``, ``bytes``, ``folders``,
+                 ``skipped``, ``failed``, ``retries``, ``errors``,
+                 ``elapsed``, ``files_per_second``, ``mb_per_second``)
+        :rtype: dict
+        """
+        localpath = os.path.abspath(localpath)
+        if not os.path.isdir(localpath):
+            raise SeedDMSException("%s is not a directory" % localpath)
+
+        self.started = time.time()
+        self.stats = {'files': 0, 'bytes': 0, 'folders': 0, 'skipped': 0,
+                      'failed': 0, 'retries': 0, 'errors': list(),
+                      'elapsed': 0.0, 'files_per_second': 0.0,
+                      'mb_per_second': 0.0}
+        self.load_journal(folder_id)
+
+        folder_ids = {'.': folder_id}
+        pending = list()
+        pool = ThreadPool(self.workers)
+        try:
+            for dirpath, dirnames, filenames in os.walk(localpath):
+                dirnames.sort()
+                reldir = os.path.relpath(dirpath, localpath)
+                parent_id = folder_ids[reldir]
+                folders, documents = self.children_by_name(parent_id)
+
+                for dirname in dirnames:
+                    relpath = os.path.normpath(os.path.join(reldir, dirname))
+                    idn = self.done.get(('folder', relpath))
+                    if idn is None:
+                        idn = folders.get(dirname)
+                    if idn is None:
+                        idn = self.sdms.create_folder(parent_id, name=dirname)['id']
+                        self.update_stats(folders=1)
+                    if ('folder', relpath) not in self.done:
+                        self.write_journal(folder_id, 'folder', relpath, idn)
+                    folder_ids[relpath] = idn
+
+                for filename in sorted(filenames):
+                    relpath = os.path.normpath(os.path.join(reldir, filename))
+                    if ('document', relpath) in self.done or filename in documents:
+                        self.update_stats(skipped=1)
+                        continue
+
+                    self.slots.acquire()
+                    pending = self.collect(pending)
+                    pending.append((relpath, pool.apply_async(
+                        self.upload, (folder_id, parent_id,
+                                      os.path.join(dirpath, filename), relpath))))
+        finally:
+            pool.close()
+            pool.join()
+        self.collect(pending)
+
+        self.update_stats()
+        return dict(self.stats)
@@ -0,0 +1,811 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""cache.py - client side caches for DMS metadata"""
+
+import os
+import json
+import time
+import errno
+import sqlite3
+import hashlib
+import threading
+from collections import OrderedDict
+
+
+def _idn(value):
+    """return ``value`` as an int when it is a nummeric id."""
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return value
+
+
+def _expired(loaded, ttl):
+    """return ``True`` if data loaded at ``loaded`` is older than ``ttl``."""
+    if loaded is None:
+        return True
+    if ttl is None:
+        return False
+    return time.time() - loaded >= ttl
+
+
+class CategoryIndex(object):
+    """Index of the categories by name and by id
+
+    The index is loaded from ``/categories`` on first use and again after
+    ``ttl`` seconds or an explicit :meth:`refresh`. In between lookups do
+    not touch the network. :class:`seeddms.rest.SeedDMS` keeps the index up
+    to date when categories are created, renamed or deleted through it;
+    changes made by other clients show up after the next refresh.
+
+    :param sdms: client used to load the categories
+    :param ttl: seconds before the index is reloaded, ``None`` to never
+             reload and ``0`` to reload on every lookup (default: ``300``)
+    :type sdms: :class:`seeddms.rest.SeedDMS`
+    :type ttl: int
+
+    .. code-block:: python
+
+       sdms.category_index.lookup_id('reference')
+       1
+       sdms.category_index.byid[1]
+       {u'id': 1, u'name': u'reference'}
+
+    The index is thread-safe, an expired index is reloaded by one thread
+    while the others wait for it.
+    """
+
+    def __init__(self, sdms, ttl=300):
+        self.sdms = sdms
+        self.ttl = ttl
+        self.byname = dict()
+        self.byid = dict()
+        self.loaded = None
+        self.lock = threading.RLock()
+
+    @property
+    def expired(self):
+        """``True`` if the index has to be (re)loaded."""
+        return _expired(self.loaded, self.ttl)
+
+    def refresh(self):
+        """reload the index from the server."""
+        byname = dict()
+        byid = dict()
+        for row in self.sdms.get_categories() or []:
+            byname[row.get('name')] = row
+            byid[_idn(row.get('id'))] = row
+
+        with self.lock:
+            self.byname = byname
+            self.byid = byid
+            self.loaded = time.time()
+
+    def invalidate(self):
+        """reload the index on the next lookup."""
+        self.loaded = None
+
+    def ensure(self):
+        """load the index if it has expired."""
+        with self.lock:
+            if self.expired:
+                self.refresh()
+
+    def lookup_id(self, category_name):
+        """return the id of a category name or ``None``."""
+        self.ensure()
+        row = self.byname.get(category_name)
+        if row is not None:
+            return row.get('id')
+
+    def get(self, category_id):
+        """return the category info of a category id or ``None``."""
+        self.ensure()
+        return self.byid.get(_idn(category_id))
+
+    def add(self, row):
+        """add a category, ``row`` is a dictionary with ``id`` and ``name``."""
+        with self.lock:
+            if self.loaded is None:
+                return
+            row = {'id': _idn(row.get('id')), 'name': row.get('name')}
+            self.byname[row['name']] = row
+            self.byid[row['id']] = row
+
+    def rename(self, category_id, newname):
+        """rename a category in the index."""
+        with self.lock:
+            row = self.byid.get(_idn(category_id))
+            if row is None:
+                self.invalidate()
+                return
+            self.byname.pop(row.get('name'), None)
+            row = {'id': row.get('id'), 'name': newname}
+            self.byname[newname] = row
+            self.byid[row['id']] = row
+
+    def remove(self, category_id):
+        """remove a category from the index."""
+        with self.lock:
+            row = self.byid.pop(_idn(category_id), None)
+            if row is not None:
+                self.byname.pop(row.get('name'), None)
+
+
+class Directory(object):
+    """Directory of users and groups
+
+    Users are indexed by login and by id, groups by name and by id. Looking
+    up a user by login loads the complete ``/users`` list once; users and
+    groups looked up by id (or group name) are fetched one at a time on a
+    miss. Entries are reused for ``ttl`` seconds.
+
+    :class:`seeddms.rest.SeedDMS` drops entries that change through it
+    (creating or deleting users and creating groups), updates users it
+    enables or disables and drops the members of a group it changes while
+    keeping its id. :py:attr:`~hits` and :py:attr:`~misses` count the
+    lookups answered from memory and from the server.
+
+    :param sdms: client used to fetch users and groups
+    :param ttl: seconds an entry is used, ``None`` to keep entries until
+             they are invalidated (default: ``300``)
+    :type sdms: :class:`seeddms.rest.SeedDMS`
+    :type ttl: int
+
+    .. code-block:: python
+
+       sdms.get_user_by_name('tangaroa')
+       sdms.get_user_by_name('tangaroa')
+       (sdms.directory.hits, sdms.directory.misses)
+       (1, 1)
+
+    The directory is thread-safe, an expired user list is reloaded by one
+    thread while the others wait for it.
+    """
+
+    def __init__(self, sdms, ttl=300):
+        self.sdms = sdms
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.RLock()
+
+        self.users_bylogin = dict()
+        self.users_byid = dict()
+        self.users_loaded = None
+        self.user_times = dict()
+
+        self.groups_byname = dict()
+        self.groups_byid = dict()
+        self.group_times = dict()
+        self.group_ids = dict()
+
+    def add_user(self, row):
+        """add the info of a user."""
+        idn = _idn(row.get('id'))
+        with self.lock:
+            self.users_byid[idn] = row
+            self.users_bylogin[row.get('login')] = row
+            self.user_times[idn] = time.time()
+
+    def add_group(self, row):
+        """add the info of a group."""
+        idn = _idn(row.get('id'))
+        with self.lock:
+            self.groups_byid[idn] = row
+            self.groups_byname[row.get('name')] = row
+            self.group_times[idn] = time.time()
+            self.group_ids[row.get('name')] = (idn, time.time())
+
+    def refresh_users(self):
+        """reload all users from the server."""
+        bylogin = dict()
+        byid = dict()
+        times = dict()
+        now = time.time()
+        for row in self.sdms.get_users() or []:
+            idn = _idn(row.get('id'))
+            byid[idn] = row
+            bylogin[row.get('login')] = row
+            times[idn] = now
+
+        with self.lock:
+            self.users_bylogin = bylogin
+            self.users_byid = byid
+            self.user_times = times
+            self.users_loaded = now
+
+    def user_by_login(self, login):
+        """return the info of the user with login name ``login`` or ``None``."""
+        with self.lock:
+            if _expired(self.users_loaded, self.ttl):
+                self.misses += 1
+                self.refresh_users()
+            else:
+                self.hits += 1
+            return self.users_bylogin.get(login)
+
+    def user_by_id(self, user_id):
+        """return the info of the user with id ``user_id`` or ``None``."""
+        user_id = _idn(user_id)
+        with self.lock:
+            row = self.users_byid.get(user_id)
+            if row is not None and not _expired(self.user_times.get(user_id), self.ttl):
+                self.hits += 1
+                return row
+            self.misses += 1
+
+        req_obj = self.sdms.rest_get("/users/:id", argdict={'id': user_id})
+        if req_obj.success:
+            self.add_user(req_obj.data)
+            return req_obj.data
+
+    def group(self, group_id):
+        """return the info of a group by id or name or ``None``."""
+        group_id = _idn(group_id)
+        with self.lock:
+            if isinstance(group_id, int):
+                row = self.groups_byid.get(group_id)
+            else:
+                row = self.groups_byname.get(group_id)
+
+            if row is not None:
+                if not _expired(self.group_times.get(_idn(row.get('id'))), self.ttl):
+                    self.hits += 1
+                    return row
+            self.misses += 1
+
+        req_obj = self.sdms.rest_get("/groups/:id", argdict={'id': group_id})
+        if req_obj.success:
+            self.add_group(req_obj.data)
+            return req_obj.data
+
+    def group_id(self, group_id):
+        """return the id of a group by id or name, ``None`` if there is no
+        such group.
+
+        Unlike :meth:`group` the id of a group is known as long as the
+        group is not renamed or deleted, also after its members changed.
+        """
+        group_id = _idn(group_id)
+        if isinstance(group_id, int):
+            return group_id
+        with self.lock:
+            entry = self.group_ids.get(group_id)
+            if entry is not None and not _expired(entry[1], self.ttl):
+                self.hits += 1
+                return entry[0]
+
+        row = self.group(group_id)
+        if row is not None:
+            return _idn(row.get('id'))
+
+    def update_user(self, user_id, **kwargs):
+        """change fields of a known user, e.g. ``disabled``."""
+        user_id = _idn(user_id)
+        with self.lock:
+            row = self.users_byid.get(user_id)
+            if row is None:
+                return
+            row = dict(row, **kwargs)
+            self.users_byid[user_id] = row
+            self.users_bylogin[row.get('login')] = row
+
+    def invalidate_user(self, user_id):
+        """drop a user, the user list is reloaded on the next lookup by
+        login."""
+        with self.lock:
+            row = self.users_byid.pop(_idn(user_id), None)
+            self.user_times.pop(_idn(user_id), None)
+            if row is not None:
+                self.users_bylogin.pop(row.get('login'), None)
+            self.users_loaded = None
+
+    def invalidate_users(self):
+        """reload the user list on the next lookup by login."""
+        self.users_loaded = None
+
+    def invalidate_group(self, group_id, members=False):
+        """drop a group by id or name.
+
+        :param members: only the members changed, keep the id of the group
+        :type members: bool
+        """
+        group_id = _idn(group_id)
+        with self.lock:
+            if not members and not isinstance(group_id, int):
+                self.group_ids.pop(group_id, None)
+
+            if isinstance(group_id, int):
+                row = self.groups_byid.get(group_id)
+            else:
+                row = self.groups_byname.get(group_id)
+
+            if row is None:
+                return
+            self.groups_byid.pop(_idn(row.get('id')), None)
+            self.groups_byname.pop(row.get('name'), None)
+            self.group_times.pop(_idn(row.get('id')), None)
+            if not members:
+                self.group_ids.pop(row.get('name'), None)
+
+    def invalidate_groups(self):
+        """drop all groups."""
+        with self.lock:
+            self.groups_byname = dict()
+            self.groups_byid = dict()
+            self.group_times = dict()
+            self.group_ids = dict()
+
+    def invalidate(self):
+        """drop all users and groups."""
+        with self.lock:
+            self.users_bylogin = dict()
+            self.users_byid = dict()
+            self.user_times = dict()
+            self.users_loaded = None
+            self.invalidate_groups()
+
+
+class FolderCache(dict):
+    """Cache of the folder tree
+
+    The cache itself maps path strings (``DMS/aotearoa/2014``) to folder
+    ids. :py:attr:`~parents` maps a folder id to the id of its parent and
+    :py:attr:`~paths` a folder id to the names of the folders leading to
+    it. :class:`seeddms.rest.SeedDMS` fills it from every folder, path and
+    children listing it fetches (as :py:attr:`seeddms.rest.SeedDMS.folderdict`)
+    and drops the folders below a moved or deleted folder.
+
+    .. code-block:: python
+
+       sdms.get_folder_path(7)
+       sdms.folderdict
+       {u'DMS': 1, u'DMS/aotearoa': 2, u'DMS/aotearoa/2014': 7}
+       sdms.folderdict.paths[7]
+       (u'DMS', u'aotearoa', u'2014')
+
+    The methods of the cache are thread-safe.
+    """
+
+    def __init__(self):
+        dict.__init__(self)
+        self.parents = dict()
+        self.paths = dict()
+        self.lock = threading.RLock()
+
+    def __set(self, folder_id, parent_id, path):
+        folder_id = _idn(folder_id)
+        with self.lock:
+            old = self.paths.get(folder_id)
+            if old is not None and old != path:
+                # renamed or moved by someone else
+                self.invalidate(folder_id)
+
+            self.parents[folder_id] = parent_id
+            self.paths[folder_id] = path
+            self["/".join(path)] = folder_id
+
+    def add_root(self, row):
+        """add the info of the root folder."""
+        self.__set(row.get('id'), None, (row.get('name'),))
+
+    def add_folder(self, row, parent_id=None):
+        """add the info of a folder, as returned by
+        :meth:`seeddms.rest.SeedDMS.get_folder`, placed below
+        ``parent_id`` (or the ``parent`` field of ``row``) if that is known.
+        """
+        if parent_id is None:
+            parent_id = row.get('parent')
+            if isinstance(parent_id, dict):
+                parent_id = parent_id.get('id')
+        parent_id = _idn(parent_id)
+
+        with self.lock:
+            parent_path = self.paths.get(parent_id)
+            if parent_path is None:
+                return
+            self.__set(row.get('id'), parent_id, parent_path + (row.get('name'),))
+
+    def add_path(self, rows):
+        """add the folders of a path, as returned by
+        :meth:`seeddms.rest.SeedDMS.get_folder_path`."""
+        parent_id = None
+        path = tuple()
+        with self.lock:
+            for row in rows:
+                path += (row.get('name'),)
+                folder_id = _idn(row.get('id'))
+                self.__set(folder_id, parent_id, path)
+                parent_id = folder_id
+
+    def add_children(self, folder_id, rows):
+        """add the sub folders of ``folder_id``, as returned by
+        :meth:`seeddms.rest.SeedDMS.get_folder_children`."""
+        folder_id = _idn(folder_id)
+        with self.lock:
+            if folder_id not in self.paths:
+                return
+            for row in rows:
+                if row.get('type') == 'folder':
+                    self.add_folder(row, folder_id)
+
+    def lookup_path(self, path):
+        """return the id of a path string or ``None``."""
+        return self.get(path.strip("/"))
+
+    def path(self, folder_id):
+        """return the names of the folders leading to ``folder_id`` or
+        ``None``."""
+        return self.paths.get(_idn(folder_id))
+
+    def invalidate(self, folder_id):
+        """drop a folder and everything below it."""
+        folder_id = _idn(folder_id)
+        drop = set([folder_id])
+        with self.lock:
+            for idn in self.paths:
+                parent_id = self.parents.get(idn)
+                chain = set()
+                while parent_id is not None and parent_id not in chain:
+                    if parent_id in drop or parent_id == folder_id:
+                        drop.add(idn)
+                        break
+                    chain.add(parent_id)
+                    parent_id = self.parents.get(parent_id)
+
+            for idn in drop:
+                path = self.paths.pop(idn, None)
+                self.parents.pop(idn, None)
+                if path is not None and self.get("/".join(path)) == idn:
+                    del self["/".join(path)]
+
+    def clear(self):
+        """drop all folders."""
+        with self.lock:
+            dict.clear(self)
+            self.parents.clear()
+            self.paths.clear()
+
+
+class CachedResponse(object):
+    """response rebuilt from a cache entry, accepted by
+    :class:`seeddms.rest.SeedDMSData` in place of a :class:`requests.Response`.
+    """
+
+    def __init__(self, entry):
+        self.url = entry.get('url')
+        self.content = entry.get('content')
+        self.status_code = 200
+
+    def json(self):
+        return json.loads(self.content)
+
+
+class ResponseCache(object):
+    """Base class of the response cache backends for
+    :meth:`seeddms.rest.SeedDMS.rest_get`
+
+    Entries are dictionaries with the ``url``, the ``content`` of the
+    response, the ``etag`` and ``last_modified`` validators sent by the
+    server (or ``None``), the endpoint ``family`` (first part of the url,
+    e.g. ``folder``) and the time they were ``stored``.
+
+    Keys start with the endpoint family and a space, followed by the user
+    name and the full url with its query string.
+
+    An entry younger than ``ttl`` seconds is used without asking the server.
+    An older entry is revalidated with a conditional request when it has
+    validators and fetched again when it has not.
+
+    The base class stores nothing, every lookup is a miss.
+
+    :param ttl: seconds an entry is used without revalidation (default:
+             ``60``)
+    :param ttls: ttl per endpoint family, overrides ``ttl`` (e.g.
+             ``{'categories': 3600, 'document': 30}``)
+    :type ttl: int
+    :type ttls: dict
+    """
+
+    def __init__(self, ttl=60, ttls=None):
+        self.ttl = ttl
+        self.ttls = ttls or dict()
+        self.hits = 0
+        self.revalidated = 0
+        self.misses = 0
+        self.counter_lock = threading.Lock()
+
+    def count(self, name):
+        """add one to counter ``name`` (``hits``, ``revalidated`` or
+        ``misses``)."""
+        with self.counter_lock:
+            setattr(self, name, getattr(self, name) + 1)
+
+    def ttl_for(self, family):
+        """return the ttl for entries of an endpoint family."""
+        return self.ttls.get(family, self.ttl)
+
+    def fresh(self, entry):
+        """return ``True`` if ``entry`` can be used without revalidation."""
+        return time.time() - entry.get('stored', 0) < self.ttl_for(entry.get('family'))
+
+    def get(self, key):
+        """return the entry stored under ``key`` or ``None``."""
+        return None
+
+    def set(self, key, entry):
+        """store ``entry`` under ``key``."""
+        pass
+
+    def invalidate(self, family):
+        """drop all entries of an endpoint family."""
+        pass
+
+    def clear(self):
+        """drop all entries."""
+        pass
+
+
+class MemoryCache(ResponseCache):
+    """Least recently used response cache in memory
+
+    :param max_bytes: size of the stored responses before the least
+             recently used are dropped (default: 16 MiB)
+    :param ttl: see :class:`ResponseCache`
+    :param ttls: see :class:`ResponseCache`
+    :type max_bytes: int
+    :type ttl: int
+    :type ttls: dict
+
+    .. code-block:: python
+
+       sdms = seeddms.SeedDMS(baseurl=config.baseurl,
+                              response_cache=MemoryCache(max_bytes=64 << 20))
+    """
+
+    def __init__(self, max_bytes=16 * 1024 * 1024, ttl=60, ttls=None):
+        ResponseCache.__init__(self, ttl=ttl, ttls=ttls)
+        self.max_bytes = max_bytes
+        self.size = 0
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def entry_size(key, entry):
+        return len(key) + len(entry.get('content') or '')
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.pop(key, None)
+            if entry is not None:
+                self.entries[key] = entry
+            return entry
+
+    def set(self, key, entry):
+        with self.lock:
+            old = self.entries.pop(key, None)
+            if old is not None:
+                self.size -= self.entry_size(key, old)
+
+            size = self.entry_size(key, entry)
+            if size > self.max_bytes:
+                return
+
+            self.entries[key] = entry
+            self.size += size
+            while self.size > self.max_bytes:
+                oldkey, old = self.entries.popitem(last=False)
+                self.size -= self.entry_size(oldkey, old)
+
+    def invalidate(self, family):
+        with self.lock:
+            for key, entry in list(self.entries.items()):
+                if entry.get('family') == family:
+                    del self.entries[key]
+                    self.size -= self.entry_size(key, entry)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.size = 0
+
+
+class DiskCache(ResponseCache):
+    """Response cache in a directory
+
+    Every entry is a JSON file in a sub directory per endpoint family, so
+    the cache survives the process and can be shared by several processes.
+
+    :param directory: cache directory, created when missing
+    :param ttl: see :class:`ResponseCache`
+    :param ttls: see :class:`ResponseCache`
+    :type directory: str
+    :type ttl: int
+    :type ttls: dict
+    """
+
+    def __init__(self, directory, ttl=60, ttls=None):
+        ResponseCache.__init__(self, ttl=ttl, ttls=ttls)
+        self.directory = os.path.expanduser(directory)
+
+    def path(self, key, family):
+        return os.path.join(self.directory, family or '_',
+                            hashlib.sha1(key.encode('utf-8')).hexdigest() + '.json')
+
+    @staticmethod
+    def family_of(key):
+        return key.split(' ', 1)[0]
+
+    def get(self, key):
+        try:
+            with open(self.path(key, self.family_of(key))) as ifh:
+                entry = json.load(ifh)
+        except (IOError, OSError, ValueError):
+            return None
+        if entry.get('key') != key:
+            return None
+        return entry
+
+    def set(self, key, entry):
+        path = self.path(key, entry.get('family'))
+        try:
+            os.makedirs(os.path.dirname(path))
+        except OSError as err:
+            if err.errno != errno.EEXIST:
+                raise
+
+        entry = dict(entry, key=key)
+        tmppath = "%s.%d.%d" % (path, os.getpid(), threading.current_thread().ident)
+        with open(tmppath, 'w') as ofh:
+            json.dump(entry, ofh)
+        os.rename(tmppath, path)
+
+    def invalidate(self, family):
+        familydir = os.path.join(self.directory, family or '_')
+        if not os.path.isdir(familydir):
+            return
+        for filename in os.listdir(familydir):
+            try:
+                os.unlink(os.path.join(familydir, filename))
+            except OSError:
+                pass
+
+    def clear(self):
+        if not os.path.isdir(self.directory):
+            return
+        for family in os.listdir(self.directory):
+            self.invalidate(family)
+
+
+class SQLiteCache(ResponseCache):
+    """Response cache in a SQLite database
+
+    Lets short lived scripts start with the responses fetched by earlier
+    runs. The database may be used by several threads and processes at the
+    same time; every thread gets its own connection and writes wait up to
+    ``timeout`` seconds for the lock of another writer.
+
+    When the stored responses grow beyond ``max_bytes`` the oldest entries
+    are dropped.
+
+    :param path: path of the database file (default:
+             ``~/.seeddms-cli.cache``)
+    :param max_bytes: size of the stored responses (default: 64 MiB)
+    :param ttl: see :class:`ResponseCache`
+    :param ttls: see :class:`ResponseCache`
+    :param timeout: seconds to wait for a locked database (default: ``30``)
+    :type path: str
+    :type max_bytes: int
+    :type ttl: int
+    :type ttls: dict
+    :type timeout: float
+
+    .. code-block:: python
+
+       cache = SQLiteCache(ttl=60, ttls={'folder': 300, 'document': 60,
+                                         'users': 900, 'categories': 3600})
+       sdms = seeddms.SeedDMS(baseurl=config.baseurl, response_cache=cache)
+    """
+
+    def __init__(self, path='~/.seeddms-cli.cache', max_bytes=64 * 1024 * 1024,
+                 ttl=60, ttls=None, timeout=30):
+        ResponseCache.__init__(self, ttl=ttl, ttls=ttls)
+        self.path = os.path.expanduser(path)
+        self.max_bytes = max_bytes
+        self.timeout = timeout
+        self.local = threading.local()
+
+        with self.transaction() as conn:
+            conn.execute("CREATE TABLE IF NOT EXISTS responses ("
+                         " key TEXT PRIMARY KEY,"
+                         " family TEXT,"
+                         " url TEXT,"
+                         " content TEXT,"
+                         " etag TEXT,"
+                         " last_modified TEXT,"
+                         " stored REAL,"
+                         " size INTEGER)")
+            conn.execute("CREATE INDEX IF NOT EXISTS responses_family"
+                         " ON responses (family)")
+            conn.execute("CREATE INDEX IF NOT EXISTS responses_stored"
+                         " ON responses (stored)")
+
+    @property
+    def conn(self):
+        """connection of the current thread."""
+        conn = getattr(self.local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=self.timeout,
+                                   isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self.local.conn = conn
+        return conn
+
+    def transaction(self):
+        """return a context manager running a write transaction."""
+        return _Transaction(self.conn)
+
+    def get(self, key):
+        row = self.conn.execute("SELECT url, content, etag, last_modified,"
+                                " family, stored FROM responses WHERE key = ?",
+                                (key,)).fetchone()
+        if row is None:
+            return None
+        return {'url': row[0], 'content': row[1], 'etag': row[2],
+                'last_modified': row[3], 'family': row[4], 'stored': row[5]}
+
+    def set(self, key, entry):
+        size = len(key) + len(entry.get('content') or '')
+        if size > self.max_bytes:
+            return
+
+        with self.transaction() as conn:
+            conn.execute("INSERT OR REPLACE INTO responses"
+                         " (key, family, url, content, etag, last_modified,"
+                         " stored, size) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                         (key, entry.get('family'), entry.get('url'),
+                          entry.get('content'), entry.get('etag'),
+                          entry.get('last_modified'), entry.get('stored'),
+                          size))
+
+            total = conn.execute("SELECT TOTAL(size) FROM responses").fetchone()[0]
+            if total <= self.max_bytes:
+                return
+
+            # drop the oldest entries until the rest fits
+            drop = list()
+            for oldkey, oldsize in conn.execute("SELECT key, size FROM responses"
+                                                " ORDER BY stored"):
+                if total <= self.max_bytes:
+                    break
+                drop.append((oldkey,))
+                total -= oldsize
+            conn.executemany("DELETE FROM responses WHERE key = ?", drop)
+
+    def invalidate(self, family):
+        with self.transaction() as conn:
+            conn.execute("DELETE FROM responses WHERE family = ?", (family,))
+
+    def clear(self):
+        with self.transaction() as conn:
+            conn.execute("DELETE FROM responses")
+
+
+class _Transaction(object):
+    """``BEGIN IMMEDIATE`` ... ``COMMIT`` around a block, rolled back when
+    the block raises."""
+
+    def __init__(self, conn):
+        self.conn = conn
+
+    def __enter__(self):
+        self.conn.execute("BEGIN IMMEDIATE")
+        return self.conn
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.conn.execute("COMMIT")
+        else:
+            self.conn.execute("ROLLBACK")
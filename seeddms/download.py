@@ -0,0 +1,381 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""download.py - fast downloads of document content"""
+
+import io
+import os
+import json
+import mmap
+import hashlib
+import threading
+from multiprocessing.pool import ThreadPool
+
+from .exceptions import SeedDMSException
+
+#: default number of bytes below which content is downloaded in one stream
+MIN_PARALLEL_SIZE = 8 * 1024 * 1024
+
+#: default number of bytes downloaded between two checkpoints
+CHECKPOINT_SIZE = 8 * 1024 * 1024
+
+
+def content_url(document_id, version=None):
+    """return the rest url and arguments of the content of a document."""
+    if version is None:
+        return "/document/:id/content", {'id': document_id}
+    return "/document/:id/version/:version", {'id': document_id,
+                                              'version': version}
+
+
+def probe(sdms, url, argdict):
+    """return the length of the content at ``url`` if the server supports
+    range requests for it, ``None`` if it does not."""
+    retv = sdms.rest_stream(url, io.BytesIO(), argdict=argdict,
+                            byte_range=(0, 0))
+    if retv['status'] != 206:
+        return None
+    return retv['length']
+
+
+def split(length, parts):
+    """return ``parts`` (first, last) byte ranges covering ``length`` bytes."""
+    size = -(-length // parts)
+    return [(first, min(first + size, length) - 1)
+            for first in range(0, length, size)]
+
+
+def file_checksum(path, checksum, chunk_size=1024 * 1024):
+    """return the ``checksum`` hex digest of a file."""
+    hasher = hashlib.new(checksum)
+    with open(path, 'rb') as ifh:
+        for chunk in iter(lambda: ifh.read(chunk_size), b''):
+            hasher.update(chunk)
+    return hasher.hexdigest()
+
+
+class _MappedWriter(object):
+    """file-like writer into a memory map from ``offset`` on."""
+
+    def __init__(self, mapped, offset):
+        self.mapped = mapped
+        self.offset = offset
+
+    def write(self, data):
+        self.mapped[self.offset:self.offset + len(data)] = data
+        self.offset += len(data)
+
+
+def parallel_download(sdms, document_id, dest, version=None, parts=4,
+                      min_size=MIN_PARALLEL_SIZE, use_mmap=False,
+                      checksum=None, chunk_size=None, callback=None):
+    """download the content of a document in ``parts`` concurrent ranges.
+
+    When the server answers a request for the first byte with a partial
+    response, every part is written straight to its place in ``dest``;
+    otherwise, and for content smaller than ``min_size``, the content is
+    downloaded in a single stream.
+
+    :param sdms: logged in client
+    :param document_id: nummeric document id
+    :param dest: path of the output file
+    :param version: version to download, the latest if ``None``
+    :param parts: number of ranges downloaded at the same time
+             (default: ``4``)
+    :param min_size: content length below which a single stream is used
+             (default: 8 MiB)
+    :param use_mmap: write the parts through a memory map of ``dest``
+             instead of a file handle per part
+    :param checksum: name of a :mod:`hashlib` algorithm, calculated over
+             the finished file
+    :param chunk_size: number of bytes to read at once
+    :param callback: called with the number of bytes written so far and
+             the total, see :meth:`seeddms.rest.SeedDMS.rest_stream`
+    :type sdms: :class:`seeddms.rest.SeedDMS`
+    :type document_id: int
+    :type dest: str
+    :type version: int
+    :type parts: int
+    :type min_size: int
+    :type use_mmap: bool
+    :type checksum: str
+    :type chunk_size: int
+    :type callback: callable
+    :returns: dictionary with the ``size`` and ``checksum`` of the content
+             and the number of ``parts`` downloaded
+    :rtype: dict
+
+    .. code-block:: python
+
+       sdms.download_document(12, '/srv/export/scan.tiff', parts=8)
+       {'checksum': None, 'parts': 8, 'size': 734003200}
+
+    """
+    url, argdict = content_url(document_id, version)
+
+    kwargs = dict()
+    if chunk_size is not None:
+        kwargs['chunk_size'] = chunk_size
+
+    length = None
+    if parts > 1:
+        length = probe(sdms, url, argdict)
+
+    if length is None or length < max(min_size, 1):
+        retv = sdms.rest_stream(url, dest, argdict=argdict, checksum=checksum,
+                                callback=callback, **kwargs)
+        return {'size': retv['size'], 'checksum': retv['checksum'], 'parts': 1}
+
+    ranges = split(length, parts)
+    lock = threading.Lock()
+    done = [0]
+
+    def progress():
+        # rest_stream reports per part, sum up the parts
+        seen = [0]
+
+        def report(size, total):
+            with lock:
+                done[0] += size - seen[0]
+                seen[0] = size
+                written = done[0]
+            if callback is not None:
+                callback(written, length)
+        return report
+
+    with open(dest, 'w+b') as ofh:
+        ofh.truncate(length)
+
+    mapped = None
+    failed = True
+    pool = ThreadPool(len(ranges))
+    try:
+        if use_mmap:
+            mapfh = open(dest, 'r+b')
+            mapped = mmap.mmap(mapfh.fileno(), length)
+            mapfh.close()
+
+        def fetch(byte_range):
+            first, last = byte_range
+            if mapped is not None:
+                retv = sdms.rest_stream(url, _MappedWriter(mapped, first),
+                                        argdict=argdict, byte_range=byte_range,
+                                        callback=progress(), **kwargs)
+            else:
+                with open(dest, 'r+b') as partfh:
+                    partfh.seek(first)
+                    retv = sdms.rest_stream(url, partfh, argdict=argdict,
+                                            byte_range=byte_range,
+                                            callback=progress(), **kwargs)
+
+            if retv['status'] != 206 or retv['size'] != last - first + 1:
+                raise SeedDMSException("range %d-%d of %s returned %d bytes" % (
+                    first, last, url, retv['size']))
+            if retv['length'] != length:
+                raise SeedDMSException("content of %s changed during the download"
+                                       % url)
+
+        pool.map(fetch, ranges)
+        failed = False
+    finally:
+        # the other parts may still be running after one failed
+        pool.terminate()
+        pool.join()
+        if mapped is not None:
+            if not failed:
+                mapped.flush()
+            mapped.close()
+        if failed:
+            os.unlink(dest)
+
+    retv = {'size': length, 'checksum': None, 'parts': len(ranges)}
+    if checksum is not None:
+        retv['checksum'] = file_checksum(dest, checksum)
+    return retv
+
+
+class _ContentChanged(Exception):
+    """the content changed since the part file was started."""
+    pass
+
+
+class _Checkpointer(object):
+    """file-like writer into a part file that records the committed offset
+    in a sidecar file every ``every`` bytes."""
+
+    def __init__(self, ofh, state, statepath, every):
+        self.ofh = ofh
+        self.state = state
+        self.statepath = statepath
+        self.every = every
+        self.offset = state['offset']
+
+    def write(self, data):
+        self.ofh.write(data)
+        self.offset += len(data)
+        if self.offset - self.state['offset'] >= self.every:
+            self.commit()
+
+    def commit(self):
+        """make the written data durable and record its end."""
+        self.ofh.flush()
+        os.fsync(self.ofh.fileno())
+        self.state['offset'] = self.offset
+        tmppath = self.statepath + '.tmp'
+        with open(tmppath, 'w') as ofh:
+            json.dump(self.state, ofh)
+        os.rename(tmppath, self.statepath)
+
+    def restart(self):
+        """drop everything written so far."""
+        self.ofh.seek(0)
+        self.ofh.truncate(0)
+        self.offset = 0
+        self.state['offset'] = 0
+        self.state['length'] = None
+        self.commit()
+
+
+def resumable_download(sdms, document_id, dest, version=None, checksum=None,
+                       expected_checksum=None, chunk_size=None, callback=None,
+                       checkpoint=CHECKPOINT_SIZE):
+    """download the content of a document so that an interrupted download
+    continues where it stopped when it is run again.
+
+    The content is written to ``dest + '.part'``, its offset is recorded
+    in ``dest + '.part.json'`` every ``checkpoint`` bytes. A next run for
+    the same document version continues from that offset, or starts over
+    when the server does not support ranges or the content changed. The
+    part file is renamed to ``dest`` when its size (and checksum) are
+    right.
+
+    :param sdms: logged in client
+    :param document_id: nummeric document id
+    :param dest: path of the output file
+    :param version: version to download, the latest if ``None``
+    :param checksum: name of a :mod:`hashlib` algorithm, calculated over
+             the finished file
+    :param expected_checksum: hex digest the finished file must have,
+             requires ``checksum``
+    :param chunk_size: number of bytes to read at once
+    :param callback: called with the number of bytes in the part file and
+             the total, see :meth:`seeddms.rest.SeedDMS.rest_stream`
+    :param checkpoint: number of bytes between two checkpoints (default:
+             8 MiB)
+    :type sdms: :class:`seeddms.rest.SeedDMS`
+    :type document_id: int
+    :type dest: str
+    :type version: int
+    :type checksum: str
+    :type expected_checksum: str
+    :type chunk_size: int
+    :type callback: callable
+    :type checkpoint: int
+    :returns: dictionary with the ``size`` and ``checksum`` of the content
+             and the offset the download was ``resumed`` from
+    :rtype: dict
+
+    .. code-block:: python
+
+       sdms.download_document(12, '/srv/export/dump.tar', resume=True,
+                              checksum='md5')
+       {'checksum': '9e107d9d372bb6826bd81d3542a419d6', 'resumed': 2147483648,
+        'size': 3221225472}
+
+    """
+    if version is None:
+        # pin the version, so a new version can not be appended to the
+        # part file of the old one
+        document = sdms.get_document(document_id) or dict()
+        version = document.get('version')
+    url, argdict = content_url(document_id, version)
+
+    partpath = dest + '.part'
+    statepath = partpath + '.json'
+
+    state = None
+    if os.path.exists(partpath) and os.path.exists(statepath):
+        try:
+            with open(statepath) as ifh:
+                state = json.load(ifh)
+        except ValueError:
+            state = None
+    if (state is None or state.get('url') != url or
+            state.get('argdict') != argdict):
+        state = {'url': url, 'argdict': argdict, 'length': None, 'offset': 0}
+
+    kwargs = dict()
+    if chunk_size is not None:
+        kwargs['chunk_size'] = chunk_size
+
+    with open(partpath, 'a+b') as ofh:
+        # data after the last checkpoint may be incomplete
+        state['offset'] = min(state['offset'], os.path.getsize(partpath))
+        ofh.truncate(state['offset'])
+        resumed = state['offset']
+        writer = _Checkpointer(ofh, state, statepath, checkpoint)
+
+        def progress(size, total):
+            # total is the length of the requested range
+            if total is not None:
+                length = writer.offset - size + total
+                if state['length'] is None:
+                    state['length'] = length
+                elif state['length'] != length:
+                    raise _ContentChanged()
+            if callback is not None:
+                callback(writer.offset, state['length'])
+
+        try:
+            # complete when a run stopped between the last checkpoint and
+            # the rename
+            done = (state['length'] is not None and
+                    state['offset'] == state['length'])
+            retv = None
+            if state['offset'] and not done:
+                try:
+                    retv = sdms.rest_stream(url, writer, argdict=argdict,
+                                            byte_range=(state['offset'], None),
+                                            callback=progress, **kwargs)
+                except _ContentChanged:
+                    retv = None
+                if (retv is not None and retv['status'] == 416 and
+                        retv['length'] == state['offset']):
+                    done = True
+                    state['length'] = retv['length']
+                elif retv is None or retv['status'] != 206:
+                    writer.restart()
+                    resumed = 0
+                    retv = None
+
+            if retv is None and not done:
+                # a length recorded before the part file was started is
+                # not the length of what is downloaded now
+                state['length'] = None
+                try:
+                    retv = sdms.rest_stream(url, writer, argdict=argdict,
+                                            callback=progress, **kwargs)
+                except _ContentChanged:
+                    raise SeedDMSException("content of %s changed during the "
+                                           "download" % url)
+                if state['length'] is None:
+                    state['length'] = retv['length']
+        finally:
+            writer.commit()
+
+    size = os.path.getsize(partpath)
+    if state['length'] is not None and size != state['length']:
+        raise SeedDMSException("download of %s stopped at %d of %d bytes" % (
+            url, size, state['length']))
+
+    digest = None
+    if checksum is not None:
+        digest = file_checksum(partpath, checksum)
+        if expected_checksum is not None and digest != expected_checksum:
+            os.unlink(partpath)
+            os.unlink(statepath)
+            raise SeedDMSException("checksum of %s is %s instead of %s" % (
+                url, digest, expected_checksum))
+
+    os.rename(partpath, dest)
+    os.unlink(statepath)
+    return {'size': size, 'checksum': digest, 'resumed': resumed}
@@ -1,3 +1,9 @@
 
 class SeedDMSException(Exception):
     pass
+
+
+class CircuitOpenError(SeedDMSException):
+    """raised without contacting the server while the circuit of an
+    endpoint is open, see :class:`seeddms.resilience.CircuitBreaker`."""
+    pass
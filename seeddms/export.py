@@ -0,0 +1,393 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""export.py - export folder trees of the DMS to a local directory"""
+
+import os
+import stat
+import time
+import errno
+import shutil
+import sqlite3
+import tempfile
+import threading
+from multiprocessing.pool import ThreadPool
+
+import requests
+
+from . import tree
+from .exceptions import SeedDMSException
+
+SCHEMA = (
+    "CREATE TABLE IF NOT EXISTS versions ("
+    " document INTEGER,"
+    " version INTEGER,"
+    " size INTEGER,"
+    " date TEXT,"
+    " digest TEXT,"
+    " PRIMARY KEY (document, version))",
+)
+
+
+class BlobStore(object):
+    """Content addressed store of document content
+
+    Every distinct content is stored once, as ``blobs/<xx>/<digest>`` below
+    ``path``, named after its ``algorithm`` hex digest and read-only so it
+    can not be changed through a hard link. An index records the digest of
+    every document version stored, with the ``size`` and ``date`` it had, so
+    a version whose metadata did not change is known without downloading
+    it again.
+
+    :param path: directory of the store
+    :param algorithm: :mod:`hashlib` algorithm used for the digests
+             (default: ``md5``, the checksum SeedDMS keeps)
+    :type path: str
+    :type algorithm: str
+
+    .. code-block:: python
+
+       store = BlobStore('/srv/export/.blobs')
+       store.lookup(12, 3, 5044626, '2018-07-09 18:15:53')
+       '5d41402abc4b2a76b9719d911017c592'
+       store.blob_path('5d41402abc4b2a76b9719d911017c592')
+       '/srv/export/.blobs/blobs/5d/5d41402abc4b2a76b9719d911017c592'
+    """
+
+    def __init__(self, path, algorithm='md5'):
+        self.path = os.path.expanduser(path)
+        self.algorithm = algorithm
+        for subdir in ('blobs', 'tmp'):
+            if not os.path.isdir(os.path.join(self.path, subdir)):
+                os.makedirs(os.path.join(self.path, subdir))
+
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(os.path.join(self.path, 'index.db'),
+                                    check_same_thread=False)
+        with self.lock:
+            for statement in SCHEMA:
+                self.conn.execute(statement)
+            self.conn.commit()
+
+    def close(self):
+        """close the index."""
+        with self.lock:
+            self.conn.close()
+
+    def blob_path(self, digest):
+        """return the path of the blob with ``digest``."""
+        return os.path.join(self.path, 'blobs', digest[:2], digest)
+
+    def has(self, digest):
+        """return ``True`` if the blob with ``digest`` is stored."""
+        return bool(digest) and os.path.exists(self.blob_path(digest))
+
+    def tempfile(self):
+        """return the path of a new temporary file inside the store, on the
+        same file system as the blobs."""
+        fd, path = tempfile.mkstemp(dir=os.path.join(self.path, 'tmp'))
+        os.close(fd)
+        return path
+
+    def add(self, path, digest):
+        """move the file ``path`` with content ``digest`` into the store.
+
+        :returns: ``False`` if the content was stored already
+        :rtype: bool
+        """
+        blob = self.blob_path(digest)
+        if os.path.exists(blob):
+            os.unlink(path)
+            return False
+
+        if not os.path.isdir(os.path.dirname(blob)):
+            try:
+                os.makedirs(os.path.dirname(blob))
+            except OSError as err:
+                if err.errno != errno.EEXIST:
+                    raise
+        os.chmod(path, stat.S_IRUSR | stat.S_IRGRP | stat.S_IROTH)
+        os.rename(path, blob)
+        return True
+
+    def lookup(self, document_id, version, size, date):
+        """return the digest of a document version if it is stored with the
+        same ``size`` and ``date``, else ``None``."""
+        with self.lock:
+            row = self.conn.execute("SELECT size, date, digest FROM versions"
+                                    " WHERE document = ? AND version = ?",
+                                    (int(document_id), int(version))).fetchone()
+        if row is None or row[0] != size or row[1] != date:
+            return None
+        if not self.has(row[2]):
+            return None
+        return row[2]
+
+    def record(self, document_id, version, size, date, digest):
+        """record the digest of a document version."""
+        with self.lock:
+            self.conn.execute("INSERT OR REPLACE INTO versions"
+                              " (document, version, size, date, digest)"
+                              " VALUES (?, ?, ?, ?, ?)",
+                              (int(document_id), int(version), size, date,
+                               digest))
+            self.conn.commit()
+
+    def link(self, digest, dest, mode='hard'):
+        """make ``dest`` refer to the blob with ``digest``.
+
+        :param mode: ``hard`` for a hard link (a copy when the file system
+                 does not allow one), ``symlink`` or ``copy``
+        :type mode: str
+        """
+        blob = self.blob_path(digest)
+        if os.path.islink(dest):
+            if mode == 'symlink' and os.readlink(dest) == blob:
+                return
+            os.unlink(dest)
+        elif os.path.exists(dest):
+            if mode == 'hard' and os.path.samefile(blob, dest):
+                return
+            os.unlink(dest)
+
+        if mode == 'symlink':
+            os.symlink(blob, dest)
+            return
+
+        if mode == 'hard':
+            try:
+                os.link(blob, dest)
+                return
+            except OSError as err:
+                if err.errno not in (errno.EXDEV, errno.EPERM, errno.EMLINK):
+                    raise
+        shutil.copyfile(blob, dest)
+
+
+def _safe_name(name):
+    """return ``name`` usable as a local file name."""
+    name = (name or '').replace('/', '_').replace('\0', '')
+    if name in ('', '.', '..'):
+        name = '_' + name
+    return name
+
+
+class Exporter(object):
+    """Export a folder tree of the DMS to a local directory
+
+    Folders are recreated as directories and the latest version of every
+    document is linked from a :class:`BlobStore`, so identical content is
+    stored once. A version that is in the store with the same size and
+    date, or whose ``checksum`` is a stored digest, is not downloaded again.
+    Files get the extension of the original file name, the id of the
+    document is added to a name that is already used in the directory.
+
+    :param sdms: logged in client
+    :param store: blob store for the content
+    :param workers: number of concurrent downloads (default: ``4``)
+    :param link: how exported files refer to the blobs, ``hard``,
+             ``symlink`` or ``copy`` (default: ``hard``)
+    :param parts: byte ranges per download, see
+             :meth:`seeddms.rest.SeedDMS.download_document` (default: ``1``)
+    :param callback: called with :py:attr:`~stats` after every document
+    :type sdms: :class:`seeddms.rest.SeedDMS`
+    :type store: :class:`BlobStore`
+    :type workers: int
+    :type link: str
+    :type parts: int
+    :type callback: callable
+
+    Example::
+
+        store = BlobStore('/srv/export/.blobs')
+        exporter = Exporter(sdms, store, workers=8)
+        stats = exporter.run(sdms.get_folder_id('DMS/archive'),
+                             '/srv/export/archive')
+        print "%(downloaded)d downloaded, %(skipped)d known, " \\
+              "%(deduplicated)d duplicates" % stats
+
+    """
+
+    def __init__(self, sdms, store, workers=4, link='hard', parts=1,
+                 callback=None):
+        self.sdms = sdms
+        self.store = store
+        self.workers = workers
+        self.link = link
+        self.parts = parts
+        self.callback = callback
+
+        self.stats = dict()
+        self.lock = threading.Lock()
+        self.started = None
+
+    def update_stats(self, **kwargs):
+        """add values to :py:attr:`~stats`."""
+        with self.lock:
+            for keyname, keyvalue in kwargs.items():
+                self.stats[keyname] += keyvalue
+            self.stats['elapsed'] = time.time() - self.started
+            stats = dict(self.stats)
+
+        if self.callback is not None:
+            self.callback(stats)
+
+    def fetch(self, document_id, version, size):
+        """download a version into the store, runs in a worker thread.
+
+        :returns: digest of the content
+        """
+        tmppath = self.store.tempfile()
+        try:
+            retv = self.sdms.download_document(document_id, tmppath,
+                                               version=version,
+                                               checksum=self.store.algorithm,
+                                               parts=self.parts)
+        except BaseException:
+            # a failed download may have removed it already
+            if os.path.exists(tmppath):
+                os.unlink(tmppath)
+            raise
+
+        if size is not None and retv['size'] != size:
+            os.unlink(tmppath)
+            raise SeedDMSException("version %s of document %s has %d bytes "
+                                   "instead of %d" % (version, document_id,
+                                                      retv['size'], size))
+
+        digest = retv['checksum']
+        stored = self.store.add(tmppath, digest)
+        self.update_stats(downloaded=1, bytes_downloaded=retv['size'],
+                          deduplicated=0 if stored else 1)
+        return digest
+
+    def latest_version(self, document):
+        """get the latest version of a document, runs in a worker thread.
+
+        :returns: ``(version, error)``, the version is ``None`` when the
+                 document has none or the versions could not be fetched
+        """
+        try:
+            versions = self.sdms.get_document_versions(document['id']) or []
+        except Exception as err:
+            return None, err
+        if not versions:
+            return None, None
+        return max(versions, key=lambda x: int(x.get('version'))), None
+
+    def export_document(self, document, latest, path):
+        """export the version ``latest`` of a document to ``path``, runs in
+        a worker thread."""
+        try:
+            version = int(latest.get('version'))
+            size = latest.get('size')
+            if size is not None:
+                size = int(size)
+            date = latest.get('date')
+
+            digest = self.store.lookup(document['id'], version, size, date)
+            if digest is None and self.store.has(latest.get('checksum')):
+                digest = latest.get('checksum')
+
+            if digest is None:
+                digest = self.fetch(document['id'], version, size)
+            else:
+                self.update_stats(skipped=1, bytes_skipped=size or 0)
+
+            self.store.record(document['id'], version, size, date, digest)
+            self.store.link(digest, path, self.link)
+            self.update_stats(documents=1)
+
+        except (SeedDMSException, requests.RequestException,
+                IOError, OSError) as err:
+            with self.lock:
+                self.stats['errors'].append((path, str(err)))
+            self.update_stats(failed=1)
+
+    def collect(self, pending):
+        """record the errors of finished exports.
+
+        :param pending: ``(path, result)`` of the exports started
+        :returns: the exports that have not finished
+        """
+        running = list()
+        for path, result in pending:
+            if not result.ready():
+                running.append((path, result))
+                continue
+            try:
+                result.get()
+            except Exception as err:
+                with self.lock:
+                    self.stats['errors'].append((path, str(err)))
+                self.update_stats(failed=1)
+        return running
+
+    def run(self, folder_id, target):
+        """export the DMS folder ``folder_id`` to the directory ``target``.
+
+        :param folder_id: nummeric id of the top folder
+        :type folder_id: int
+        :param target: local directory, created when missing
+        :type target: str
+        :returns: statistics (``documents``, ``downloaded``, ``skipped``,
+                 ``deduplicated``, ``bytes_downloaded``, ``bytes_skipped``,
+                 ``failed``, ``errors``, ``elapsed``)
+        :rtype: dict
+        """
+        self.started = time.time()
+        self.stats = {'documents': 0, 'downloaded': 0, 'skipped': 0,
+                      'deduplicated': 0, 'bytes_downloaded': 0,
+                      'bytes_skipped': 0, 'failed': 0, 'errors': list(),
+                      'elapsed': 0.0}
+
+        directories = {int(folder_id): os.path.abspath(target)}
+        pending = list()
+        pool = ThreadPool(self.workers)
+        try:
+            for folder, folders, documents in tree.walk(self.sdms, folder_id,
+                                                        concurrency=self.workers):
+                directory = directories[int(folder['id'])]
+                if not os.path.isdir(directory):
+                    os.makedirs(directory)
+
+                names = set()
+                for subfolder in folders:
+                    name = _safe_name(subfolder.get('name'))
+                    if name in names:
+                        name = "%s-%s" % (name, subfolder['id'])
+                    names.add(name)
+                    directories[int(subfolder['id'])] = os.path.join(directory, name)
+
+                # the extension comes from the latest version, the names
+                # are only compared once it is known
+                versions = pool.imap(self.latest_version, documents)
+                for document, (latest, error) in zip(documents, versions):
+                    name = _safe_name(document.get('name'))
+                    if error is not None:
+                        with self.lock:
+                            self.stats['errors'].append(
+                                (os.path.join(directory, name), str(error)))
+                        self.update_stats(failed=1)
+                        continue
+                    if latest is None:
+                        continue
+
+                    extension = os.path.splitext(latest.get('origfilename') or '')[1]
+                    if extension and name.lower().endswith(extension.lower()):
+                        name, extension = (name[:-len(extension)],
+                                           name[-len(extension):])
+                    if name + extension in names:
+                        name = "%s-%s" % (name, document['id'])
+                    name += extension
+                    names.add(name)
+                    path = os.path.join(directory, name)
+                    pending = self.collect(pending)
+                    pending.append((path, pool.apply_async(
+                        self.export_document, (document, latest, path))))
+        finally:
+            pool.close()
+            pool.join()
+        self.collect(pending)
+
+        self.update_stats()
+        return dict(self.stats)
@@ -0,0 +1,487 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""replica.py - local copy of the DMS metadata"""
+
+import os
+import json
+import time
+import sqlite3
+import datetime
+from multiprocessing.pool import ThreadPool
+
+import requests
+
+from . import tree
+from .exceptions import SeedDMSException
+
+SCHEMA = (
+    "CREATE TABLE IF NOT EXISTS folders ("
+    " id INTEGER PRIMARY KEY,"
+    " parent INTEGER,"
+    " name TEXT,"
+    " comment TEXT,"
+    " date TEXT,"
+    " data TEXT,"
+    " synced REAL)",
+    "CREATE INDEX IF NOT EXISTS folders_parent ON folders (parent)",
+    "CREATE TABLE IF NOT EXISTS documents ("
+    " id INTEGER PRIMARY KEY,"
+    " folder INTEGER,"
+    " name TEXT,"
+    " date TEXT,"
+    " version INTEGER,"
+    " mimetype TEXT,"
+    " data TEXT)",
+    "CREATE INDEX IF NOT EXISTS documents_folder ON documents (folder)",
+    "CREATE TABLE IF NOT EXISTS versions ("
+    " document INTEGER,"
+    " version INTEGER,"
+    " date TEXT,"
+    " size INTEGER,"
+    " mimetype TEXT,"
+    " data TEXT,"
+    " PRIMARY KEY (document, version))",
+    "CREATE TABLE IF NOT EXISTS attributes ("
+    " document INTEGER,"
+    " id INTEGER,"
+    " name TEXT,"
+    " value TEXT)",
+    "CREATE INDEX IF NOT EXISTS attributes_document ON attributes (document)",
+    "CREATE INDEX IF NOT EXISTS attributes_value ON attributes (name, value)",
+    "CREATE INDEX IF NOT EXISTS documents_date ON documents (date)",
+    # every folder with each of its ancestors and itself
+    "CREATE TABLE IF NOT EXISTS ancestors ("
+    " folder INTEGER,"
+    " ancestor INTEGER,"
+    " PRIMARY KEY (ancestor, folder))",
+    "CREATE INDEX IF NOT EXISTS ancestors_folder ON ancestors (folder)",
+    "CREATE TABLE IF NOT EXISTS categories ("
+    " document INTEGER,"
+    " id INTEGER,"
+    " name TEXT)",
+    "CREATE INDEX IF NOT EXISTS categories_document ON categories (document)",
+    "CREATE INDEX IF NOT EXISTS categories_name ON categories (name, document)",
+    "CREATE INDEX IF NOT EXISTS categories_id ON categories (id, document)",
+)
+
+
+class Replica(object):
+    """Local copy of the folders, documents, versions and attributes below a
+    folder of the DMS
+
+    The copy is kept in a SQLite database. Later runs of :meth:`sync` skip
+    folders whose ``date`` did not change and documents whose listed info
+    did not change. :meth:`find_documents` queries the copy offline.
+
+    :param sdms: logged in client
+    :param path: path of the database file
+    :param concurrency: number of requests in flight (default: ``4``)
+    :type sdms: :class:`seeddms.rest.SeedDMS`
+    :type path: str
+    :type concurrency: int
+
+    .. code-block:: python
+
+       replica = Replica(sdms, '/var/lib/seeddms/replica.db')
+       replica.sync()
+       {'deleted': 0,
+        'documents_fetched': 12,
+        'documents_skipped': 20812,
+        'elapsed': 41.3,
+        'errors': [],
+        'failed': 0,
+        'folders_fetched': 3,
+        'folders_skipped': 2114}
+
+    .. note:: SeedDMS does not change the date of a folder when its
+       contents change, nor the date of a document when only its attributes
+       change. Pass ``full=True`` to :meth:`sync` once in a while to check
+       every folder and document.
+    """
+
+    def __init__(self, sdms, path, concurrency=4):
+        self.sdms = sdms
+        self.path = os.path.expanduser(path)
+        self.concurrency = concurrency
+        self.conn = sqlite3.connect(self.path)
+        self.stats = dict()
+
+        for statement in SCHEMA:
+            self.conn.execute(statement)
+
+        # replicas made before the query indexes existed
+        if self.conn.execute("SELECT COUNT(*) FROM ancestors").fetchone()[0] == 0:
+            self.reindex()
+        self.conn.commit()
+
+    def close(self):
+        """close the database."""
+        self.conn.close()
+
+# ------------------------------------------------------------------------------
+# STORE
+# ------------------------------------------------------------------------------
+
+    def store_folder(self, row, parent_id, synced=None):
+        """insert or update a folder."""
+        folder_id = int(row['id'])
+        old = self.conn.execute("SELECT parent FROM folders WHERE id = ?",
+                                (folder_id,)).fetchone()
+        self.conn.execute("INSERT OR REPLACE INTO folders"
+                          " (id, parent, name, comment, date, data, synced)"
+                          " VALUES (?, ?, ?, ?, ?, ?, ?)",
+                          (folder_id, parent_id, row.get('name'),
+                           row.get('comment'), row.get('date'),
+                           json.dumps(row), synced))
+        if old is None or old[0] != parent_id:
+            self.index_folder(folder_id)
+
+    def index_folder(self, folder_id):
+        """update the ancestors of a folder and of everything below it."""
+        self.conn.execute("DELETE FROM ancestors WHERE folder = ?", (folder_id,))
+        self.conn.execute("INSERT INTO ancestors (folder, ancestor)"
+                          " SELECT ?, a.ancestor FROM folders f, ancestors a"
+                          " WHERE f.id = ? AND a.folder = f.parent",
+                          (folder_id, folder_id))
+        self.conn.execute("INSERT INTO ancestors (folder, ancestor) VALUES (?, ?)",
+                          (folder_id, folder_id))
+
+        for (child_id,) in self.conn.execute("SELECT id FROM folders WHERE parent = ?",
+                                             (folder_id,)).fetchall():
+            self.index_folder(child_id)
+
+    def index_categories(self, document_id, document):
+        """update the categories of a document from its info."""
+        self.conn.execute("DELETE FROM categories WHERE document = ?", (document_id,))
+        for row in document.get('categories') or []:
+            if not isinstance(row, dict):
+                row = {'name': row}
+            self.conn.execute("INSERT INTO categories (document, id, name)"
+                              " VALUES (?, ?, ?)",
+                              (document_id, row.get('id'), row.get('name')))
+
+    def reindex(self):
+        """rebuild the folder ancestry and categories from the stored
+        folders and documents."""
+        self.conn.execute("DELETE FROM ancestors")
+        for (folder_id,) in self.conn.execute("SELECT id FROM folders WHERE parent IS NULL"
+                                              " OR parent NOT IN (SELECT id FROM folders)"
+                                              ).fetchall():
+            self.index_folder(folder_id)
+
+        for document_id, data in self.conn.execute("SELECT id, data FROM documents").fetchall():
+            self.index_categories(document_id, json.loads(data))
+
+    def store_document(self, folder_id, document, versions, attributes):
+        """insert or update a document with its versions and attributes."""
+        document_id = int(document['id'])
+        self.conn.execute("INSERT OR REPLACE INTO documents"
+                          " (id, folder, name, date, version, mimetype, data)"
+                          " VALUES (?, ?, ?, ?, ?, ?, ?)",
+                          (document_id, folder_id, document.get('name'),
+                           document.get('date'), document.get('version'),
+                           document.get('mimetype'), json.dumps(document)))
+        self.index_categories(document_id, document)
+
+        self.conn.execute("DELETE FROM versions WHERE document = ?", (document_id,))
+        for row in versions:
+            self.conn.execute("INSERT INTO versions"
+                              " (document, version, date, size, mimetype, data)"
+                              " VALUES (?, ?, ?, ?, ?, ?)",
+                              (document_id, row.get('version'), row.get('date'),
+                               row.get('size'), row.get('mimetype'),
+                               json.dumps(row)))
+
+        self.conn.execute("DELETE FROM attributes WHERE document = ?", (document_id,))
+        for row in attributes:
+            self.conn.execute("INSERT INTO attributes (document, id, name, value)"
+                              " VALUES (?, ?, ?, ?)",
+                              (document_id, row.get('id'), row.get('name'),
+                               row.get('value')))
+
+    def delete_document(self, document_id):
+        """remove a document with its versions and attributes."""
+        for table, column in (('documents', 'id'), ('versions', 'document'),
+                              ('attributes', 'document'), ('categories', 'document')):
+            self.conn.execute("DELETE FROM %s WHERE %s = ?" % (table, column),
+                              (document_id,))
+        self.stats['deleted'] += 1
+
+    def delete_folder(self, folder_id):
+        """remove a folder and everything below it."""
+        for (child_id,) in self.conn.execute("SELECT id FROM folders WHERE parent = ?",
+                                             (folder_id,)).fetchall():
+            self.delete_folder(child_id)
+        for (document_id,) in self.conn.execute("SELECT id FROM documents WHERE folder = ?",
+                                                (folder_id,)).fetchall():
+            self.delete_document(document_id)
+        self.conn.execute("DELETE FROM folders WHERE id = ?", (folder_id,))
+        self.conn.execute("DELETE FROM ancestors WHERE folder = ?", (folder_id,))
+        self.stats['deleted'] += 1
+
+# ------------------------------------------------------------------------------
+# SYNC
+# ------------------------------------------------------------------------------
+
+    def fetch_document(self, document_id):
+        """fetch a document with its versions and attributes, runs in a
+        worker thread.
+
+        :returns: the document id, info, versions and attributes, and the
+                 error the fetch failed with or ``None``
+        :rtype: tuple
+        """
+        try:
+            return (document_id, self.sdms.get_document(document_id),
+                    self.sdms.get_document_versions(document_id) or [],
+                    self.sdms.get_document_attributes(document_id) or [], None)
+        except (SeedDMSException, requests.RequestException, ValueError) as err:
+            return document_id, None, [], [], err
+
+    @staticmethod
+    def unchanged(stored, row):
+        """return ``True`` if the fields of a listed document match the
+        stored info."""
+        return all(stored.get(key) == value for key, value in row.items()
+                   if key in stored)
+
+    def complete(self, folder_id):
+        """return ``True`` if the last sync of a folder and of every folder
+        below it finished."""
+        return self.conn.execute("SELECT 1 FROM ancestors a, folders f"
+                                 " WHERE a.ancestor = ? AND f.id = a.folder"
+                                 " AND f.synced IS NULL LIMIT 1",
+                                 (folder_id,)).fetchone() is None
+
+    def sync_folder(self, pool, folder, folders, documents, full):
+        """update the replica with the listing of one folder and remove the
+        sub folders that need no crawling from ``folders``."""
+        folder_id = int(folder['id'])
+
+        stored = dict()
+        for row in self.conn.execute("SELECT id, date, synced FROM folders"
+                                     " WHERE parent = ?", (folder_id,)):
+            stored[row[0]] = row
+
+        crawl = list()
+        for row in folders:
+            idn = int(row['id'])
+            old = stored.pop(idn, None)
+            # a folder below it may have failed in an earlier sync
+            if not full and old is not None and old[1] == row.get('date') \
+                    and self.complete(idn):
+                self.stats['folders_skipped'] += 1
+                continue
+            self.store_folder(row, folder_id)
+            crawl.append(row)
+        folders[:] = crawl
+
+        for idn in stored:
+            self.delete_folder(idn)
+
+        stored = dict()
+        for row in self.conn.execute("SELECT id, data FROM documents"
+                                     " WHERE folder = ?", (folder_id,)):
+            stored[row[0]] = json.loads(row[1])
+
+        fetch = list()
+        for row in documents:
+            idn = int(row['id'])
+            old = stored.pop(idn, None)
+            if not full and old is not None and self.unchanged(old, row):
+                self.stats['documents_skipped'] += 1
+                continue
+            fetch.append(idn)
+
+        for idn in stored:
+            self.delete_document(idn)
+
+        synced = time.time()
+        for document_id, document, versions, attributes, err in \
+                pool.imap_unordered(self.fetch_document, fetch):
+            if err is not None:
+                # crawled again by the next sync
+                synced = None
+                self.stats['failed'] += 1
+                self.stats['errors'].append((document_id, str(err)))
+                continue
+            if document is None:
+                continue
+            self.store_document(folder_id, document, versions, attributes)
+            self.stats['documents_fetched'] += 1
+
+        self.conn.execute("UPDATE folders SET synced = ? WHERE id = ?",
+                          (synced, folder_id))
+        self.conn.commit()
+
+    def sync(self, folder_id=None, full=False):
+        """bring the replica up to date.
+
+        :param folder_id: nummeric id or name of the top folder (default:
+                 :py:attr:`seeddms.rest.SeedDMS.targetfolder`)
+        :type folder_id: int or str
+        :param full: descend into every folder and fetch every document,
+                 also when they did not change
+        :type full: bool
+        :returns: statistics (``folders_fetched``, ``folders_skipped``,
+                 ``documents_fetched``, ``documents_skipped``, ``deleted``,
+                 ``failed``, ``errors``, ``elapsed``)
+        :rtype: dict
+        """
+        if folder_id is None:
+            folder_id = self.sdms.targetfolder
+
+        started = time.time()
+        self.stats = {'folders_fetched': 0, 'folders_skipped': 0,
+                      'documents_fetched': 0, 'documents_skipped': 0,
+                      'deleted': 0, 'failed': 0, 'errors': list(),
+                      'elapsed': 0.0}
+
+        pool = ThreadPool(self.concurrency)
+        try:
+            first = True
+            for folder, folders, documents in tree.walk(self.sdms, folder_id,
+                                                        concurrency=self.concurrency):
+                if first:
+                    row = self.conn.execute("SELECT parent FROM folders WHERE id = ?",
+                                            (int(folder['id']),)).fetchone()
+                    self.store_folder(folder, row[0] if row else None)
+                    first = False
+
+                self.stats['folders_fetched'] += 1
+                self.sync_folder(pool, folder, folders, documents, full)
+        finally:
+            pool.close()
+            pool.join()
+            self.conn.commit()
+
+        self.stats['elapsed'] = time.time() - started
+        return dict(self.stats)
+
+# ------------------------------------------------------------------------------
+# QUERIES
+# ------------------------------------------------------------------------------
+
+    def get_folder(self, folder_id):
+        """return the stored info of a folder or ``None``."""
+        row = self.conn.execute("SELECT data FROM folders WHERE id = ?",
+                                (folder_id,)).fetchone()
+        if row is not None:
+            return json.loads(row[0])
+
+    def get_folder_children(self, folder_id):
+        """return the stored sub folders and documents of a folder."""
+        retv = list()
+        for table, column in (('folders', 'parent'), ('documents', 'folder')):
+            for row in self.conn.execute("SELECT data FROM %s WHERE %s = ?"
+                                         " ORDER BY name" % (table, column),
+                                         (folder_id,)):
+                retv.append(json.loads(row[0]))
+        return retv
+
+    def get_document(self, document_id):
+        """return the stored info of a document or ``None``."""
+        row = self.conn.execute("SELECT data FROM documents WHERE id = ?",
+                                (document_id,)).fetchone()
+        if row is not None:
+            return json.loads(row[0])
+
+    def get_document_versions(self, document_id):
+        """return the stored versions of a document."""
+        return [json.loads(row[0]) for row in
+                self.conn.execute("SELECT data FROM versions WHERE document = ?"
+                                  " ORDER BY version", (document_id,))]
+
+    def get_document_attributes(self, document_id):
+        """return the stored attributes of a document."""
+        return [{'id': row[0], 'name': row[1], 'value': row[2]} for row in
+                self.conn.execute("SELECT id, name, value FROM attributes"
+                                  " WHERE document = ?", (document_id,))]
+
+    def find_documents(self, folder_id=None, attributes=None, categories=None,
+                       modified_after=None, modified_before=None, name=None,
+                       mimetype=None, limit=None):
+        """find documents in the replica.
+
+        All given conditions have to match.
+
+        :param folder_id: only documents in this folder or below it
+        :type folder_id: int
+        :param attributes: attribute names with the value, or a list of
+                 values of which one has to match
+        :type attributes: dict
+        :param categories: category names or ids the document has to have
+                 (all of them)
+        :type categories: str, int or list
+        :param modified_after: only documents with a later date
+        :type modified_after: :class:`datetime.datetime` or str
+        :param modified_before: only documents with an earlier date
+        :type modified_before: :class:`datetime.datetime` or str
+        :param name: ``LIKE`` pattern for the document name
+        :type name: str
+        :param mimetype: mime type of the document
+        :type mimetype: str
+        :param limit: maximum number of documents
+        :type limit: int
+        :returns: document info as returned by
+                 :meth:`seeddms.rest.SeedDMS.get_document`, newest first
+        :rtype: list of dicts
+
+        .. code-block:: python
+
+           replica.find_documents(folder_id=2,
+                                  attributes={'language_reference': ['te reo maori',
+                                                                     'english']},
+                                  categories='reference',
+                                  modified_after=datetime.datetime(2018, 1, 1))
+        """
+        where = list()
+        args = list()
+
+        if folder_id is not None:
+            where.append("d.folder IN (SELECT folder FROM ancestors WHERE ancestor = ?)")
+            args.append(int(folder_id))
+
+        for attrname, values in sorted((attributes or {}).items()):
+            if not isinstance(values, (list, tuple, set, frozenset)):
+                values = [values]
+            values = list(values)
+            where.append("d.id IN (SELECT document FROM attributes"
+                         " WHERE name = ? AND value IN (%s))" % ", ".join("?" * len(values)))
+            args.append(attrname)
+            args.extend(values)
+
+        if categories is not None:
+            if not isinstance(categories, (list, tuple, set, frozenset)):
+                categories = [categories]
+            for category in categories:
+                if isinstance(category, int):
+                    where.append("d.id IN (SELECT document FROM categories WHERE id = ?)")
+                else:
+                    where.append("d.id IN (SELECT document FROM categories WHERE name = ?)")
+                args.append(category)
+
+        for value, operator in ((modified_after, ">"), (modified_before, "<")):
+            if value is None:
+                continue
+            if isinstance(value, (datetime.date, datetime.datetime)):
+                value = value.strftime("%Y-%m-%d %H:%M:%S")
+            where.append("d.date %s ?" % operator)
+            args.append(value)
+
+        if name is not None:
+            where.append("d.name LIKE ?")
+            args.append(name)
+
+        if mimetype is not None:
+            where.append("d.mimetype = ?")
+            args.append(mimetype)
+
+        query = "SELECT d.data FROM documents d"
+        if where:
+            query += " WHERE " + " AND ".join(where)
+        query += " ORDER BY d.date DESC, d.id"
+        if limit is not None:
+            query += " LIMIT %d" % int(limit)
+
+        return [json.loads(row[0]) for row in self.conn.execute(query, args)]
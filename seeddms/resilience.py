@@ -0,0 +1,549 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""resilience.py - survive, and do not cause, an overloaded DMS"""
+
+import random
+import threading
+import time
+
+import requests
+
+from .exceptions import SeedDMSException, CircuitOpenError
+
+#: HTTP status codes of a server that is overloaded, besides every ``5xx``
+OVERLOAD_STATUSES = (429,)
+
+
+class RetryPolicy(object):
+    """Retry failed requests of :class:`seeddms.rest.SeedDMS`
+
+    Requests that fail with one of the ``statuses`` or with a connection
+    error are sent again after an exponential backoff with full jitter:
+    before attempt ``n + 1`` a random time between zero and
+    ``backoff * 2 ** (n - 1)`` seconds is waited, at most ``max_backoff``
+    seconds or the ``Retry-After`` the server asked for.
+
+    Only requests with an idempotent method (``methods``) are retried.
+    A ``POST`` may have been processed before the server failed, so it is
+    only sent again when the connection could not be made at all.
+
+    A request rejected with one of the ``relogin_statuses`` is sent once
+    more after a new login, whatever its method, because the server did
+    not process it. SeedDMS also answers ``403`` when access is denied, so
+    the client only logs in again when its session turns out to be invalid.
+
+    Requests with a body that can not be read again (e.g. an upload from a
+    pipe) are never sent twice.
+
+    :param retries: number of times a request is sent again (default: ``3``)
+    :param backoff: seconds to wait at most before the first retry
+             (default: ``0.5``)
+    :param max_backoff: seconds to wait at most before any retry
+             (default: ``30.0``)
+    :param statuses: HTTP status codes that are retried (default: ``502``,
+             ``503`` and ``504``)
+    :param methods: HTTP methods that are retried
+    :param relogin_statuses: HTTP status codes that trigger a new login
+             (default: ``401`` and ``403``)
+    :param timeout: seconds to wait for the server per attempt (default:
+             no timeout)
+    :param deadline: seconds one call may take, retries included (default:
+             no deadline), see also :meth:`seeddms.rest.SeedDMS.deadline`
+    :type retries: int
+    :type backoff: float
+    :type max_backoff: float
+    :type statuses: tuple
+    :type methods: tuple
+    :type relogin_statuses: tuple
+    :type timeout: float
+    :type deadline: float
+
+    The counters in :py:attr:`~stats` show how often requests are retried:
+
+    * **calls**, requests made by the client
+    * **attempts**, requests sent to the server
+    * **retries**, requests sent again after a failure
+    * **relogins**, logins after a rejected session
+    * **gave_up**, calls that still failed after all retries
+    * **deadline_exceeded**, calls stopped by their deadline
+
+    Example::
+
+        policy = RetryPolicy(retries=5, backoff=1.0, timeout=30, deadline=120)
+        sdms = seeddms.SeedDMS(baseurl=config.baseurl,
+                               username=config.username,
+                               password=config.password,
+                               retry=policy)
+        ...
+        print policy.stats
+
+    """
+
+    def __init__(self, retries=3, backoff=0.5, max_backoff=30.0,
+                 statuses=(502, 503, 504),
+                 methods=('GET', 'HEAD', 'OPTIONS', 'PUT', 'DELETE'),
+                 relogin_statuses=(401, 403), timeout=None, deadline=None):
+        self.retries = retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.statuses = statuses
+        self.methods = methods
+        self.relogin_statuses = relogin_statuses
+        self.timeout = timeout
+        self.deadline = deadline
+
+        self.lock = threading.Lock()
+        self.stats = dict()
+        self.reset()
+
+    def reset(self):
+        """set all counters in :py:attr:`~stats` to zero."""
+        with self.lock:
+            self.stats = {'calls': 0, 'attempts': 0, 'retries': 0,
+                          'relogins': 0, 'gave_up': 0,
+                          'deadline_exceeded': 0}
+
+    def count(self, name, num=1):
+        """add ``num`` to counter ``name``."""
+        with self.lock:
+            self.stats[name] = self.stats.get(name, 0) + num
+
+    def retryable(self, method, response=None, error=None):
+        """return ``True`` if a request that ended with ``response`` or
+        ``error`` may be sent again."""
+        if error is not None:
+            if isinstance(error, requests.ConnectTimeout):
+                return True
+            if not isinstance(error, (requests.ConnectionError,
+                                      requests.Timeout)):
+                return False
+        elif response.status_code not in self.statuses:
+            return False
+
+        return method in self.methods
+
+    def pause(self, attempt, response=None):
+        """return the seconds to wait after failed attempt ``attempt``."""
+        limit = min(self.max_backoff, self.backoff * 2 ** (attempt - 1))
+        retry_after = None
+        if response is not None:
+            retry_after = response.headers.get('Retry-After')
+
+        if retry_after is not None and retry_after.isdigit():
+            return min(self.max_backoff, float(retry_after))
+        return random.uniform(0, limit)
+
+    def call(self, method, send, login=None, deadline=None, replayable=True):
+        """send a request until it succeeds or may not be retried.
+
+        :param method: HTTP method of the request
+        :param send: function called with the timeout of the attempt that
+                 sends the request and returns the :class:`requests.Response`
+        :param login: function called with the rejected response to login
+                 again, returns ``False`` when the session was valid after
+                 all; ``None`` to never login again
+        :param deadline: time (as :func:`time.time`) the request has to be
+                 finished by
+        :param replayable: ``False`` if the request may only be sent once
+        :type method: str
+        :type send: callable
+        :type login: callable
+        :type deadline: float
+        :type replayable: bool
+        :returns: the last response
+        :rtype: :class:`requests.Response`
+        """
+        method = method.upper()
+        if self.deadline is not None:
+            own = time.time() + self.deadline
+            if deadline is None or own < deadline:
+                deadline = own
+
+        self.count('calls')
+        attempt = 0
+        relogged = False
+        while True:
+            timeout = self.timeout
+            if deadline is not None:
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    self.count('deadline_exceeded')
+                    raise SeedDMSException("deadline exceeded after %d attempts"
+                                           % attempt)
+                if timeout is None or remaining < timeout:
+                    timeout = remaining
+
+            attempt += 1
+            self.count('attempts')
+            response = None
+            error = None
+            try:
+                response = send(timeout)
+            except requests.RequestException as err:
+                error = err
+
+            if (response is not None and replayable and login is not None and
+                    not relogged and
+                    response.status_code in self.relogin_statuses):
+                relogged = True
+                try:
+                    renewed = login(response)
+                except Exception:
+                    response.close()
+                    raise
+                if renewed:
+                    response.close()
+                    self.count('relogins')
+                    continue
+
+            if not replayable or not self.retryable(method, response, error):
+                if error is not None:
+                    raise error
+                return response
+
+            if attempt > self.retries:
+                self.count('gave_up')
+                if error is not None:
+                    raise error
+                return response
+
+            pause = self.pause(attempt, response)
+            if deadline is not None and time.time() + pause >= deadline:
+                self.count('deadline_exceeded')
+                if error is not None:
+                    raise error
+                return response
+
+            if response is not None:
+                response.close()
+            self.count('retries')
+            time.sleep(pause)
+
+
+class Limiter(object):
+    """Limit the rate and concurrency of the requests of one method class
+
+    The rate is limited with a token bucket: ``rate`` tokens are added per
+    second up to ``burst`` and every request takes one, waiting for it when
+    the bucket is empty.
+
+    The number of requests in flight starts at ``concurrency``. When
+    ``max_concurrency`` is higher the limit adapts (additive increase,
+    multiplicative decrease): it grows by one after a full window of
+    requests with a stable latency and is halved, at most once per
+    latency, when a request fails with a ``429`` or ``5xx`` status or a
+    connection error or takes more than ``tolerance`` times the average latency.
+
+    One limiter can be shared by several clients and threads, they are
+    limited together.
+
+    :param rate: requests per second (default: unlimited)
+    :param burst: requests that may be sent at once after an idle period
+             (default: ``rate``, at least ``1``)
+    :param concurrency: requests in flight at the start (default:
+             unlimited)
+    :param min_concurrency: lower bound of the adaptive limit (default:
+             ``1``)
+    :param max_concurrency: upper bound of the adaptive limit (default:
+             ``concurrency``, a fixed limit)
+    :param tolerance: latency increase, relative to the average, that is
+             treated as overload (default: ``2.0``)
+    :type rate: float
+    :type burst: int
+    :type concurrency: int
+    :type min_concurrency: int
+    :type max_concurrency: int
+    :type tolerance: float
+
+    The counters in :py:attr:`~stats` are:
+
+    * **requests**, requests let through
+    * **throttled**, requests that had to wait
+    * **waited**, seconds spent waiting
+    * **increases**, **decreases**, changes of the concurrency limit
+
+    Example::
+
+        limits = {'read': Limiter(rate=50, concurrency=8, max_concurrency=32),
+                  'write': Limiter(rate=10, concurrency=4),
+                  'upload': Limiter(concurrency=2),
+                  'download': Limiter(concurrency=2)}
+        sdms = seeddms.SeedDMS(baseurl=config.baseurl,
+                               username=config.username,
+                               password=config.password,
+                               limits=limits)
+
+    """
+
+    def __init__(self, rate=None, burst=None, concurrency=None,
+                 min_concurrency=1, max_concurrency=None, tolerance=2.0):
+        self.rate = rate
+        self.burst = burst
+        if burst is None and rate is not None:
+            self.burst = max(1, rate)
+        self.limit = concurrency
+        self.min_concurrency = min_concurrency
+        self.max_concurrency = max_concurrency
+        if max_concurrency is None:
+            self.max_concurrency = concurrency
+        self.tolerance = tolerance
+        self.adaptive = (concurrency is not None and
+                         self.max_concurrency > concurrency)
+
+        self.tokens = self.burst
+        self.filled = time.time()
+        self.in_flight = 0
+        self.latency = None
+        self.window = 0
+        self.decreased = 0.0
+        self.cond = threading.Condition(threading.Lock())
+        self.stats = {'requests': 0, 'throttled': 0, 'waited': 0.0,
+                      'increases': 0, 'decreases': 0}
+
+    def __refill(self, now):
+        if self.rate is None:
+            return
+        self.tokens = min(self.burst, self.tokens + (now - self.filled) * self.rate)
+        self.filled = now
+
+    def acquire(self, deadline=None):
+        """wait for a token and a free slot.
+
+        :param deadline: time (as :func:`time.time`) to stop waiting at
+        :type deadline: float
+        :returns: seconds waited
+        :rtype: float
+        """
+        started = time.time()
+        with self.cond:
+            while True:
+                now = time.time()
+                self.__refill(now)
+                pause = None
+                if self.rate is not None and self.tokens < 1:
+                    pause = (1 - self.tokens) / self.rate
+                elif self.limit is not None and self.in_flight >= self.limit:
+                    pause = 1.0
+                else:
+                    break
+
+                if deadline is not None:
+                    if now >= deadline:
+                        raise SeedDMSException("deadline exceeded waiting for a "
+                                               "request slot")
+                    pause = min(pause, deadline - now)
+                # woken early by release() when a slot frees up
+                self.cond.wait(pause)
+
+            if self.rate is not None:
+                self.tokens -= 1
+            self.in_flight += 1
+            waited = time.time() - started
+            self.stats['requests'] += 1
+            if waited > 0.001:
+                self.stats['throttled'] += 1
+                self.stats['waited'] += waited
+        return waited
+
+    def release(self, latency, overloaded=False):
+        """free the slot of a finished request and adapt the limit.
+
+        :param latency: seconds the request took, ``None`` if it was not
+                 sent and the limit is left as it is
+        :param overloaded: ``True`` if the server was overloaded
+        :type latency: float
+        :type overloaded: bool
+        """
+        with self.cond:
+            self.in_flight -= 1
+            if latency is None:
+                self.cond.notify_all()
+                return
+            average = self.latency
+            if average is None:
+                average = latency
+            self.latency = 0.9 * average + 0.1 * latency
+
+            if self.adaptive:
+                now = time.time()
+                if overloaded or latency > average * self.tolerance:
+                    if now - self.decreased > average:
+                        self.limit = max(self.min_concurrency, self.limit // 2)
+                        self.decreased = now
+                        self.window = 0
+                        self.stats['decreases'] += 1
+                else:
+                    self.window += 1
+                    if self.window >= self.limit and self.limit < self.max_concurrency:
+                        self.limit += 1
+                        self.window = 0
+                        self.stats['increases'] += 1
+            self.cond.notify_all()
+
+
+class CircuitBreaker(object):
+    """Fail fast on endpoints that keep failing
+
+    Every endpoint template (e.g. ``/document/:id/content``) has its own
+    circuit. A circuit opens when at least ``failure_rate`` of at least
+    ``min_requests`` requests within ``window`` seconds failed with a
+    ``5xx`` status or a connection error. While it is open requests to the
+    endpoint raise a :class:`seeddms.exceptions.CircuitOpenError` at once.
+    After ``reset_timeout`` seconds the circuit is half-open and up to
+    ``probes`` requests are let through; the circuit closes when one of
+    them succeeds and opens again when one fails.
+
+    :param failure_rate: fraction of failed requests that opens a circuit
+             (default: ``0.5``)
+    :param min_requests: requests needed in a window before a circuit can
+             open (default: ``10``)
+    :param window: seconds after which the counts start over (default:
+             ``60.0``)
+    :param reset_timeout: seconds a circuit stays open (default: ``30.0``)
+    :param probes: requests let through at the same time while half-open
+             (default: ``1``)
+    :type failure_rate: float
+    :type min_requests: int
+    :type window: float
+    :type reset_timeout: float
+    :type probes: int
+
+    Example::
+
+        breaker = CircuitBreaker(failure_rate=0.5, reset_timeout=60)
+        sdms = seeddms.SeedDMS(baseurl=config.baseurl,
+                               username=config.username,
+                               password=config.password,
+                               breaker=breaker)
+        ...
+        for template, circuit in breaker.states().items():
+            print template, circuit['state'], circuit['rejected']
+
+    """
+
+    def __init__(self, failure_rate=0.5, min_requests=10, window=60.0,
+                 reset_timeout=30.0, probes=1):
+        self.failure_rate = failure_rate
+        self.min_requests = min_requests
+        self.window = window
+        self.reset_timeout = reset_timeout
+        self.probes = probes
+
+        self.lock = threading.Lock()
+        self.circuits = dict()
+
+    def __circuit(self, template):
+        circuit = self.circuits.get(template)
+        if circuit is None:
+            circuit = {'state': 'closed', 'requests': 0, 'failures': 0,
+                       'started': time.time(), 'opened': None, 'probing': 0,
+                       'rejected': 0}
+            self.circuits[template] = circuit
+        return circuit
+
+    def __open(self, circuit):
+        circuit['state'] = 'open'
+        circuit['opened'] = time.time()
+        circuit['probing'] = 0
+
+    def allow(self, template):
+        """check whether a request to ``template`` may be sent.
+
+        :param template: endpoint template
+        :type template: str
+        :returns: ``True`` if the request is a probe of a half-open circuit
+        :rtype: bool
+        :raises: :class:`seeddms.exceptions.CircuitOpenError` if the
+                 request may not be sent
+        """
+        with self.lock:
+            circuit = self.__circuit(template)
+            now = time.time()
+
+            if circuit['state'] == 'open':
+                if now - circuit['opened'] < self.reset_timeout:
+                    circuit['rejected'] += 1
+                    raise CircuitOpenError("circuit for %s is open" % template)
+                circuit['state'] = 'half-open'
+
+            if circuit['state'] == 'half-open':
+                if circuit['probing'] >= self.probes:
+                    circuit['rejected'] += 1
+                    raise CircuitOpenError("circuit for %s is half-open" % template)
+                circuit['probing'] += 1
+                return True
+
+            if now - circuit['started'] > self.window:
+                circuit['requests'] = 0
+                circuit['failures'] = 0
+                circuit['started'] = now
+            return False
+
+    def record(self, template, failed, probe=False):
+        """record the outcome of a request allowed by :meth:`allow`.
+
+        :param template: endpoint template
+        :param failed: ``True`` if the request failed, ``None`` if it was
+                 not sent after all
+        :param probe: value returned by :meth:`allow`
+        :type template: str
+        :type failed: bool
+        :type probe: bool
+        """
+        with self.lock:
+            circuit = self.__circuit(template)
+            if probe:
+                circuit['probing'] = max(0, circuit['probing'] - 1)
+                if circuit['state'] != 'half-open' or failed is None:
+                    return
+                if failed:
+                    self.__open(circuit)
+                else:
+                    circuit['state'] = 'closed'
+                    circuit['requests'] = 0
+                    circuit['failures'] = 0
+                    circuit['started'] = time.time()
+                return
+
+            if failed is None or circuit['state'] != 'closed':
+                return
+
+            circuit['requests'] += 1
+            if failed:
+                circuit['failures'] += 1
+            if (circuit['requests'] >= self.min_requests and
+                    circuit['failures'] >= circuit['requests'] * self.failure_rate):
+                self.__open(circuit)
+
+    def state(self, template):
+        """return the state of the circuit of ``template``: ``closed``,
+        ``open`` or ``half-open``."""
+        with self.lock:
+            circuit = self.circuits.get(template)
+            if circuit is None:
+                return 'closed'
+            if (circuit['state'] == 'open' and
+                    time.time() - circuit['opened'] >= self.reset_timeout):
+                return 'half-open'
+            return circuit['state']
+
+    def states(self):
+        """return a copy of all circuits by endpoint template, with their
+        ``state``, the ``requests`` and ``failures`` in the current window
+        and the number of ``rejected`` requests."""
+        with self.lock:
+            templates = list(self.circuits)
+        retv = dict()
+        for template in templates:
+            with self.lock:
+                retv[template] = dict(self.circuits[template])
+            retv[template]['state'] = self.state(template)
+        return retv
+
+    def reset(self, template=None):
+        """close the circuit of ``template``, or all circuits."""
+        with self.lock:
+            if template is None:
+                self.circuits.clear()
+            else:
+                self.circuits.pop(template, None)
@@ -3,11 +3,36 @@
 """rest.py - interface for the raw REST interfaces"""
 
 import requests
+from requests.adapters import HTTPAdapter
 import os
 import re
 import hashlib
 import json
+import threading
+import time
+import urllib
+from contextlib import contextmanager
 from .exceptions import SeedDMSException
+from . import download
+from . import search
+from . import tree
+from .cache import CategoryIndex, Directory, FolderCache, CachedResponse
+from .resilience import OVERLOAD_STATUSES
+
+#: endpoint families whose cached responses are dropped after a change to a
+#: family, families not listed only drop their own responses
+CACHE_DEPENDENCIES = {
+    'document': ('document', 'folder', 'search', 'searchbyattr'),
+    'folder': ('folder', 'document', 'search', 'searchbyattr'),
+    'categories': ('categories', 'document'),
+    'attributedefinitions': ('attributedefinitions', 'document', 'folder'),
+    'users': ('users', 'groups', 'account'),
+    'groups': ('groups', 'users'),
+    'account': ('account', 'users'),
+}
+
+#: default number of bytes read or written at once when streaming content
+CHUNK_SIZE = 64 * 1024
 
 
 class SeedDMSData(object):
@@ -21,7 +46,7 @@ class SeedDMSData(object):
     Example::
 
         def return_data(self, url):
-            req_obj = requests.get(url, cookies=self.cookies)
+            req_obj = self.session.get(url)
             return SeedDMSData(req_obj)
 
         obj = self.return_data(url)
@@ -31,6 +56,8 @@ class SeedDMSData(object):
         else:
             print obj.message
 
+    Iterating does not change the object, so one result can be iterated
+    by several loops or threads at the same time.
     """
 
     def __init__(self, request_object):
@@ -79,9 +106,15 @@ class SeedDMSData(object):
         return self._data[0]['data']
 
     def __iter__(self):
-        return self
+        return iter(self._data)
 
     def next(self):
+        """return the next result.
+
+        .. note:: kept for compatibility, iterate with ``for`` or
+           :func:`iter` instead, which gives every loop (and every thread)
+           its own position.
+        """
         self.count += 1
         if self.count > self.data_max:
             raise StopIteration
@@ -120,30 +153,202 @@ class SeedDMS(object):
     :param username: username to login with
     :param password: password to login with
     :param targetfolder: target folder to use on the DMS
+    :param pool_connections: number of host connection pools to keep
+             (default: ``10``)
+    :param pool_maxsize: maximum number of connections kept per host
+             (default: ``10``)
+    :param pool_block: block when all connections of a host are in use
+             instead of opening a throw-away connection (default: ``False``)
+    :param keepalive: keep connections open between requests (default:
+             ``True``)
+    :param adapter: transport adapter to use instead of a new one, to share
+             its connection pool between clients (default: a new
+             :class:`requests.adapters.HTTPAdapter` sized with the
+             ``pool_*`` arguments)
+    :param category_ttl: seconds the category index is used before it is
+             reloaded, see :class:`seeddms.cache.CategoryIndex` (default:
+             ``300``)
+    :param directory_ttl: seconds users and groups are cached, see
+             :class:`seeddms.cache.Directory` (default: ``300``)
+    :param response_cache: cache for the responses of :meth:`rest_get`,
+             e.g. :class:`seeddms.cache.MemoryCache` (default: no cache)
+    :param retry: policy to retry failed requests and to login again when
+             the session expired, see
+             :class:`seeddms.resilience.RetryPolicy` (default: no retries)
+    :param limits: rate and concurrency limits for ``read``, ``write``,
+             ``upload`` and ``download`` requests, downloads without a limit
+             of their own use the ``read`` limit, see
+             :class:`seeddms.resilience.Limiter` (default: no limits)
+    :param breaker: circuit breaker for failing endpoints, see
+             :class:`seeddms.resilience.CircuitBreaker` (default: none)
+    :param coalesce: let concurrent identical :meth:`rest_get` calls share
+             one request (default: ``True``)
+    :param session_store: store to share the login session with other
+             processes, see :class:`seeddms.sessionstore.SessionStore`
+             (default: none)
     :type baseurl: str
     :type username: str
     :type password: str
     :type targetfolder: str
+    :type pool_connections: int
+    :type pool_maxsize: int
+    :type pool_block: bool
+    :type keepalive: bool
+    :type adapter: :class:`requests.adapters.HTTPAdapter`
+    :type category_ttl: int
+    :type directory_ttl: int
+    :type response_cache: :class:`seeddms.cache.ResponseCache`
+    :type retry: :class:`seeddms.resilience.RetryPolicy`
+    :type limits: dict
+    :type breaker: :class:`seeddms.resilience.CircuitBreaker`
+    :type coalesce: bool
+    :type session_store: :class:`seeddms.sessionstore.SessionStore`
+
+    All requests, including :meth:`do_login`, :meth:`do_logout` and
+    :meth:`echo_data`, go through one :class:`requests.Session` so TCP (and
+    TLS) connections to :py:attr:`~baseurl` are reused. The session also
+    holds the login cookie.
+
+    Categories (:py:attr:`~category_index`), users and groups
+    (:py:attr:`~directory`) and the folder tree (:py:attr:`~folderdict`)
+    are cached, see :mod:`seeddms.cache`.
+
+    One instance can be shared by many threads: the session, its
+    connection pool and the caches are thread-safe, results
+    (:class:`SeedDMSData`) can be iterated by several threads at once and a
+    session that expired is renewed by a single login, also when several
+    threads notice it at the same time. Set ``pool_maxsize`` to the number
+    of threads so every thread can keep a connection open.
 
     .. note:: see :class:`seeddms.config.Config` for defaults.
     """
     def __init__(self, **kwargs):
-        props = ('baseurl', 'username', 'password', 'targetfolder')
+        props = ('baseurl', 'username', 'password', 'targetfolder',
+                 'pool_connections', 'pool_maxsize', 'pool_block', 'keepalive',
+                 'adapter',
+                 'category_ttl', 'directory_ttl', 'response_cache', 'retry',
+                 'limits', 'breaker', 'coalesce',
+                 'session_store')
         self.baseurl = str()
         self.username = str()
         self.password = str()
         self.targetfolder = str()
-        self.cookies = str()
-        self.folderdict = dict()
+        self.pool_connections = 10
+        self.pool_maxsize = 10
+        self.pool_block = False
+        self.keepalive = True
+        self.adapter = None
+        self.category_ttl = 300
+        self.directory_ttl = 300
+        self.response_cache = None
+        self.retry = None
+        self.limits = dict()
+        self.breaker = None
+        self.coalesce = True
+        self.coalesced = 0
+        self.session_store = None
+        self.folderdict = FolderCache()
+        self.__local = threading.local()
+        self.__flights = dict()
+        self.__flights_lock = threading.Lock()
+        self.__login_lock = threading.RLock()
+        self.__logins = 0
 
         for prop in props:
             if prop in kwargs:
                 setattr(self, prop, kwargs[prop])
 
+        self.session = self.__new_session()
+        self.category_index = CategoryIndex(self, ttl=self.category_ttl)
+        self.directory = Directory(self, ttl=self.directory_ttl)
+
+    def __new_session(self):
+        """return a :class:`requests.Session` with a sized connection pool."""
+        session = requests.Session()
+        adapter = self.adapter
+        if adapter is None:
+            adapter = HTTPAdapter(pool_connections=self.pool_connections,
+                                  pool_maxsize=self.pool_maxsize,
+                                  pool_block=self.pool_block)
+        session.mount('http://', adapter)
+        session.mount('https://', adapter)
+
+        if not self.keepalive:
+            session.headers['Connection'] = 'close'
+
+        return session
+
+    @property
+    def cookies(self):
+        """cookie jar of the session, holds the login cookie."""
+        return self.session.cookies
+
+    @cookies.setter
+    def cookies(self, cookies):
+        with self.__login_lock:
+            self.session.cookies.clear()
+            if cookies:
+                self.session.cookies.update(cookies)
+
+    def close(self):
+        """close all pooled connections, unless the adapter was passed in
+        and may be used by other clients."""
+        if self.adapter is None:
+            self.session.close()
+
+    @contextmanager
+    def deadline(self, seconds):
+        """limit the time the requests made by the current thread within the
+        block may take, retries included.
+
+        :param seconds: time available for all requests in the block
+        :type seconds: float
+
+        A request that is not finished in time raises a
+        :class:`seeddms.exceptions.SeedDMSException` or a
+        :class:`requests.Timeout`. Nested deadlines can only shorten the
+        time available.
+
+        .. code-block:: python
+
+           with sdms.deadline(10):
+               document = sdms.get_document(document_id)
+               versions = sdms.get_document_versions(document_id)
+        """
+        previous = getattr(self.__local, 'deadline', None)
+        deadline = time.time() + seconds
+        if previous is not None and previous < deadline:
+            deadline = previous
+
+        self.__local.deadline = deadline
+        try:
+            yield
+        finally:
+            self.__local.deadline = previous
+
 # ------------------------------------------------------------------------------
 # TRANSLATION FUNCTIONS
 # ------------------------------------------------------------------------------
 
+    @staticmethod
+    def __tr_class(method, data=None, stream=False):
+        """return the method class of a request: ``read``, ``write``,
+        ``upload`` for a streamed body or ``download`` for a streamed
+        response."""
+        if method in ('GET', 'HEAD', 'OPTIONS'):
+            if stream:
+                return 'download'
+            return 'read'
+        if data is not None and not isinstance(data, (basestring, dict)):
+            return 'upload'
+        return 'write'
+
+    @staticmethod
+    def __tr_family(url):
+        """return the endpoint family of a rest url, ``/folder/:id`` becomes
+        ``folder``."""
+        return url.strip("/").split("/", 1)[0]
+
     def __tr_url(self, url, argdict=None):
 
         # FIXME: some url encoding??
@@ -159,6 +364,13 @@ class SeedDMS(object):
 
         return "%s%s" % (self.baseurl, retv)
 
+    @staticmethod
+    def __tr_query(params):
+        """return translated ``params`` as a sorted query string."""
+        if not params:
+            return ''
+        return urllib.urlencode(sorted(params.items()))
+
     def __tr_params(self, params):
 
         retv = dict()
@@ -194,71 +406,326 @@ class SeedDMS(object):
 # WRAPPERS FOR REST
 # ------------------------------------------------------------------------------
 
+    def __request(self, method, template, url, **kwargs):
+        """send a request for endpoint ``template`` with :py:attr:`~session`,
+        retried according to :py:attr:`~retry`, throttled by
+        :py:attr:`~limits`, guarded by :py:attr:`~breaker` and limited by
+        :meth:`deadline`.
+
+        ``kwargs`` are passed to :meth:`requests.Session.request`.
+        """
+        deadline = getattr(self.__local, 'deadline', None)
+        data = kwargs.get('data')
+        position = None
+        if hasattr(data, 'seek'):
+            try:
+                position = data.tell()
+            except (IOError, OSError):
+                pass
+        replayable = (data is None or isinstance(data, (basestring, dict)) or
+                      position is not None)
+
+        stream = kwargs.get('stream', False)
+        limiter = None
+        if self.limits:
+            method_class = self.__tr_class(method, data, stream)
+            limiter = self.limits.get(method_class)
+            if limiter is None and method_class == 'download':
+                limiter = self.limits.get('read')
+        breaker = self.breaker
+
+        generation = [self.__logins]
+
+        def send(timeout):
+            generation[0] = self.__logins
+            if position is not None:
+                data.seek(position)
+
+            probe = False
+            if breaker is not None:
+                probe = breaker.allow(template)
+
+            req_obj = None
+            started = None
+            acquired = False
+            try:
+                if limiter is not None:
+                    limiter.acquire(deadline)
+                    acquired = True
+                    if deadline is not None:
+                        # waiting for the limiter used up part of the time
+                        remaining = deadline - time.time()
+                        if remaining <= 0:
+                            raise SeedDMSException("deadline exceeded for %s" % url)
+                        if timeout is None or remaining < timeout:
+                            timeout = remaining
+
+                started = time.time()
+                req_obj = self.session.request(method, url, timeout=timeout,
+                                               **kwargs)
+                return req_obj
+            finally:
+                status = None
+                if req_obj is not None:
+                    status = req_obj.status_code
+                overloaded = (status is None or status >= 500 or
+                              status in OVERLOAD_STATUSES)
+                if acquired and started is None:
+                    limiter.release(None)
+                elif acquired and stream and req_obj is not None:
+                    # released when rest_stream closes the response
+                    self.__release_on_close(req_obj, limiter, started, overloaded)
+                elif acquired:
+                    limiter.release(time.time() - started, overloaded)
+                if breaker is not None:
+                    failed = None
+                    if started is not None:
+                        failed = status is None or status >= 500
+                    breaker.record(template, failed, probe)
+
+        if self.retry is None:
+            timeout = None
+            if deadline is not None:
+                timeout = deadline - time.time()
+                if timeout <= 0:
+                    raise SeedDMSException("deadline exceeded for %s" % url)
+            return send(timeout)
+
+        return self.retry.call(method, send,
+                               login=lambda response: self.__relogin(generation[0],
+                                                                     response),
+                               deadline=deadline, replayable=replayable)
+
+    @staticmethod
+    def __release_on_close(req_obj, limiter, started, overloaded):
+        """keep the limiter slot of a streamed response until its body is
+        closed, so the slot and the latency cover the whole transfer."""
+        close = req_obj.close
+        released = list()
+
+        def close_and_release():
+            try:
+                close()
+            finally:
+                if not released:
+                    released.append(True)
+                    limiter.release(time.time() - started, overloaded)
+
+        req_obj.close = close_and_release
+
+    def __relogin(self, generation, response):
+        """login again, unless another thread did after login ``generation``
+        was used to send the rejected request.
+
+        :returns: ``False`` if the session is valid, the request was denied
+        """
+        with self.__login_lock:
+            if self.__logins != generation:
+                return True
+            if response.status_code != 401 and self.__valid_session():
+                return False
+            self.__login(renew=True)
+            return True
+
     def rest_get(self, url, argdict=None, params=None, raw=False):
-        """wrapper for :meth:`requests.get` to handle REST call and return a
+        """wrapper for :meth:`requests.Session.get` to handle REST call and return a
         translated result.
 
+        Unless ``raw`` is set, responses are looked up in and stored in
+        :py:attr:`~response_cache` when that is set.
+
+        When :py:attr:`~coalesce` is set, a call for the same url and
+        parameters as a call that is still waiting for the server does not
+        send a request but returns the result of that call, the same
+        :class:`SeedDMSData` object. :py:attr:`~coalesced` counts the
+        requests saved. A change made with :meth:`rest_post`,
+        :meth:`rest_put` or :meth:`rest_delete` is always seen by the calls
+        made after it.
+
         :param url: rest url
         :param argdict: dictionary with keyvalues pairs for the url
         :param params: dictionary of variables posted to the url
         :return: :class:`SeedDMSData` object
         """
+        family = self.__tr_family(url)
+        template = url
         url = self.__tr_url(url, argdict)
 
+        if params is not None:
+            params = self.__tr_params(params)
+
+        if not self.coalesce:
+            return self.__get(family, template, url, params, raw)
+
+        key = (family, raw, url, self.__tr_query(params))
+        with self.__flights_lock:
+            flight = self.__flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = {'done': threading.Event(), 'result': None,
+                          'error': None}
+                self.__flights[key] = flight
+            else:
+                self.coalesced += 1
+
+        if not leader:
+            deadline = getattr(self.__local, 'deadline', None)
+            if deadline is None:
+                flight['done'].wait()
+            elif not flight['done'].wait(max(0, deadline - time.time())):
+                raise SeedDMSException("deadline exceeded for %s" % url)
+            if flight['error'] is not None:
+                raise flight['error']
+            return flight['result']
+
+        try:
+            flight['result'] = self.__get(family, template, url, params, raw)
+            return flight['result']
+        except Exception as err:
+            flight['error'] = err
+            raise
+        finally:
+            with self.__flights_lock:
+                if self.__flights.get(key) is flight:
+                    del self.__flights[key]
+            flight['done'].set()
+
+    def __get(self, family, template, url, params, raw):
+        """get ``url`` from the server or :py:attr:`~response_cache`."""
+        if self.response_cache is not None and not raw:
+            return self.__cached_get(family, template, url, params)
+
         if params is None:
-            req_obj = requests.get(url, cookies=self.cookies)
+            req_obj = self.__request('GET', template, url)
 
         else:
-            params = self.__tr_params(params)
-            req_obj = requests.get(url, params=params, cookies=self.cookies)
+            req_obj = self.__request('GET', template, url, params=params)
 
         if raw:
             if req_obj.status_code == 200:
                 return req_obj.content
         return SeedDMSData(req_obj)
 
-    def rest_post(self, url, argdict=None, params=None):
-        """wrapper for :meth:`requests.post` to handle REST call and return a
+    def __cached_get(self, family, template, url, params):
+        """get ``url`` through :py:attr:`~response_cache`."""
+        cache = self.response_cache
+        key = "%s %s %s?%s" % (family, self.username, url,
+                               self.__tr_query(params))
+
+        entry = cache.get(key)
+        if entry is not None and cache.fresh(entry):
+            cache.count('hits')
+            return SeedDMSData(CachedResponse(entry))
+
+        headers = dict()
+        if entry is not None:
+            if entry.get('etag'):
+                headers['If-None-Match'] = entry['etag']
+            if entry.get('last_modified'):
+                headers['If-Modified-Since'] = entry['last_modified']
+
+        req_obj = self.__request('GET', template, url, params=params,
+                                 headers=headers)
+
+        if req_obj.status_code == 304 and entry is not None:
+            cache.count('revalidated')
+            entry['stored'] = time.time()
+            cache.set(key, entry)
+            return SeedDMSData(CachedResponse(entry))
+
+        cache.count('misses')
+        retv = SeedDMSData(req_obj)
+        if req_obj.status_code == 200 and retv.success:
+            cache.set(key, {'url': req_obj.url,
+                            'content': req_obj.text,
+                            'etag': req_obj.headers.get('ETag'),
+                            'last_modified': req_obj.headers.get('Last-Modified'),
+                            'family': family,
+                            'stored': time.time()})
+        return retv
+
+    def __invalidate(self, family):
+        """drop the cached responses a change to ``family`` can affect."""
+        dependencies = CACHE_DEPENDENCIES.get(family, (family,))
+
+        # calls still waiting for an older response keep it, new calls
+        # send a request of their own
+        with self.__flights_lock:
+            for key in list(self.__flights):
+                if key[0] in dependencies:
+                    del self.__flights[key]
+
+        if self.response_cache is None:
+            return
+        for dependency in dependencies:
+            self.response_cache.invalidate(dependency)
+
+    def rest_post(self, url, argdict=None, params=None, data=None):
+        """wrapper for :meth:`requests.Session.post` to handle REST call and return a
         translated result.
 
         :param url: rest url
         :param argdict: dictionary with keyvalues pairs for the url
         :param params: dictionary of variables posted to the url
+        :param data: request body; a string, a file object or an iterator of
+                 strings. ``params`` are only passed in the query string
+                 when set.
         :return: :class:`SeedDMSData` object
         """
+        family = self.__tr_family(url)
+        template = url
         url = self.__tr_url(url, argdict)
 
-        if params is None:
-            req_obj = requests.post(url, cookies=self.cookies)
+        if data is not None:
+            params = self.__tr_params(params)
+            req_obj = self.__request('POST', template, url, data=data,
+                                     params=params)
+
+        elif params is None:
+            req_obj = self.__request('POST', template, url)
 
         else:
             params = self.__tr_params(params)
-            req_obj = requests.post(url, data=params, params=params, cookies=self.cookies)
+            req_obj = self.__request('POST', template, url, data=params,
+                                     params=params)
 
+        self.__invalidate(family)
         return SeedDMSData(req_obj)
 
-    def rest_put(self, url, argdict=None, params=None):
-        """wrapper for :meth:`requests.put` to handle REST call and return a
+    def rest_put(self, url, argdict=None, params=None, data=None):
+        """wrapper for :meth:`requests.Session.put` to handle REST call and return a
         translated result.
 
         :param url: rest url
         :param argdict: dictionary with keyvalues pairs for the url
         :param params: dictionary of variables posted to the url
+        :param data: request body; a string, a file object or an iterator of
+                 strings. ``params`` are only passed in the query string
+                 when set.
         :return: :class:`SeedDMSData` object
         """
+        family = self.__tr_family(url)
+        template = url
         url = self.__tr_url(url, argdict)
 
-        if params is None:
-            req_obj = requests.put(url, cookies=self.cookies)
+        if data is not None:
+            params = self.__tr_params(params)
+            req_obj = self.__request('PUT', template, url, data=data,
+                                     params=params)
+
+        elif params is None:
+            req_obj = self.__request('PUT', template, url)
 
         else:
             params = self.__tr_params(params)
-            req_obj = requests.put(url, data=params, params=params, cookies=self.cookies)
+            req_obj = self.__request('PUT', template, url, data=params,
+                                     params=params)
 
+        self.__invalidate(family)
         return SeedDMSData(req_obj)
 
     def rest_delete(self, url, argdict=None, params=None):
-        """wrapper for :meth:`requests.delete` to handle REST call and return a
+        """wrapper for :meth:`requests.Session.delete` to handle REST call and return a
         translated result.
 
         :param url: rest url
@@ -266,18 +733,131 @@ class SeedDMS(object):
         :param params: dictionary of variables posted to the url
         :return: :class:`SeedDMSData` object
         """
+        family = self.__tr_family(url)
+        template = url
         url = self.__tr_url(url, argdict)
 
         if params is None:
-            req_obj = requests.delete(url, cookies=self.cookies)
-            params = self.__tr_params(params)
+            req_obj = self.__request('DELETE', template, url)
 
         else:
             params = self.__tr_params(params)
-            req_obj = requests.delete(url, params=params, cookies=self.cookies)
+            req_obj = self.__request('DELETE', template, url, params=params)
 
+        self.__invalidate(family)
         return SeedDMSData(req_obj)
 
+    def rest_stream(self, url, dest, argdict=None, params=None,
+                    chunk_size=CHUNK_SIZE, checksum=None, callback=None,
+                    byte_range=None):
+        """wrapper for :meth:`requests.Session.get` that writes the response
+        body to ``dest`` as it arrives instead of returning it.
+
+        With ``byte_range`` only that part of the content is requested. When
+        the server does not support ranges and answers with the complete
+        content, nothing is written and the ``status`` is ``200``; when the
+        range starts after the end of the content nothing is written and
+        the ``status`` is ``416``.
+
+        :param url: rest url
+        :param dest: path of the output file or an object with a ``write``
+                 method
+        :param argdict: dictionary with keyvalues pairs for the url
+        :param params: dictionary of variables posted to the url
+        :param chunk_size: number of bytes to read at once
+        :param checksum: name of a :mod:`hashlib` algorithm (e.g. ``md5``)
+                 to calculate while writing
+        :param callback: called after every chunk with the number of bytes
+                 written so far and the expected total (``None`` if the
+                 server does not send a ``Content-Length`` or compressed
+                 the body)
+        :param byte_range: first and last byte to request, the last may be
+                 ``None`` for the rest of the content
+        :type dest: str or file object
+        :type chunk_size: int
+        :type checksum: str
+        :type callback: callable
+        :type byte_range: tuple
+        :return: dictionary with the ``size`` and ``checksum`` of what was
+                 written, the HTTP ``status`` and the ``length`` of the
+                 complete content (``None`` if unknown)
+        :rtype: dict
+        """
+        template = url
+        url = self.__tr_url(url, argdict)
+        hasher = None
+        if checksum is not None:
+            hasher = hashlib.new(checksum)
+
+        headers = dict()
+        if byte_range is not None:
+            first, last = byte_range
+            headers['Range'] = "bytes=%d-%s" % (first, '' if last is None else last)
+
+        req_obj = self.__request('GET', template, url,
+                                 params=self.__tr_params(params),
+                                 headers=headers, stream=True)
+        try:
+            status = req_obj.status_code
+            if status == 416 and byte_range is not None:
+                match = re.match(r"bytes \*/(\d+)",
+                                 req_obj.headers.get('Content-Range', ''))
+                return {'size': 0, 'checksum': None, 'status': status,
+                        'length': int(match.group(1)) if match else None}
+
+            if status not in (200, 206) or (status == 206 and byte_range is None):
+                # raises a SeedDMSException with the message of the server
+                SeedDMSData(req_obj)
+
+            total = req_obj.headers.get('Content-Length')
+            if total is not None:
+                total = int(total)
+            if req_obj.headers.get('Content-Encoding', 'identity') != 'identity':
+                # the length of the compressed body, not of what is written
+                total = None
+
+            length = total
+            if status == 206:
+                match = re.match(r"bytes \d+-\d+/(\d+)",
+                                 req_obj.headers.get('Content-Range', ''))
+                length = None
+                if match:
+                    length = int(match.group(1))
+
+            if byte_range is not None and status == 200:
+                return {'size': 0, 'checksum': None, 'status': status,
+                        'length': length}
+
+            if hasattr(dest, 'write'):
+                ofh = dest
+            else:
+                ofh = open(dest, 'wb')
+
+            size = 0
+            try:
+                for chunk in req_obj.iter_content(chunk_size):
+                    ofh.write(chunk)
+                    size += len(chunk)
+                    if hasher is not None:
+                        hasher.update(chunk)
+                    if callback is not None:
+                        callback(size, total)
+            finally:
+                if ofh is not dest:
+                    ofh.close()
+        finally:
+            req_obj.close()
+
+        if total is not None and size != total:
+            raise SeedDMSException("request to %s returned %d of %d bytes" % (
+                url, size, total))
+
+        retv = {'size': size, 'checksum': None, 'status': status,
+                'length': length}
+        if hasher is not None:
+            retv['checksum'] = hasher.hexdigest()
+        return retv
+
 
 # ------------------------------------------------------------------------------
 # LOGIN/LOGOUT
@@ -291,24 +871,80 @@ class SeedDMS(object):
         * `pass` :py:attr:`~password`
         * `user` :py:attr:`~username`
 
-        """
-        req_obj = requests.post(self.baseurl + "/login",
-                                {'user': self.username, 'pass': self.password})
+        With a :py:attr:`~session_store` a stored session that is still
+        valid is used instead, a new session is stored.
+        """
+        self.__login(renew=False)
+
+    def __login(self, renew):
+        """login, through :py:attr:`~session_store` when that is set.
+
+        :param renew: ``True`` if the current session was rejected
+        """
+        with self.__login_lock:
+            store = self.session_store
+            if store is None:
+                self.__post_login()
+                self.__logins += 1
+                return
+
+            rejected = None
+            if renew:
+                rejected = self.session.cookies.get_dict()
+
+            with store.locked():
+                entry = store.load(self.baseurl, self.username)
+                if entry is not None and entry.get('cookies') != rejected:
+                    self.cookies = entry.get('cookies')
+                    if store.trusted(entry):
+                        self.__logins += 1
+                        return
+                    if self.__valid_session():
+                        store.save(self.baseurl, self.username,
+                                   entry.get('cookies'))
+                        self.__logins += 1
+                        return
+
+                self.session.cookies.clear()
+                self.__post_login()
+                store.save(self.baseurl, self.username,
+                           self.session.cookies.get_dict())
+                self.__logins += 1
+
+    def __post_login(self):
+        """create a new session on the server."""
+        req_obj = self.session.post(self.baseurl + "/login",
+                                    {'user': self.username, 'pass': self.password})
         json_obj = req_obj.json()
 
         if not json_obj.get('success'):
             raise SeedDMSException("Failed to login")
 
-        self.cookies = req_obj.cookies
+    def __valid_session(self):
+        """return ``True`` if the server accepts the current session."""
+        try:
+            req_obj = self.session.get(self.baseurl + "/account")
+            return req_obj.status_code == 200 and bool(req_obj.json().get('success'))
+        except (requests.RequestException, ValueError):
+            return False
 
     def do_logout(self):
-        """logout"""
-        req_obj = requests.get(self.baseurl + "/logout")
+        """logout
+
+        The session is also dropped from :py:attr:`~session_store`.
+        """
+        cookies = self.session.cookies.get_dict()
+        req_obj = self.session.get(self.baseurl + "/logout")
         json_obj = req_obj.json()
 
         if not json_obj.get('success'):
             raise SeedDMSException("Failed to logout")
 
+        self.session.cookies.clear()
+        if self.session_store is not None:
+            with self.session_store.locked():
+                self.session_store.drop(self.baseurl, self.username, cookies)
+
 
 # ------------------------------------------------------------------------------
 # ECHO
@@ -320,7 +956,7 @@ class SeedDMS(object):
 
         """
         retv = str()
-        req_obj = requests.get(self.baseurl + "/echo", cookies=self.cookies)
+        req_obj = self.session.get(self.baseurl + "/echo")
         if req_obj.status_code == 200:
             retv = req_obj.text
         return retv
@@ -461,29 +1097,26 @@ class SeedDMS(object):
     def lookup_category_id(self, category_name):
         """get a nummeric value for ``category_name``.
 
+        Looked up in :py:attr:`~category_index`.
+
         :param category_name: name of the category
         :type category_name: str
         :returns: category id
         :rtype: int or None
         """
-        for row in self.get_categories():
-            name = row.get('name')
-            if category_name == name:
-                return row.get('id')
+        return self.category_index.lookup_id(category_name)
 
     def has_category(self, category_name):
         """Return ``True`` if ``category_name`` exists
 
+        Looked up in :py:attr:`~category_index`.
+
         :param category_name: name of the category
         :type category_name: str
         :returns: ``True`` or ``False``
         :rtype: bool
         """
-        for row in self.get_categories():
-            name = row.get('name')
-            if category_name == name:
-                return True
-        return False
+        return self.category_index.lookup_id(category_name) is not None
 
     def get_category(self, category_id):
         """get category information for a category id.
@@ -514,7 +1147,12 @@ class SeedDMS(object):
         """
         req_obj = self.rest_post("/categories", params={'category': category})
         if req_obj.success:
-            return req_obj.data
+            data = req_obj.data
+            if isinstance(data, dict) and 'id' in data:
+                self.category_index.add({'id': data['id'], 'name': category})
+            else:
+                self.category_index.invalidate()
+            return data
 
     def change_category_name(self, category_id, newname):
         """Change a category name.
@@ -534,6 +1172,7 @@ class SeedDMS(object):
                                 argdict={'id': category_id},
                                 params={'name': newname})
         if req_obj.success:
+            self.category_index.rename(category_id, newname)
             return req_obj.data
 
     def delete_category(self, category_id):
@@ -549,6 +1188,7 @@ class SeedDMS(object):
         """
         req_obj = self.rest_delete("/categories/:id", argdict={'id': category_id})
         if req_obj.success:
+            self.category_index.remove(category_id)
             return req_obj.data
 
 # ------------------------------------------------------------------------------
@@ -671,6 +1311,91 @@ class SeedDMS(object):
         return self.rest_get("/document/:id/version/:version",
                              argdict={'id': document_id, 'version': version}, raw=True)
 
+    def download_document(self, document_id, dest, version=None,
+                          chunk_size=CHUNK_SIZE, checksum=None, callback=None,
+                          parts=1, use_mmap=False, resume=False,
+                          expected_checksum=None):
+        """download the content of a document straight to a file.
+
+        Unlike :meth:`get_document_content` and :meth:`get_document_version`
+        the content is never held in memory as a whole.
+
+        With ``parts`` above one and a path as ``dest``, large content is
+        downloaded in that many concurrent byte ranges when the server
+        supports them, see :func:`seeddms.download.parallel_download`.
+
+        With ``resume`` and a path as ``dest`` an interrupted download
+        continues where it stopped when it is run again, see
+        :func:`seeddms.download.resumable_download`; it can not be combined
+        with ``parts``.
+
+        :param document_id: nummeric document id
+        :type document_id: int
+        :param dest: path of the output file or an object with a ``write``
+                 method
+        :type dest: str or file object
+        :param version: version to download, the latest if ``None``
+        :type version: int
+        :param chunk_size: number of bytes to read at once
+        :type chunk_size: int
+        :param checksum: name of a :mod:`hashlib` algorithm (e.g. ``md5``)
+        :type checksum: str
+        :param callback: progress function, see :meth:`rest_stream`
+        :type callback: callable
+        :param parts: number of ranges downloaded at the same time
+        :type parts: int
+        :param use_mmap: write the ranges through a memory map
+        :type use_mmap: bool
+        :param resume: continue an interrupted download
+        :type resume: bool
+        :param expected_checksum: hex digest the content must have, only
+                 used with ``resume``, requires ``checksum``
+        :type expected_checksum: str
+        :returns: dictionary with the ``size`` and ``checksum`` of the content
+        :rtype: dict
+
+        .. code-block:: python
+
+           def progress(done, total):
+               print "%d/%s bytes" % (done, total)
+
+           sdms.download_document(12, '/tmp/grammar.pdf', checksum='md5',
+                                  callback=progress)
+           {'checksum': '5d41402abc4b2a76b9719d911017c592', 'size': 5044626}
+
+        """
+        if resume and parts > 1:
+            raise ValueError("resume and parts can not be combined")
+        if expected_checksum is not None and (not resume or checksum is None):
+            raise ValueError("expected_checksum requires resume and checksum")
+
+        if resume and isinstance(dest, basestring):
+            return download.resumable_download(self, document_id, dest,
+                                               version=version,
+                                               checksum=checksum,
+                                               expected_checksum=expected_checksum,
+                                               chunk_size=chunk_size,
+                                               callback=callback)
+
+        if parts > 1 and isinstance(dest, basestring):
+            return download.parallel_download(self, document_id, dest,
+                                              version=version, parts=parts,
+                                              use_mmap=use_mmap,
+                                              checksum=checksum,
+                                              chunk_size=chunk_size,
+                                              callback=callback)
+
+        if version is None:
+            return self.rest_stream("/document/:id/content", dest,
+                                    argdict={'id': document_id},
+                                    chunk_size=chunk_size, checksum=checksum,
+                                    callback=callback)
+
+        return self.rest_stream("/document/:id/version/:version", dest,
+                                argdict={'id': document_id, 'version': version},
+                                chunk_size=chunk_size, checksum=checksum,
+                                callback=callback)
+
     def get_document_versions(self, document_id):
         """get the various versions of the documents
 
@@ -771,6 +1496,10 @@ class SeedDMS(object):
 
         req_obj = self.rest_get(url, argdict=argdict, params=kwargs)
         if req_obj.success:
+            if folder_id is None:
+                self.folderdict.add_root(req_obj.data)
+            else:
+                self.folderdict.add_folder(req_obj.data)
             return req_obj.data
 
     def get_folder_document_ids(self, folder_id):
@@ -787,6 +1516,21 @@ class SeedDMS(object):
                 retv.append(int(row.get('id')))
         return sorted(retv)
 
+    def walk(self, folder_id, **kwargs):
+        """generate the folders and documents below ``folder_id``.
+
+        :param folder_id: nummeric id or name of the top folder
+        :type folder_id: int or str
+
+        Keyword arguments and results are described at :func:`seeddms.tree.walk`.
+
+        .. code-block:: python
+
+           for folder, folders, documents in sdms.walk(1, maxdepth=2):
+               print folder['name'], len(folders), len(documents)
+        """
+        return tree.walk(self, folder_id, **kwargs)
+
     def get_folder_attributes(self, folder_id):
         """
         """
@@ -801,6 +1545,7 @@ class SeedDMS(object):
         req_obj = self.rest_get("/folder/:id/children",
                                 argdict={'id': folder_id})
         if req_obj.success:
+            self.folderdict.add_children(folder_id, req_obj.data)
             return req_obj.data
 
     def get_folder_parent(self, folder_id):
@@ -824,10 +1569,12 @@ class SeedDMS(object):
         """
         req_obj = self.rest_get("/folder/:id/path", argdict={'id': folder_id})
         if req_obj.success:
+            self.folderdict.add_path(req_obj.data)
             return req_obj.data
 
     def get_folder_path_str(self, folder_id):
-        """wrapper for :meth:`get_folder_path` returns a string.
+        """wrapper for :meth:`get_folder_path` returns a string. Paths in
+        :py:attr:`~folderdict` are not fetched again.
 
         :param folder_id: nummeric folder id
         :type folder_id: int
@@ -837,10 +1584,62 @@ class SeedDMS(object):
            sdms.get_folder_path_str(2)
            u'DMS/aotearoa'
         """
+        path = self.folderdict.path(folder_id)
+        if path is not None:
+            return "/".join(path)
+
         data = self.get_folder_path(folder_id)
         retv = "/".join([x.get('name') for x in data])
         return retv
 
+    def lookup_folder_id(self, path):
+        """get the nummeric id of a folder path.
+
+        The path is resolved from the longest part already in
+        :py:attr:`~folderdict`, listing the children of each next folder.
+
+        :param path: folder names separated by ``/``, starting with the
+                 name of the root folder
+        :type path: str
+        :returns: folder id
+        :rtype: int or None
+
+        .. code-block:: python
+
+           sdms.lookup_folder_id('DMS/aotearoa/2014')
+           7
+        """
+        names = [x for x in path.split("/") if x]
+        if not names:
+            return None
+
+        found = 0
+        folder_id = None
+        for count in range(len(names), 0, -1):
+            folder_id = self.folderdict.lookup_path("/".join(names[:count]))
+            if folder_id is not None:
+                found = count
+                break
+
+        if found == 0:
+            root = self.get_folder()
+            if root is None or root.get('name') != names[0]:
+                return None
+            folder_id = root.get('id')
+            found = 1
+
+        for name in names[found:]:
+            # use the listing itself, another thread may invalidate the
+            # cache in between
+            children = self.get_folder_children(folder_id) or []
+            matches = [x for x in children
+                       if x.get('type') == 'folder' and x.get('name') == name]
+            if not matches:
+                return None
+            folder_id = int(matches[0].get('id'))
+
+        return folder_id
+
     def create_folder(self, folder_id, **kwargs):
         """create a folder.
 
@@ -855,6 +1654,9 @@ class SeedDMS(object):
         * **name**
         * **attributes** NOT SUPPORTED YET
 
+        :returns: dictionary with the info of the new folder
+        :rtype: dict
+
         .. todo: unclear on how to handle the attributes
         """
         params = dict()
@@ -869,47 +1671,107 @@ class SeedDMS(object):
         if not req_obj.success:
             raise SeedDMSException("failed to create folder %(name)s" % kwargs)
 
-        folder_id = req_obj.data.get('id')
+        self.folderdict.add_folder(req_obj.data, folder_id)
+        return req_obj.data
+
+    @staticmethod
+    def __upload_body(source, chunk_size):
+        """return a request body for ``source``.
 
-    def __upload_document(self, action, folder_id, documentpath, name=None, **kwargs):
+        Files and buffers whose size can be determined are passed as is, they
+        are sent with a ``Content-Length`` and read in small blocks while
+        sending. Pipes, sockets and iterators are sent with chunked
+        transfer encoding, ``chunk_size`` bytes at a time.
+        """
+        if not hasattr(source, 'read'):
+            return iter(source)
+
+        try:
+            position = source.tell()
+            source.seek(0, os.SEEK_END)
+            source.seek(position)
+            return source
+        except (AttributeError, IOError, OSError, ValueError):
+            return iter(lambda: source.read(chunk_size), b'')
+
+    def __upload_document(self, action, folder_id, document, name=None,
+                          chunk_size=CHUNK_SIZE, **kwargs):
         """
 
         """
-        params = dict()
         req_obj = None
-        origfilename = os.path.basename(documentpath)
-        datablob = open(documentpath, "r").read()
+        ifh = None
+
+        if isinstance(document, basestring):
+            origfilename = os.path.basename(document)
+            ifh = open(document, "rb")
+            source = ifh
+        else:
+            origfilename = os.path.basename(getattr(document, 'name', '') or '')
+            source = document
+
+        origfilename = kwargs.get('origfilename') or origfilename
 
         if name is None:
             name = origfilename
 
-        params = {'name': name, 'origfilename': origfilename}
+        if not name:
+            raise SeedDMSException("no name given for the uploaded document")
+
+        params = {'name': name, 'origfilename': origfilename or name}
 
         for item in ['comment', 'version', 'public']:
             if item in kwargs:
                 params[item] = kwargs[item]
 
-        if action == "post":
-            req_obj = self.rest_post("/folder/:id/document",
-                                     argdict={'id': folder_id},
-                                     data=datablob,
-                                     params=params)
-        elif action == "put":
-            req_obj = self.rest_put("/folder/:id/document",
-                                    argdict={'id': folder_id},
-                                    data=datablob,
-                                    params=params)
+        try:
+            datablob = self.__upload_body(source, chunk_size)
+
+            if action == "post":
+                req_obj = self.rest_post("/folder/:id/document",
+                                         argdict={'id': folder_id},
+                                         data=datablob,
+                                         params=params)
+            elif action == "put":
+                req_obj = self.rest_put("/folder/:id/document",
+                                        argdict={'id': folder_id},
+                                        data=datablob,
+                                        params=params)
+        finally:
+            if ifh is not None:
+                ifh.close()
 
         if req_obj.success:
             return req_obj.data
 
     def upload_document(self, folder_id, documentpath, name=None, **kwargs):
-        """
+        """upload a document into a folder.
+
+        The content is streamed, it is never read into memory as a whole.
+
+        :param folder_id: nummeric folder id
+        :type folder_id: int
+        :param documentpath: path of the file to upload, a file object
+                 (regular file, :class:`io.BytesIO`, pipe) or an iterator of
+                 strings
+        :type documentpath: str, file object or iterator
+        :param name: name of the document, defaults to the file name
+
           arguments:
-            - name
             - keywords
-            - origfilename
+            - origfilename, required for iterators and unnamed buffers
+              when ``name`` is not given
             - foldername (opt)
+            - chunk_size, bytes read at once from pipes and iterators
+
+        .. code-block:: python
+
+           sdms.upload_document(folder_id, '/tmp/grammar.pdf')
+
+           proc = subprocess.Popen(['pg_dump', 'mydb'], stdout=subprocess.PIPE)
+           sdms.upload_document(folder_id, proc.stdout, name='mydb.sql')
+
+           sdms.upload_document(folder_id, io.BytesIO(pdfdata), name='report.pdf')
         """
         return self.__upload_document("post", folder_id, documentpath, name, **kwargs)
 
@@ -919,6 +1781,8 @@ class SeedDMS(object):
           - name
           - origfilename
           - foldername (opt)
+
+        ``documentpath`` accepts the same sources as :meth:`upload_document`.
         """
         return self.__upload_document("put", folder_id, documentpath, name, **kwargs)
 
@@ -928,6 +1792,7 @@ class SeedDMS(object):
         req_obj = self.rest_post("/folder/:id/move/:folderid",
                                  argdict={'id': folder_id,
                                           'folderid': parent_folder_id})
+        self.folderdict.invalidate(folder_id)
         if req_obj.success:
             return req_obj.data
 
@@ -996,7 +1861,7 @@ class SeedDMS(object):
           arguments:
             - enable
         """
-        req_obj = self.rest_get("/folder/:id/setInherit", argdict={'id': folder_id})
+        req_obj = self.rest_put("/folder/:id/setInherit", argdict={'id': folder_id})
         if req_obj.success:
             return req_obj.data
 
@@ -1008,6 +1873,7 @@ class SeedDMS(object):
         """
         folder_id = self.get_folder_id(folder_id)
         req_obj = self.rest_delete("/folder/:id", argdict={'id': folder_id})
+        self.folderdict.invalidate(folder_id)
         if req_obj.success:
             return req_obj.data
 
@@ -1015,10 +1881,26 @@ class SeedDMS(object):
         """derived function; call `get_folder` but return the content of the
         `id` field.
 
-        :param group_id: nummeric group id or group name
-        :type group_id: int or str
+        Ids in :py:attr:`~folderdict` are returned as is, paths containing a
+        ``/`` are resolved with :meth:`lookup_folder_id`.
+
+        :param folder_id: nummeric folder id, folder name or folder path
+        :type folder_id: int or str
+
+        .. note:: every string containing a ``/`` is taken as a path, a
+           folder whose own name contains a ``/`` can only be found by its
+           nummeric id.
 
         """
+        if isinstance(folder_id, basestring) and "/" in folder_id:
+            retv = self.lookup_folder_id(folder_id)
+            if retv is None:
+                raise SeedDMSException("folder %s does not exist" % folder_id)
+            return retv
+
+        if self.folderdict.path(folder_id) is not None:
+            return int(folder_id)
+
         return self.get_folder(folder_id)['id']
 
 # ------------------------------------------------------------------------------
@@ -1026,7 +1908,7 @@ class SeedDMS(object):
 # ------------------------------------------------------------------------------
 
     def get_group(self, group_id):
-        """get the info matching a group
+        """get the info matching a group, looked up in :py:attr:`~directory`.
 
         :param group_id: nummeric group id or group name
         :type group_id: int or str
@@ -1048,10 +1930,7 @@ class SeedDMS(object):
             u'users': []}
 
         """
-        req_obj = self.rest_get("/groups/:id",
-                                argdict={'id': group_id})
-        if req_obj.success:
-            return req_obj.data
+        return self.directory.group(group_id)
 
     def create_group(self, **kwargs):
         """create a group
@@ -1071,6 +1950,7 @@ class SeedDMS(object):
         req_obj = self.rest_post("/groups",
                                  params={'name': kwargs.get('name'),
                                          'comment': kwargs.get('comment', '')})
+        self.directory.invalidate_group(kwargs.get('name'))
         if req_obj.success:
             return req_obj.data
 
@@ -1090,11 +1970,13 @@ class SeedDMS(object):
            sdms.add_user_to_group("aotearoa", user_id)
 
         """
-        group_data = self.get_group(group_id)
-        group_id = group_data.get('id')
+        idn = self.directory.group_id(group_id)
+        if idn is None:
+            raise SeedDMSException("group %s does not exist" % group_id)
         req_obj = self.rest_put("/groups/:id/addUser",
-                                argdict={'id': group_id},
+                                argdict={'id': idn},
                                 params={'userid': user_id})
+        self.directory.invalidate_group(idn, members=True)
         if req_obj.success:
             return req_obj.data
 
@@ -1117,9 +1999,13 @@ class SeedDMS(object):
            sdms.remove_user_from_group(group_id, user_id)
 
         """
+        idn = self.directory.group_id(group_id)
+        if idn is None:
+            raise SeedDMSException("group %s does not exist" % group_id)
         req_obj = self.rest_put("/groups/:id/removeUser",
-                                argdict={'id': group_id},
+                                argdict={'id': idn},
                                 params={'userid': user_id})
+        self.directory.invalidate_group(idn, members=True)
         if req_obj.success:
             return req_obj.data
 
@@ -1137,6 +2023,7 @@ class SeedDMS(object):
 
         * **query**, query string
         * **limit**, limit amount of results
+        * **offset**, number of results to skip
         * **mode**,
 
         .. note:: what does ``typeahead`` do for ``mode`` ??
@@ -1158,7 +2045,7 @@ class SeedDMS(object):
         """
         params = dict()
 
-        for keyn in ['limit', 'mode', 'query']:
+        for keyn in ['limit', 'offset', 'mode', 'query']:
             if keyn in kwargs:
                 params[keyn] = kwargs.get(keyn)
 
@@ -1178,6 +2065,7 @@ class SeedDMS(object):
         * **name**, attribute name
         * **value**, attribute value
         * **limit**, limit amount of results
+        * **offset**, number of results to skip
 
         .. code-block:: python
 
@@ -1192,7 +2080,7 @@ class SeedDMS(object):
         """
         params = dict()
 
-        for keyn in ['limit', 'name', 'value']:
+        for keyn in ['limit', 'offset', 'name', 'value']:
             if keyn in kwargs:
                 params[keyn] = kwargs.get(keyn)
 
@@ -1201,6 +2089,116 @@ class SeedDMS(object):
         if req_obj.success:
             return req_obj.data
 
+    def __iter_pages(self, url, keys, page_size, kwargs):
+        """generate the results of a search url page by page."""
+        params = dict()
+        for keyn in keys:
+            if keyn in kwargs:
+                params[keyn] = kwargs.get(keyn)
+
+        limit = kwargs.get('limit')
+        start = kwargs.get('offset', 0)
+        offset = start
+        count = 0
+        first_page = None
+
+        while limit is None or count < limit:
+            size = page_size
+            if limit is not None:
+                size = min(page_size, limit - count)
+
+            params['limit'] = size
+            params['offset'] = offset
+            page = self.__search_page(url, params)
+
+            keys_of_page = [(x.get('type'), x.get('id')) for x in page]
+            if first_page is None:
+                first_page = keys_of_page
+            elif keys_of_page and keys_of_page == first_page[:len(keys_of_page)]:
+                # the server ignores the offset, get the rest at once
+                if start:
+                    raise SeedDMSException("%s does not support an offset" % url)
+                del params['limit']
+                del params['offset']
+                rest = self.__search_page(url, params)[count:]
+                if limit is not None:
+                    rest = rest[:limit - count]
+                for row in rest:
+                    yield row
+                return
+
+            page = page[:size]
+            for row in page:
+                yield row
+            count += len(page)
+
+            if len(page) < size:
+                return
+            offset += len(page)
+
+    def __search_page(self, url, params):
+        """return the results of one search request."""
+        req_obj = self.rest_get(url, params=params)
+        if not req_obj.success:
+            raise SeedDMSException("search %s failed: %s" % (url, req_obj.message))
+        return req_obj.data or []
+
+    def iter_search(self, page_size=100, **kwargs):
+        """generate the results of :meth:`do_search` page by page.
+
+        Only one page of ``page_size`` results is requested and held at a
+        time, so the first results are available early and stopping the
+        iteration skips the remaining pages. When the server turns out to
+        ignore the offset, the remaining results are requested at once.
+
+        :param page_size: number of results requested at once
+        :type page_size: int
+        :param kwargs: dictionary of parameters
+        :type kwargs: dict
+
+        ``kwargs`` names as for :meth:`do_search`; **limit** is the total
+        number of results (default: all) and **offset** the number of
+        results to skip.
+
+        .. code-block:: python
+
+           for row in sdms.iter_search(query="2014", page_size=500):
+               if row.get('type') == 'document':
+                   print row.get('name')
+                   break
+
+        """
+        return self.__iter_pages("/search", ['mode', 'query'], page_size, kwargs)
+
+    def iter_search_by_attr(self, page_size=100, **kwargs):
+        """generate the results of :meth:`do_search_by_attr` page by page,
+        see :meth:`iter_search`.
+
+        :param page_size: number of results requested at once
+        :type page_size: int
+        :param kwargs: dictionary of parameters
+        :type kwargs: dict
+        """
+        return self.__iter_pages("/searchbyattr", ['name', 'value'], page_size, kwargs)
+
+    def batch_search(self, queries, **kwargs):
+        """run many searches at the same time and merge the results.
+
+        :param queries: list of keyword argument dictionaries for
+                 :meth:`do_search` or :meth:`do_search_by_attr`
+        :type queries: list
+
+        Keyword arguments and results are described at
+        :func:`seeddms.search.batch_search`.
+
+        .. code-block:: python
+
+           found = sdms.batch_search([{'query': '2014'}, {'query': '2015'}],
+                                     sort='name')
+           print len(found['results'])
+        """
+        return search.batch_search(self, queries, **kwargs)
+
 # ------------------------------------------------------------------------------
 # USERS
 # ------------------------------------------------------------------------------
@@ -1244,8 +2242,9 @@ class SeedDMS(object):
             return req_obj.data
 
     def get_user_by_name(self, user_name):
-        """get a users data by its user name/login. Calls :meth:`get_users` to
-        get a list of users.
+        """get a users data by its user name/login. Looked up in
+        :py:attr:`~directory`, which calls :meth:`get_users` to get a list of
+        users.
 
         :param user_name: username
         :type user_name: str
@@ -1268,12 +2267,10 @@ class SeedDMS(object):
             u'type': u'user'}
 
         """
-        for req_obj in self.get_users():
-            if req_obj['login'] == user_name:
-                return req_obj
+        return self.directory.user_by_login(user_name)
 
     def get_user_by_id(self, user_id):
-        """get a users data by its user id.
+        """get a users data by its user id, looked up in :py:attr:`~directory`.
 
         :param user_id: nummeric user id
         :type user_id: int
@@ -1297,9 +2294,7 @@ class SeedDMS(object):
 
 
         """
-        req_obj = self.rest_get("/users/:id", argdict={'id': user_id})
-        if req_obj.success:
-            return req_obj.data
+        return self.directory.user_by_id(user_id)
 
     def create_user(self, **kwargs):
         """
@@ -1341,7 +2336,9 @@ class SeedDMS(object):
         if 'pass' in data:
             data['pass'] = self.encpasswd(data.get('pass'))
 
-        return self.rest_post("/users", params=data)
+        req_obj = self.rest_post("/users", params=data)
+        self.directory.invalidate_users()
+        return req_obj
 
     def set_disabled_user(self, user_id):
         """disable a user
@@ -1360,6 +2357,7 @@ class SeedDMS(object):
                                 argdict={'id': user_id},
                                 params={'disable': True})
         if req_obj.success:
+            self.directory.update_user(user_id, disabled=True)
             return req_obj.data
 
     def set_enabled_user(self, user_id):
@@ -1379,6 +2377,7 @@ class SeedDMS(object):
                                 argdict={'id': user_id},
                                 params={'disable': False})
         if req_obj.success:
+            self.directory.update_user(user_id, disabled=False)
             return req_obj.data
 
     @staticmethod
@@ -1434,5 +2433,7 @@ class SeedDMS(object):
 
         """
         req_obj = self.rest_delete("/users/:id", argdict={'id': user_id})
+        self.directory.invalidate_user(user_id)
+        self.directory.invalidate_groups()
         if req_obj.success:
             return req_obj.data
@@ -0,0 +1,105 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""search.py - run many searches at once"""
+
+import time
+from multiprocessing.pool import ThreadPool
+
+
+def run_query(sdms, query, page_size=None):
+    """run one query, see :func:`batch_search`."""
+    kwargs = dict(query)
+    by_attr = 'name' in kwargs or 'value' in kwargs
+
+    if page_size is None:
+        if by_attr:
+            return sdms.do_search_by_attr(**kwargs) or []
+        return sdms.do_search(**kwargs) or []
+
+    if by_attr:
+        return list(sdms.iter_search_by_attr(page_size=page_size, **kwargs))
+    return list(sdms.iter_search(page_size=page_size, **kwargs))
+
+
+def batch_search(sdms, queries, workers=8, sort=None, reverse=False,
+                 page_size=None):
+    """run many searches at the same time and merge the results.
+
+    Every query holds the keyword arguments for
+    :meth:`seeddms.rest.SeedDMS.do_search`, or for
+    :meth:`seeddms.rest.SeedDMS.do_search_by_attr` when it has a ``name``
+    or ``value``. Duplicate results are returned once; a failed query is
+    reported in its ``error``.
+
+    :param sdms: logged in client
+    :param queries: list of query dictionaries
+    :param workers: number of queries run at the same time (default: ``8``)
+    :param sort: field name or key function to sort the merged results by
+             (default: the order of the queries)
+    :param reverse: sort in descending order
+    :param page_size: fetch all pages of every query with
+             :meth:`seeddms.rest.SeedDMS.iter_search` (default: only the
+             results the server returns for a single request)
+    :type sdms: :class:`seeddms.rest.SeedDMS`
+    :type queries: list
+    :type workers: int
+    :type sort: str or callable
+    :type reverse: bool
+    :type page_size: int
+    :returns: ``results``, the merged results, ``queries``, a list with
+             the ``query``, ``count``, ``elapsed`` and ``error`` of every
+             query in the same order as ``queries``, and the total
+             ``elapsed`` time
+    :rtype: dict
+
+    .. code-block:: python
+
+       queries = [{'name': 'customer', 'value': str(x)} for x in customers]
+       queries.append({'query': '2014', 'limit': 100})
+       found = batch_search(sdms, queries, workers=16, sort='date')
+       for row in found['results']:
+           print row['type'], row['id'], row['name']
+       slowest = max(found['queries'], key=lambda x: x['elapsed'])
+
+    """
+    started = time.time()
+
+    def timed(query):
+        begin = time.time()
+        try:
+            rows = run_query(sdms, query, page_size)
+            error = None
+        except Exception as err:
+            rows = []
+            error = str(err)
+        return rows, {'query': query, 'count': len(rows),
+                      'elapsed': time.time() - begin, 'error': error}
+
+    pool = ThreadPool(max(1, min(workers, len(queries))))
+    try:
+        answers = pool.map(timed, queries)
+    finally:
+        pool.terminate()
+        pool.join()
+
+    results = list()
+    seen = set()
+    for rows, _ in answers:
+        for row in rows:
+            key = (row.get('type'), str(row.get('id')))
+            if key in seen:
+                continue
+            seen.add(key)
+            results.append(row)
+
+    if sort is not None:
+        def keyfunc(row):
+            return row.get(sort)
+
+        if callable(sort):
+            keyfunc = sort
+        results.sort(key=keyfunc, reverse=reverse)
+
+    return {'results': results,
+            'queries': [x[1] for x in answers],
+            'elapsed': time.time() - started}
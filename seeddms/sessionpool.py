@@ -0,0 +1,155 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""sessionpool.py - act as many users over one connection pool"""
+
+import threading
+from collections import OrderedDict
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from .exceptions import SeedDMSException
+from .rest import SeedDMS
+
+
+class SessionPool(object):
+    """Logged in clients for many users of one DMS
+
+    :meth:`get` returns the client of a user, logging in on first use.
+    All clients share one connection pool, so switching between users
+    does not open new connections. At most ``max_sessions`` clients are
+    kept, the least recently used one is logged out when another user is
+    added.
+
+    :param baseurl: url path to the rest api
+    :param passwords: password per user name, or a function called with a
+             user name that returns the password
+    :param max_sessions: number of users logged in at the same time
+             (default: ``16``)
+    :param pool_connections: number of host connection pools to keep
+             (default: ``10``)
+    :param pool_maxsize: maximum number of connections kept per host,
+             shared by all users (default: ``10``)
+    :param pool_block: block when all connections are in use (default:
+             ``False``)
+    :type baseurl: str
+    :type passwords: dict or callable
+    :type max_sessions: int
+    :type pool_connections: int
+    :type pool_maxsize: int
+    :type pool_block: bool
+
+    Other keyword arguments are passed to every
+    :class:`seeddms.rest.SeedDMS`, e.g. a shared ``response_cache``,
+    ``retry`` policy or ``limits``.
+
+    Example::
+
+        sessions = SessionPool(config.baseurl, passwords, max_sessions=8)
+        for login, document_id in grants:
+            sessions.get(login).get_document(document_id)
+        sessions.close()
+
+    .. note:: a client that is logged out on eviction while another thread
+       still uses it fails with a rejected session, or logs in again when
+       it has a :class:`seeddms.resilience.RetryPolicy`.
+    """
+
+    def __init__(self, baseurl, passwords, max_sessions=16, pool_connections=10,
+                 pool_maxsize=10, pool_block=False, **kwargs):
+        self.baseurl = baseurl
+        self.passwords = passwords
+        self.max_sessions = max_sessions
+        self.kwargs = kwargs
+        self.adapter = HTTPAdapter(pool_connections=pool_connections,
+                                   pool_maxsize=pool_maxsize,
+                                   pool_block=pool_block)
+
+        self.clients = OrderedDict()
+        self.lock = threading.Lock()
+        self.stats = {'hits': 0, 'logins': 0, 'evictions': 0}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def __len__(self):
+        return len(self.clients)
+
+    def __contains__(self, username):
+        return username in self.clients
+
+    def password_for(self, username):
+        """return the password of ``username``."""
+        if callable(self.passwords):
+            return self.passwords(username)
+        try:
+            return self.passwords[username]
+        except KeyError:
+            raise SeedDMSException("no password for user %s" % username)
+
+    def get(self, username):
+        """return the logged in client of ``username``.
+
+        :param username: user name to login with
+        :type username: str
+        :rtype: :class:`seeddms.rest.SeedDMS`
+        """
+        evicted = list()
+        with self.lock:
+            entry = self.clients.pop(username, None)
+            if entry is None:
+                client = SeedDMS(baseurl=self.baseurl, username=username,
+                                 password=self.password_for(username),
+                                 adapter=self.adapter, **self.kwargs)
+                entry = {'client': client, 'lock': threading.Lock(),
+                         'ready': False}
+                while self.clients and len(self.clients) >= self.max_sessions:
+                    evicted.append(self.clients.popitem(last=False)[1])
+                    self.stats['evictions'] += 1
+            else:
+                self.stats['hits'] += 1
+            self.clients[username] = entry
+
+        for old in evicted:
+            self.__logout(old)
+
+        with entry['lock']:
+            if not entry['ready']:
+                entry['client'].do_login()
+                entry['ready'] = True
+                with self.lock:
+                    self.stats['logins'] += 1
+        return entry['client']
+
+    __getitem__ = get
+
+    @staticmethod
+    def __logout(entry):
+        with entry['lock']:
+            if not entry['ready']:
+                return
+            entry['ready'] = False
+            try:
+                entry['client'].do_logout()
+            except (SeedDMSException, requests.RequestException, ValueError):
+                # the session is dropped either way
+                pass
+
+    def discard(self, username):
+        """logout ``username`` and drop its client."""
+        with self.lock:
+            entry = self.clients.pop(username, None)
+        if entry is not None:
+            self.__logout(entry)
+
+    def close(self):
+        """logout all users and close the connection pool."""
+        with self.lock:
+            entries = list(self.clients.values())
+            self.clients.clear()
+        for entry in entries:
+            self.__logout(entry)
+        self.adapter.close()
@@ -0,0 +1,122 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""sessionstore.py - share login sessions between processes"""
+
+import os
+import json
+import time
+import errno
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # not available on windows
+    fcntl = None
+
+
+class SessionStore(object):
+    """File based store of login sessions
+
+    :meth:`seeddms.rest.SeedDMS.do_login` saves the session cookie in the
+    store and later logins, by the same or another process, reuse it as
+    long as the server accepts it instead of creating a new session. A
+    stored session is validated with a ``GET /account`` before it is used,
+    unless it was validated less than ``trust`` seconds ago. Expired
+    sessions are renewed on the next login; with a
+    :class:`seeddms.resilience.RetryPolicy` also when a request is
+    rejected.
+
+    Sessions are stored per url and user name in one JSON file, readable
+    by its owner only. Logins hold an exclusive lock on ``path + '.lock'``
+    so concurrent processes renew an expired session only once.
+
+    :param path: path of the store (default: ``~/.seeddms-cli.session``,
+             next to the configuration file)
+    :param trust: seconds a validated session is used without validating
+             it again (default: ``0``, validate on every login)
+    :type path: str
+    :type trust: int
+
+    Example::
+
+        store = SessionStore()
+        sdms = seeddms.SeedDMS(baseurl=config.baseurl,
+                               username=config.username,
+                               password=config.password,
+                               session_store=store)
+        sdms.do_login()
+
+    .. note:: :meth:`seeddms.rest.SeedDMS.do_logout` ends the session for
+       all processes sharing it; scripts using the store normally do not
+       logout.
+    """
+
+    def __init__(self, path='~/.seeddms-cli.session', trust=0):
+        self.path = os.path.expanduser(path)
+        self.trust = trust
+
+    @staticmethod
+    def key(baseurl, username):
+        """return the key of the session of ``username`` at ``baseurl``."""
+        return "%s %s" % (username, baseurl)
+
+    @contextmanager
+    def locked(self):
+        """hold the exclusive lock of the store within the block."""
+        lockfh = open(self.path + '.lock', 'a')
+        try:
+            if fcntl is not None:
+                fcntl.flock(lockfh.fileno(), fcntl.LOCK_EX)
+            yield
+        finally:
+            # closing the file releases the lock
+            lockfh.close()
+
+    def read(self):
+        """return all stored sessions by key."""
+        try:
+            with open(self.path) as ifh:
+                return json.load(ifh)
+        except IOError as err:
+            if err.errno == errno.ENOENT:
+                return dict()
+            raise
+        except ValueError:
+            # cut short by a crash, start over
+            return dict()
+
+    def write(self, sessions):
+        """replace all stored sessions."""
+        tmppath = "%s.%d.tmp" % (self.path, os.getpid())
+        fd = os.open(tmppath, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0600)
+        with os.fdopen(fd, 'w') as ofh:
+            json.dump(sessions, ofh)
+        os.rename(tmppath, self.path)
+
+    def load(self, baseurl, username):
+        """return the stored session, a dictionary with the ``cookies`` and
+        the time it was ``stored`` and ``validated``, or ``None``."""
+        return self.read().get(self.key(baseurl, username))
+
+    def save(self, baseurl, username, cookies, validated=None):
+        """store the session cookies of ``username`` at ``baseurl``."""
+        sessions = self.read()
+        now = time.time()
+        sessions[self.key(baseurl, username)] = {
+            'cookies': cookies, 'stored': now, 'validated': validated or now}
+        self.write(sessions)
+
+    def drop(self, baseurl, username, cookies=None):
+        """drop the stored session, only if it has ``cookies`` when set."""
+        sessions = self.read()
+        entry = sessions.get(self.key(baseurl, username))
+        if entry is None:
+            return
+        if cookies is not None and entry.get('cookies') != cookies:
+            return
+        del sessions[self.key(baseurl, username)]
+        self.write(sessions)
+
+    def trusted(self, entry):
+        """return ``True`` if ``entry`` can be used without validation."""
+        return time.time() - entry.get('validated', 0) < self.trust
@@ -0,0 +1,80 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""tree.py - traverse folder trees of the DMS"""
+
+import Queue
+from multiprocessing.pool import ThreadPool
+
+
+def walk(sdms, top, concurrency=4, maxdepth=None, folder_filter=None):
+    """generate the folders and documents of a folder tree, like
+    :func:`os.walk`.
+
+    The children of up to ``concurrency`` folders are fetched at the same
+    time, so the order of the folders is not fixed. Removing entries from
+    ``folders`` prunes those branches.
+
+    :param sdms: logged in client
+    :param top: nummeric id or name of the top folder
+    :param concurrency: number of folders fetched at the same time
+             (default: ``4``)
+    :param maxdepth: depth below ``top`` to descend to, ``0`` only lists
+             ``top`` itself (default: unlimited)
+    :param folder_filter: function called with the info of a sub folder,
+             the folder is skipped when it returns ``False``
+    :type sdms: :class:`seeddms.rest.SeedDMS`
+    :type top: int or str
+    :type concurrency: int
+    :type maxdepth: int
+    :type folder_filter: callable
+    :returns: generator of ``(folder, folders, documents)`` tuples
+
+    .. code-block:: python
+
+       for folder, folders, documents in walk(sdms, 1, concurrency=16):
+           folders[:] = [x for x in folders if x['name'] != 'archive']
+           for document in documents:
+               print folder['name'], document['name']
+
+    """
+    root = sdms.get_folder(top)
+    if root is None:
+        return
+
+    results = Queue.Queue()
+    pool = ThreadPool(concurrency)
+    pending = [0]
+
+    def fetch(folder, depth):
+        try:
+            children = sdms.get_folder_children(folder['id']) or []
+            results.put((folder, depth, children, None))
+        except Exception as err:
+            results.put((folder, depth, None, err))
+
+    def schedule(folder, depth):
+        pending[0] += 1
+        pool.apply_async(fetch, (folder, depth))
+
+    try:
+        schedule(root, 0)
+        while pending[0]:
+            folder, depth, children, err = results.get()
+            pending[0] -= 1
+            if err is not None:
+                raise err
+
+            folders = [x for x in children if x.get('type') == 'folder']
+            documents = [x for x in children if x.get('type') == 'document']
+            yield folder, folders, documents
+
+            if maxdepth is not None and depth >= maxdepth:
+                continue
+
+            for subfolder in folders:
+                if folder_filter is None or folder_filter(subfolder):
+                    schedule(subfolder, depth + 1)
+    finally:
+        # also reached when the caller stops iterating early
+        pool.terminate()
+        pool.join()
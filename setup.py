@@ -20,7 +20,7 @@ setup(
     author='John van Zantvoort',
     author_email='john@vanzantvoort.org',
     url='https://github.com/jvzantvoort/seeddms',
-    packages=find_packages(exclude=['docs', 'docs-src', 'tests']),
+    packages=find_packages(exclude=['docs', 'docs-src', 'tests', 'benchmarks']),
     install_requires=['requests'],
     license='MIT',
     test_suite="tests",
@@ -0,0 +1,199 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""standin.py - local stand-in for the SeedDMS REST api
+
+Lets tests and benchmarks of the client run without a DMS. Login, logout and ``/account``
+are built in; every other url is answered by a route the test registers in
+:py:attr:`StandinServer.routes` under its method and path, e.g.
+``GET /folder/1/children``. A route is called with the handler and the
+query parameters and returns the status, the headers and the body; a body
+that is not a string is sent as JSON.
+"""
+
+__author__ = "John van Zantvoort"
+
+import re
+import sys
+import json
+import uuid
+import socket
+import threading
+import unittest
+import urlparse
+import BaseHTTPServer
+import SocketServer
+
+import seeddms
+
+
+def ok(data):
+    """return a successful reply with ``data``."""
+    return 200, {}, {'success': True, 'message': '', 'data': data}
+
+
+def failed(message, code=200):
+    """return a reply of a failed call."""
+    return code, {}, {'success': False, 'message': message, 'data': ''}
+
+
+def content(handler, blob, ranges=True):
+    """return a reply with ``blob``, or the range of it asked for."""
+    byte_range = handler.headers.get('Range')
+    if not ranges or byte_range is None:
+        return 200, {}, blob
+
+    match = re.match(r"bytes=(\d+)-(\d*)$", byte_range)
+    first = int(match.group(1))
+    last = len(blob) - 1
+    if match.group(2):
+        last = min(int(match.group(2)), last)
+    if first >= len(blob):
+        return 416, {'Content-Range': 'bytes */%d' % len(blob)}, ''
+    return 206, {'Content-Range': 'bytes %d-%d/%d' % (first, last, len(blob))}, \
+        blob[first:last + 1]
+
+
+class StandinHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+    """request handler speaking HTTP/1.1 so connections can be kept alive."""
+
+    protocol_version = 'HTTP/1.1'
+    # buffer the response so headers and body leave in one segment
+    wbufsize = -1
+
+    def log_message(self, fmt, *args):
+        pass
+
+    def send(self, code, headers, body):
+        if not isinstance(body, basestring):
+            body = json.dumps(body)
+        self.send_response(code)
+        self.send_header('Content-Length', str(len(body)))
+        for keyname, keyvalue in headers.items():
+            self.send_header(keyname, keyvalue)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def read_body(self):
+        if self.headers.get('Transfer-Encoding') == 'chunked':
+            chunks = list()
+            while True:
+                size = int(self.rfile.readline().split(';')[0], 16)
+                if size == 0:
+                    self.rfile.readline()
+                    return ''.join(chunks)
+                chunks.append(self.rfile.read(size))
+                self.rfile.readline()
+        length = int(self.headers.get('Content-Length') or 0)
+        if length:
+            return self.rfile.read(length)
+        return ''
+
+    def session(self):
+        match = re.search(r"mydms_session=(\w+)", self.headers.get('Cookie', ''))
+        if match:
+            return match.group(1)
+
+    def handle_method(self):
+        server = self.server
+        parsed = urlparse.urlparse(self.path)
+        route = parsed.path.split('index.php', 1)[-1]
+        query = dict(urlparse.parse_qsl(parsed.query, keep_blank_values=True))
+        self.body = self.read_body()
+        key = "%s %s" % (self.command, route)
+
+        with server.lock:
+            server.hits[key] = server.hits.get(key, 0) + 1
+
+        if route == '/login':
+            session = uuid.uuid4().hex
+            with server.lock:
+                server.sessions.add(session)
+                server.logins += 1
+            code, headers, body = ok('')
+            headers['Set-Cookie'] = 'mydms_session=%s; path=/' % session
+            return self.send(code, headers, body)
+
+        if self.session() not in server.sessions:
+            return self.send(*failed('Not logged in', 403))
+
+        if route == '/logout':
+            server.sessions.discard(self.session())
+            return self.send(*ok(''))
+        if route == '/account' and key not in server.routes:
+            return self.send(*ok({'id': 1, 'login': 'admin'}))
+
+        handler = server.routes.get(key)
+        if handler is None:
+            return self.send(*failed('no route %s' % key, 404))
+        return self.send(*handler(self, query))
+
+    do_GET = do_POST = do_PUT = do_DELETE = handle_method
+
+
+class StandinServer(SocketServer.ThreadingMixIn, BaseHTTPServer.HTTPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, *args):
+        BaseHTTPServer.HTTPServer.__init__(self, *args)
+        self.lock = threading.Lock()
+        self.routes = dict()
+        self.hits = dict()
+        self.sessions = set()
+        self.logins = 0
+
+    def handle_error(self, request, client_address):
+        # daemon threads may still run at interpreter shutdown, when the
+        # module globals have been set to None
+        if sys is None or socket is None or BaseHTTPServer is None:
+            return
+        # clients may close a response before reading all of it
+        if isinstance(sys.exc_info()[1], socket.error):
+            return
+        BaseHTTPServer.HTTPServer.handle_error(self, request, client_address)
+
+
+def start_server(host='127.0.0.1', port=0):
+    """start a stand-in server in a background thread.
+
+    :returns: the server and the baseurl to pass to :class:`seeddms.SeedDMS`
+    :rtype: tuple
+    """
+    server = StandinServer((host, port), StandinHandler)
+    thread = threading.Thread(target=server.serve_forever)
+    thread.daemon = True
+    thread.start()
+    baseurl = 'http://%s:%d/restapi/index.php' % server.server_address
+    return server, baseurl
+
+
+class StandinWrapper(unittest.TestCase):
+    """test case with a stand-in server and a client logged in to it."""
+
+    client_args = dict()
+
+    def setUp(self):
+        self.server, self.baseurl = start_server()
+        self.clients = list()
+        self.sdms = self.client()
+        self.sdms.do_login()
+
+    def tearDown(self):
+        for client in self.clients:
+            client.close()
+        self.server.shutdown()
+        self.server.server_close()
+
+    def client(self, **kwargs):
+        """return a client of the stand-in server, closed by
+        :meth:`tearDown`."""
+        args = dict(self.client_args)
+        args.update(kwargs)
+        client = seeddms.SeedDMS(baseurl=self.baseurl, username='admin',
+                                 password='admin', **args)
+        self.clients.append(client)
+        return client
+
+    def route(self, key, handler):
+        """answer ``key`` (``GET /folder/1``) with ``handler``."""
+        self.server.routes[key] = handler
@@ -0,0 +1,102 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""test_asyncrest.py -
+
+classes:
+
+AsyncSeedDMS
+
+Runs against :mod:`tests.standin`, no DMS is needed.
+"""
+
+__author__ = "John van Zantvoort"
+
+import time
+import types
+import threading
+import unittest
+
+import requests
+
+from seeddms.asyncrest import AsyncSeedDMS
+from seeddms.exceptions import SeedDMSException
+from tests.standin import StandinWrapper, ok, failed
+
+
+class TestAsyncSeedDMS(StandinWrapper):
+
+    def setUp(self):
+        StandinWrapper.setUp(self)
+        self.lock = threading.Lock()
+        self.running = 0
+        self.most = 0
+        self.pause = 0.2
+        for idn in range(1, 9):
+            self.route('GET /document/%d' % idn, self.document)
+        self.route('GET /document/9', lambda handler, query:
+                   failed('no such document', 404))
+        self.route('GET /folder/1', self.document)
+        self.route('GET /folder/1/children', lambda handler, query: ok([]))
+
+        self.asdms = AsyncSeedDMS(baseurl=self.baseurl, username='admin',
+                                  password='admin', workers=4)
+        self.asdms.do_login().get()
+
+    def tearDown(self):
+        self.asdms.close()
+        StandinWrapper.tearDown(self)
+
+    def document(self, handler, query):
+        with self.lock:
+            self.running += 1
+            self.most = max(self.most, self.running)
+        time.sleep(self.pause)
+        with self.lock:
+            self.running -= 1
+        idn = int(handler.path.split('?')[0].rsplit('/', 1)[1])
+        return ok({'id': idn, 'name': 'document %d' % idn})
+
+    def test_fan_out(self):
+        started = time.time()
+        pending = [self.asdms.get_document(idn) for idn in range(1, 9)]
+        documents = self.asdms.gather(pending)
+        self.assertEqual([x['id'] for x in documents], range(1, 9))
+        self.assertEqual(self.most, 4)
+        self.assertLess(time.time() - started, 8 * self.pause)
+
+    def test_gather_error(self):
+        pending = [self.asdms.get_document(1), self.asdms.submit('get_document', 9)]
+        self.assertRaises(SeedDMSException, self.asdms.gather, pending)
+
+    def test_imap(self):
+        found = self.asdms.imap('get_document', range(1, 5))
+        self.assertEqual(sorted(x['id'] for x in found), range(1, 5))
+
+    def test_coalesce(self):
+        pending = [self.asdms.get_folder(1) for _ in range(4)]
+        folders = self.asdms.gather(pending)
+        self.assertEqual(self.server.hits['GET /folder/1'], 1)
+        self.assertEqual(self.asdms.coalesced, 3)
+        for folder in folders[1:]:
+            self.assertIs(folder, folders[0])
+
+    def test_deadline(self):
+        with self.asdms.deadline(0.05):
+            result = self.asdms.get_document(1)
+        self.assertRaises((SeedDMSException, requests.RequestException),
+                          result.get)
+        self.assertEqual(self.asdms.get_document(2).get()['id'], 2)
+
+    def test_iterators(self):
+        walk = self.asdms.walk(1)
+        self.assertIsInstance(walk, types.GeneratorType)
+        self.assertEqual([folder['id'] for folder, _, _ in walk], [1])
+
+    def test_close(self):
+        pending = [self.asdms.get_document(idn) for idn in range(1, 5)]
+        self.asdms.close()
+        self.assertTrue(all(result.ready() for result in pending))
+        self.assertEqual(self.server.hits['GET /document/4'], 1)
+
+if __name__ == '__main__':
+    unittest.main()
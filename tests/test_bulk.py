@@ -0,0 +1,114 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""test_bulk.py -
+
+classes:
+
+BulkImporter
+
+Uses a stub client, no DMS is needed.
+"""
+
+__author__ = "John van Zantvoort"
+
+import os
+import json
+import shutil
+import tempfile
+import threading
+import unittest
+
+from seeddms.bulk import BulkImporter
+
+
+class StubClient(object):
+    """records uploads; ``answers`` maps a file name to what
+    ``upload_document`` returns, or raises when it is an exception."""
+
+    def __init__(self, answers=None):
+        self.answers = answers or dict()
+        self.uploads = list()
+        self.folders = dict()
+        self.lock = threading.Lock()
+
+    def get_folder_children(self, folder_id):
+        return [{'type': 'folder', 'id': idn, 'name': name}
+                for (parent, name), idn in self.folders.items()
+                if parent == folder_id]
+
+    def create_folder(self, folder_id, name=None):
+        with self.lock:
+            idn = 100 + len(self.folders)
+            self.folders[(folder_id, name)] = idn
+        return {'id': idn, 'name': name}
+
+    def upload_document(self, folder_id, localpath):
+        name = os.path.basename(localpath)
+        with self.lock:
+            self.uploads.append(name)
+        answer = self.answers.get(name, {'id': len(self.uploads)})
+        if isinstance(answer, Exception):
+            raise answer
+        return answer
+
+
+class TestBulkImporter(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.source = os.path.join(self.tmpdir, 'source')
+        os.makedirs(os.path.join(self.source, 'sub'))
+        for name in ('a.txt', 'b.txt', os.path.join('sub', 'c.txt')):
+            with open(os.path.join(self.source, name), 'w') as ofh:
+                ofh.write(name)
+        self.journal = os.path.join(self.tmpdir, 'journal')
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def importer(self, sdms, **kwargs):
+        return BulkImporter(sdms, workers=2, retry_delay=0,
+                            journal=self.journal, **kwargs)
+
+    def journaled(self):
+        with open(self.journal) as ifh:
+            return [json.loads(line)['path'] for line in ifh]
+
+    def test_import(self):
+        sdms = StubClient()
+        stats = self.importer(sdms).run(self.source, 1)
+        self.assertEqual((stats['files'], stats['folders'], stats['failed']),
+                         (3, 1, 0))
+        self.assertEqual(sorted(self.journaled()),
+                         ['a.txt', 'b.txt', 'sub', 'sub/c.txt'])
+
+    def test_resume(self):
+        self.importer(StubClient()).run(self.source, 1)
+        sdms = StubClient()
+        stats = self.importer(sdms).run(self.source, 1)
+        self.assertEqual(stats['skipped'], 3)
+        self.assertEqual(sdms.uploads, [])
+
+    def test_rejected_upload(self):
+        sdms = StubClient({'b.txt': None})
+        stats = self.importer(sdms, retries=2).run(self.source, 1)
+        self.assertEqual((stats['files'], stats['failed'], stats['retries']),
+                         (2, 1, 1))
+        self.assertEqual(sdms.uploads.count('b.txt'), 2)
+        self.assertNotIn('b.txt', self.journaled())
+
+        sdms = StubClient()
+        stats = self.importer(sdms).run(self.source, 1)
+        self.assertEqual(sdms.uploads, ['b.txt'])
+
+    def test_unexpected_error(self):
+        sdms = StubClient({'a.txt': KeyError('id')})
+        stats = self.importer(sdms).run(self.source, 1)
+        self.assertEqual((stats['files'], stats['failed']), (2, 1))
+        self.assertEqual([relpath for relpath, _ in stats['errors']], ['a.txt'])
+
+    def test_retries(self):
+        self.assertRaises(ValueError, BulkImporter, StubClient(), retries=0)
+
+if __name__ == '__main__':
+    unittest.main()
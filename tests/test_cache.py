@@ -0,0 +1,312 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""test_cache.py -
+
+classes:
+
+CategoryIndex
+FolderCache
+MemoryCache
+DiskCache
+SQLiteCache
+
+Uses a stub client and :mod:`tests.standin`, no DMS is needed.
+"""
+
+__author__ = "John van Zantvoort"
+
+import io
+import os
+import time
+import shutil
+import tempfile
+import unittest
+import multiprocessing
+from multiprocessing.pool import ThreadPool
+
+from seeddms.cache import CategoryIndex, FolderCache, ResponseCache, MemoryCache, \
+    DiskCache, SQLiteCache
+from seeddms.exceptions import SeedDMSException
+from tests.standin import StandinWrapper, ok
+
+
+class StubClient(object):
+
+    def __init__(self, categories):
+        self.categories = categories
+        self.calls = 0
+
+    def get_categories(self):
+        self.calls += 1
+        return self.categories
+
+
+class TestCategoryIndex(unittest.TestCase):
+
+    def test_string_ids(self):
+        index = CategoryIndex(StubClient([{'id': '3', 'name': 'reference'}]))
+        self.assertEqual(index.get(3)['name'], 'reference')
+        self.assertEqual(index.get('3')['name'], 'reference')
+        index.rename(3, 'manual')
+        self.assertEqual(int(index.lookup_id('manual')), 3)
+        index.remove('3')
+        self.assertEqual(index.get(3), None)
+
+    def test_ttl(self):
+        sdms = StubClient([{'id': 1, 'name': 'reference'}])
+        index = CategoryIndex(sdms, ttl=None)
+        index.lookup_id('reference')
+        index.lookup_id('reference')
+        self.assertEqual(sdms.calls, 1)
+        index.invalidate()
+        index.lookup_id('reference')
+        self.assertEqual(sdms.calls, 2)
+
+
+def entry(family, content='{}', age=0):
+    return {'url': 'http://dms/%s' % family, 'content': content, 'etag': None,
+            'last_modified': None, 'family': family,
+            'stored': time.time() - age}
+
+
+class TestFolderCache(unittest.TestCase):
+
+    def setUp(self):
+        self.cache = FolderCache()
+        self.cache.add_root({'id': 1, 'name': 'DMS'})
+        self.cache.add_children(1, [{'type': 'folder', 'id': '2', 'name': 'aotearoa'},
+                                    {'type': 'document', 'id': 3, 'name': 'notes'}])
+        self.cache.add_folder({'id': 7, 'name': '2014', 'parent': {'id': 2}})
+
+    def test_add(self):
+        self.assertEqual(dict(self.cache), {'DMS': 1, 'DMS/aotearoa': 2,
+                                            'DMS/aotearoa/2014': 7})
+        self.assertEqual(self.cache.path(7), ('DMS', 'aotearoa', '2014'))
+        self.assertEqual(self.cache.lookup_path('/DMS/aotearoa/'), 2)
+
+        # the parent is unknown
+        self.cache.add_folder({'id': 9, 'name': 'moana', 'parent': {'id': 8}})
+        self.assertEqual(self.cache.path(9), None)
+
+    def test_invalidate(self):
+        self.cache.invalidate(2)
+        self.assertEqual(dict(self.cache), {'DMS': 1})
+        self.assertEqual((self.cache.path(2), self.cache.path(7)), (None, None))
+
+    def test_renamed(self):
+        self.cache.add_folder({'id': 2, 'name': 'moana'}, 1)
+        self.assertEqual(dict(self.cache), {'DMS': 1, 'DMS/moana': 2})
+
+
+class TestResponseCache(unittest.TestCase):
+
+    def test_base_stores_nothing(self):
+        cache = ResponseCache()
+        cache.set('folder admin x', entry('folder'))
+        self.assertEqual(cache.get('folder admin x'), None)
+
+    def test_ttl(self):
+        cache = MemoryCache(ttl=60)
+        self.assertTrue(cache.fresh(entry('folder', age=30)))
+        self.assertFalse(cache.fresh(entry('folder', age=90)))
+
+    def test_family_ttls(self):
+        cache = MemoryCache(ttl=0, ttls={'categories': 3600})
+        self.assertTrue(cache.fresh(entry('categories', age=600)))
+        self.assertFalse(cache.fresh(entry('folder')))
+
+
+class TestMemoryCache(unittest.TestCase):
+
+    def test_lru(self):
+        cache = MemoryCache(max_bytes=350)
+        for num in range(3):
+            cache.set('folder %d' % num, entry('folder', 'x' * 100))
+        cache.get('folder 0')
+        cache.set('folder 3', entry('folder', 'x' * 100))
+        self.assertEqual(sorted(cache.entries), ['folder 0', 'folder 2', 'folder 3'])
+        self.assertTrue(cache.size <= 350)
+
+    def test_invalidate(self):
+        cache = MemoryCache()
+        cache.set('folder a', entry('folder'))
+        cache.set('users b', entry('users'))
+        cache.invalidate('folder')
+        self.assertEqual(cache.get('folder a'), None)
+        self.assertNotEqual(cache.get('users b'), None)
+
+
+class TestDiskCache(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_store(self):
+        cache = DiskCache(self.tmpdir)
+        cache.set('folder a', entry('folder', '[1]'))
+        cache.set('users b', entry('users'))
+        self.assertEqual(DiskCache(self.tmpdir).get('folder a')['content'], '[1]')
+        cache.invalidate('folder')
+        self.assertEqual(cache.get('folder a'), None)
+        self.assertNotEqual(cache.get('users b'), None)
+        cache.clear()
+        self.assertEqual(cache.get('users b'), None)
+
+
+def fill_cache(path, worker, count):
+    cache = SQLiteCache(path, timeout=60)
+    for num in range(count):
+        cache.set('folder %d-%d' % (worker, num), entry('folder'))
+        cache.invalidate('users')
+
+
+class TestSQLiteCache(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmpdir, 'cache.db')
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_store(self):
+        cache = SQLiteCache(self.path)
+        cache.set('folder a', entry('folder', '[1]'))
+        cache.set('users b', entry('users'))
+        self.assertEqual(SQLiteCache(self.path).get('folder a')['content'], '[1]')
+        cache.invalidate('folder')
+        self.assertEqual(cache.get('folder a'), None)
+        self.assertNotEqual(cache.get('users b'), None)
+
+    def test_max_bytes(self):
+        cache = SQLiteCache(self.path, max_bytes=350)
+        for num in range(4):
+            cache.set('folder %d' % num, entry('folder', 'x' * 100, age=10 - num))
+        self.assertEqual(cache.get('folder 0'), None)
+        self.assertNotEqual(cache.get('folder 3'), None)
+
+    def test_wal(self):
+        mode = SQLiteCache(self.path).conn.execute("PRAGMA journal_mode").fetchone()[0]
+        self.assertEqual(mode, 'wal')
+
+    def test_threads(self):
+        cache = SQLiteCache(self.path)
+        pool = ThreadPool(8)
+        pool.map(lambda num: cache.set('folder %d' % num, entry('folder')),
+                 range(200))
+        pool.close()
+        count = cache.conn.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+        self.assertEqual(count, 200)
+
+    def test_processes(self):
+        SQLiteCache(self.path)
+        workers = [multiprocessing.Process(target=fill_cache,
+                                           args=(self.path, num, 50))
+                   for num in range(4)]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        self.assertEqual([worker.exitcode for worker in workers], [0] * 4)
+        cache = SQLiteCache(self.path)
+        count = cache.conn.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+        self.assertEqual(count, 200)
+
+
+class TestCachedRequests(StandinWrapper):
+
+    def setUp(self):
+        self.client_args = {'response_cache': MemoryCache(ttl=60)}
+        StandinWrapper.setUp(self)
+        self.route('GET /folder/1/children',
+                   lambda handler, query: ok([{'type': 'folder', 'id': 2,
+                                               'name': 'sub'}]))
+        self.route('GET /categories',
+                   lambda handler, query: ok([{'id': 1, 'name': 'reference'}]))
+        self.route('POST /folder/1/document',
+                   lambda handler, query: ok({'id': 5}))
+
+    def test_dependencies(self):
+        for _ in range(2):
+            self.sdms.get_folder_children(1)
+            self.sdms.get_categories()
+        self.assertEqual(self.server.hits['GET /folder/1/children'], 1)
+
+        # a new document changes the folder listings, not the categories
+        self.sdms.upload_document(1, io.BytesIO('data'), name='new')
+        self.sdms.get_folder_children(1)
+        self.sdms.get_categories()
+        self.assertEqual(self.server.hits['GET /folder/1/children'], 2)
+        self.assertEqual(self.server.hits['GET /categories'], 1)
+
+    def test_revalidate(self):
+        def folder(handler, query):
+            if handler.headers.get('If-None-Match') == '"v1"':
+                return 304, {'ETag': '"v1"'}, ''
+            code, headers, body = ok({'id': 2, 'name': 'sub'})
+            headers['ETag'] = '"v1"'
+            return code, headers, body
+
+        self.sdms.response_cache.ttl = 0
+        self.route('GET /folder/2', folder)
+        self.sdms.get_folder(2)
+        self.assertEqual(self.sdms.get_folder(2)['name'], 'sub')
+        cache = self.sdms.response_cache
+        self.assertEqual((cache.misses, cache.revalidated), (1, 1))
+
+
+class TestFolderLookup(StandinWrapper):
+
+    def setUp(self):
+        StandinWrapper.setUp(self)
+        self.route('GET /folder', lambda handler, query: ok({'id': 1, 'name': 'DMS'}))
+        self.route('GET /folder/1/children', lambda handler, query: ok(
+            [{'type': 'folder', 'id': 2, 'name': 'aotearoa'},
+             {'type': 'folder', 'id': 4, 'name': 'a/b'}]))
+        self.route('GET /folder/2/children', lambda handler, query: ok(
+            [{'type': 'folder', 'id': 7, 'name': '2014'}]))
+        self.route('POST /folder/2/move/4', lambda handler, query: ok(''))
+        self.route('DELETE /folder/7', lambda handler, query: ok(''))
+
+    def hits(self, key):
+        return self.server.hits.get(key, 0)
+
+    def test_path(self):
+        self.assertEqual(self.sdms.lookup_folder_id('DMS/aotearoa/2014'), 7)
+        self.assertEqual(self.sdms.get_folder_id('DMS/aotearoa/2014'), 7)
+        self.assertEqual(self.sdms.get_folder_id(7), 7)
+        self.assertEqual(self.sdms.get_folder_path_str(7), 'DMS/aotearoa/2014')
+        self.assertEqual((self.hits('GET /folder'), self.hits('GET /folder/1/children'),
+                          self.hits('GET /folder/2/children'),
+                          self.hits('GET /folder/7')), (1, 1, 1, 0))
+
+        self.assertEqual(self.sdms.lookup_folder_id('DMS/moana'), None)
+        self.assertEqual(self.sdms.lookup_folder_id('Archive/aotearoa'), None)
+        self.assertRaises(SeedDMSException, self.sdms.get_folder_id, 'DMS/moana')
+
+    def test_slash_in_name(self):
+        # taken as the path DMS, a, b
+        self.assertRaises(SeedDMSException, self.sdms.get_folder_id, 'DMS/a/b')
+        self.assertEqual(self.sdms.get_folder_id(4), 4)
+
+    def test_move(self):
+        self.sdms.lookup_folder_id('DMS/aotearoa/2014')
+        self.sdms.move_folder(2, 4)
+        self.assertEqual(dict(self.sdms.folderdict), {'DMS': 1, 'DMS/a/b': 4})
+        self.sdms.lookup_folder_id('DMS/aotearoa/2014')
+        self.assertEqual(self.hits('GET /folder/1/children'), 2)
+
+    def test_delete(self):
+        self.sdms.lookup_folder_id('DMS/aotearoa/2014')
+        self.sdms.delete_folder(7)
+        self.assertEqual(self.hits('DELETE /folder/7'), 1)
+        self.assertNotIn('DMS/aotearoa/2014', self.sdms.folderdict)
+        self.assertEqual(self.sdms.lookup_folder_id('DMS/aotearoa/2014'), 7)
+        self.assertEqual((self.hits('GET /folder/1/children'),
+                          self.hits('GET /folder/2/children')), (1, 2))
+
+if __name__ == '__main__':
+    unittest.main()
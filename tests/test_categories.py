@@ -10,6 +10,7 @@ functions:
 - create_category
 - change_category_name
 - delete_category
+- category_index
 
 """
 
@@ -70,5 +71,23 @@ class TestChangeCategoryName(SeedDMSCategoryWrapper):
 
         self.assertEqual(cat_id1, cat_id2)
 
+class TestCategoryIndex(SeedDMSCategoryWrapper):
+
+    def test_refresh(self):
+        cat_chars = string.ascii_uppercase + string.digits
+        category_name = ''.join(random.choice(cat_chars) for _ in range(16))
+
+        other_sdms = seeddms.SeedDMS(baseurl=CONST_BASEURL,
+                                     username=CONST_USERNAME,
+                                     password=CONST_PASSWORD,
+                                     targetfolder=CONST_TARGETFOLDER)
+        other_sdms.do_login()
+        other_sdms.create_category(category_name)
+        other_sdms.do_logout()
+
+        self.assertFalse(self.sdms.has_category(category_name))
+        self.sdms.category_index.refresh()
+        self.assertTrue(self.sdms.has_category(category_name))
+
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,142 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""test_coalesce.py -
+
+functions:
+
+rest_get
+
+Runs against :mod:`tests.standin`, no DMS is needed.
+"""
+
+__author__ = "John van Zantvoort"
+
+import time
+import threading
+import unittest
+
+from seeddms.exceptions import SeedDMSException
+from tests.standin import StandinWrapper, ok, failed
+
+
+class TestCoalesce(StandinWrapper):
+
+    def setUp(self):
+        StandinWrapper.setUp(self)
+        self.answer = threading.Event()
+        self.reply = ok({'id': 1, 'name': 'DMS'})
+        self.route('GET /folder/1', self.slow_folder)
+
+    def tearDown(self):
+        self.answer.set()
+        StandinWrapper.tearDown(self)
+
+    def slow_folder(self, handler, query):
+        self.answer.wait(5)
+        return self.reply
+
+    def wait_for(self, condition):
+        for _ in range(500):
+            if condition():
+                return
+            time.sleep(0.01)
+        self.fail("timed out")
+
+    def start(self, num, sdms=None, call=None):
+        """start ``num`` threads getting folder 1, the first one has sent
+        its request when this returns."""
+        sdms = sdms or self.sdms
+
+        def get_folder():
+            return sdms.rest_get('/folder/:id', argdict={'id': 1})
+
+        call = call or get_folder
+        results = [None] * num
+
+        def get(idx):
+            try:
+                results[idx] = call()
+            except SeedDMSException as err:
+                results[idx] = err
+
+        threads = list()
+        for idx in range(num):
+            thread = threading.Thread(target=get, args=(idx,))
+            thread.start()
+            threads.append(thread)
+            if idx == 0:
+                self.wait_for(lambda: self.server.hits.get('GET /folder/1') == 1)
+        return threads, results
+
+    def second_request(self):
+        self.wait_for(lambda: self.server.hits.get('GET /folder/1') == 2)
+
+    def finish(self, threads):
+        self.answer.set()
+        for thread in threads:
+            thread.join()
+
+    def test_shared_result(self):
+        threads, results = self.start(4)
+        self.wait_for(lambda: self.sdms.coalesced == 3)
+        self.finish(threads)
+        self.assertEqual(self.server.hits['GET /folder/1'], 1)
+        self.assertEqual(results[0].data['name'], 'DMS')
+        for result in results[1:]:
+            self.assertIs(result, results[0])
+
+    def test_shared_error(self):
+        self.reply = failed('storage unavailable', 500)
+        threads, results = self.start(3)
+        self.wait_for(lambda: self.sdms.coalesced == 2)
+        self.finish(threads)
+        self.assertEqual(self.server.hits['GET /folder/1'], 1)
+        self.assertIsInstance(results[0], SeedDMSException)
+        for result in results[1:]:
+            self.assertIs(result, results[0])
+
+    def test_distinct_params(self):
+        sdms = self.sdms
+        limits = iter(range(2))
+
+        def get_folder():
+            return sdms.rest_get('/folder/:id', argdict={'id': 1},
+                                 params={'limit': next(limits)})
+
+        threads, _ = self.start(2, call=get_folder)
+        self.second_request()
+        self.finish(threads)
+        self.assertEqual(self.server.hits['GET /folder/1'], 2)
+        self.assertEqual(sdms.coalesced, 0)
+
+    def test_after_write(self):
+        self.route('PUT /folder/1/setinherit',
+                   lambda handler, query: ok(''))
+        threads, _ = self.start(1)
+        self.sdms.rest_put('/folder/:id/setinherit', argdict={'id': 1},
+                           params={'enable': True})
+        later, _ = self.start(1)
+        self.second_request()
+        self.finish(threads + later)
+        self.assertEqual(self.server.hits['GET /folder/1'], 2)
+        self.assertEqual(self.sdms.coalesced, 0)
+
+    def test_disabled(self):
+        sdms = self.client(coalesce=False)
+        sdms.do_login()
+        threads, _ = self.start(1, sdms)
+        more, _ = self.start(1, sdms)
+        self.second_request()
+        self.finish(threads + more)
+        self.assertEqual(self.server.hits['GET /folder/1'], 2)
+
+    def test_waiter_deadline(self):
+        threads, _ = self.start(1)
+        with self.sdms.deadline(0.1):
+            self.assertRaises(SeedDMSException, self.sdms.rest_get,
+                              '/folder/:id', argdict={'id': 1})
+        self.finish(threads)
+        self.assertEqual(self.server.hits['GET /folder/1'], 1)
+
+if __name__ == '__main__':
+    unittest.main()
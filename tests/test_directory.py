@@ -0,0 +1,113 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""test_directory.py -
+
+classes:
+
+Directory
+
+Runs against :mod:`tests.standin`, no DMS is needed.
+"""
+
+__author__ = "John van Zantvoort"
+
+import unittest
+
+from seeddms.exceptions import SeedDMSException
+from tests.standin import StandinWrapper, ok, failed
+
+
+class TestDirectory(StandinWrapper):
+
+    def setUp(self):
+        StandinWrapper.setUp(self)
+        self.users = {5: {'id': 5, 'login': 'tangaroa', 'disabled': False},
+                      6: {'id': 6, 'login': 'tane', 'disabled': False}}
+        self.members = list()
+        self.route('GET /users', lambda handler, query: ok(self.users.values()))
+        self.route('GET /users/5', lambda handler, query: ok(self.users[5]))
+        self.route('PUT /users/5/disable', self.disable)
+        self.route('GET /groups/aotearoa', self.group)
+        self.route('GET /groups/3', self.group)
+        self.route('GET /groups/moana', lambda handler, query:
+                   failed('no such group', 404))
+        self.route('PUT /groups/3/addUser', self.add_member)
+        self.route('PUT /groups/3/removeUser', self.remove_member)
+
+    def group(self, handler, query):
+        return ok({'id': 3, 'name': 'aotearoa', 'type': 'group',
+                   'users': [self.users[idn] for idn in self.members]})
+
+    def add_member(self, handler, query):
+        self.members.append(int(query['userid']))
+        return ok('')
+
+    def remove_member(self, handler, query):
+        self.members.remove(int(query['userid']))
+        return ok('')
+
+    def disable(self, handler, query):
+        self.users[5]['disabled'] = query['disable'] == 'true'
+        return ok('')
+
+    def hits(self, key):
+        return self.server.hits.get(key, 0)
+
+    def test_group(self):
+        self.assertEqual(self.sdms.get_group('aotearoa')['id'], 3)
+        self.assertEqual(self.sdms.get_group('aotearoa')['id'], 3)
+        self.assertEqual(self.hits('GET /groups/aotearoa'), 1)
+        self.assertEqual((self.sdms.directory.hits, self.sdms.directory.misses),
+                         (1, 1))
+
+    def test_bulk_membership(self):
+        for _ in range(10):
+            self.sdms.add_user_to_group('aotearoa', 5)
+        self.assertEqual(self.hits('GET /groups/aotearoa'), 1)
+        self.assertEqual(self.hits('PUT /groups/3/addUser'), 10)
+        self.assertEqual(self.sdms.directory.hits, 9)
+
+        # the members are fetched again
+        users = self.sdms.get_group('aotearoa')['users']
+        self.assertEqual(len(users), 10)
+        self.assertEqual(self.hits('GET /groups/aotearoa'), 2)
+
+    def test_remove_by_name(self):
+        self.members = [5, 6]
+        self.sdms.get_group(3)
+        self.sdms.remove_user_from_group('aotearoa', 6)
+        self.assertEqual(self.members, [5])
+        self.assertEqual(self.hits('GET /groups/aotearoa'), 0)
+        self.assertEqual(self.sdms.get_group(3)['users'], [self.users[5]])
+        self.assertEqual(self.hits('GET /groups/3'), 2)
+
+    def test_unknown_group(self):
+        self.assertRaises(SeedDMSException, self.sdms.add_user_to_group, 'moana', 5)
+
+    def test_user_by_login(self):
+        self.assertEqual(self.sdms.get_user_by_name('tane')['id'], 6)
+        self.assertEqual(self.sdms.get_user_by_name('tangaroa')['id'], 5)
+        self.assertEqual(self.sdms.get_user_by_id(5)['login'], 'tangaroa')
+        self.assertEqual(self.hits('GET /users'), 1)
+        self.assertEqual(self.hits('GET /users/5'), 0)
+
+    def test_disable_user(self):
+        self.sdms.get_user_by_name('tangaroa')
+        self.sdms.set_disabled_user(5)
+        self.assertTrue(self.sdms.get_user_by_name('tangaroa')['disabled'])
+        self.assertTrue(self.sdms.get_user_by_id(5)['disabled'])
+        self.sdms.set_enabled_user(5)
+        self.assertFalse(self.sdms.get_user_by_name('tangaroa')['disabled'])
+        self.assertEqual(self.hits('GET /users'), 1)
+        self.assertEqual(self.hits('PUT /users/5/disable'), 2)
+
+    def test_create_user(self):
+        self.route('POST /users', lambda handler, query: ok({'id': 7}))
+        self.sdms.get_user_by_name('tangaroa')
+        self.users[7] = {'id': 7, 'login': 'rongo', 'disabled': False}
+        self.sdms.create_user(user='rongo', password='secret')
+        self.assertEqual(self.sdms.get_user_by_name('rongo')['id'], 7)
+        self.assertEqual(self.hits('GET /users'), 2)
+
+if __name__ == '__main__':
+    unittest.main()
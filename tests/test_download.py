@@ -0,0 +1,205 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""test_download.py -
+
+functions:
+
+download_document
+parallel_download
+resumable_download
+rest_stream
+
+Runs against :mod:`tests.standin`, no DMS is needed.
+"""
+
+__author__ = "John van Zantvoort"
+
+import os
+import gzip
+import json
+import shutil
+import hashlib
+import tempfile
+import unittest
+from StringIO import StringIO
+
+from seeddms.exceptions import SeedDMSException
+from seeddms.download import parallel_download, resumable_download
+from tests.standin import StandinWrapper, content, ok
+
+
+def gzipped(data):
+    buf = StringIO()
+    with gzip.GzipFile(fileobj=buf, mode='wb') as ofh:
+        ofh.write(data)
+    return buf.getvalue()
+
+
+class DownloadWrapper(StandinWrapper):
+
+    def setUp(self):
+        StandinWrapper.setUp(self)
+        self.tmpdir = tempfile.mkdtemp()
+        self.dest = os.path.join(self.tmpdir, 'content')
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+        StandinWrapper.tearDown(self)
+
+
+class TestCompressedDownload(DownloadWrapper):
+
+    def test_gzip_content(self):
+        blob = os.urandom(1000) * 50
+        self.route('GET /document/1/content',
+                   lambda handler, query: (200, {'Content-Encoding': 'gzip'},
+                                           gzipped(blob)))
+        retv = self.sdms.download_document(1, self.dest, checksum='md5')
+        self.assertEqual(retv['size'], len(blob))
+        self.assertEqual(retv['checksum'], hashlib.md5(blob).hexdigest())
+
+    def test_short_content(self):
+        self.route('GET /document/1/content',
+                   lambda handler, query: content(handler, 'x' * 100))
+        retv = self.sdms.download_document(1, self.dest)
+        self.assertEqual(retv['size'], 100)
+
+
+class TestParallelDownload(DownloadWrapper):
+
+    def setUp(self):
+        DownloadWrapper.setUp(self)
+        self.blob = os.urandom(10000)
+        self.ranges = True
+        self.route('GET /document/1/content',
+                   lambda handler, query: content(handler, self.blob, self.ranges))
+
+    def download(self, **kwargs):
+        return parallel_download(self.sdms, 1, self.dest, min_size=1, **kwargs)
+
+    def downloaded(self):
+        with open(self.dest, 'rb') as ifh:
+            return ifh.read()
+
+    def test_parts(self):
+        retv = self.download(parts=4, checksum='md5')
+        self.assertEqual((retv['parts'], retv['size']), (4, len(self.blob)))
+        self.assertEqual(retv['checksum'], hashlib.md5(self.blob).hexdigest())
+        self.assertEqual(self.downloaded(), self.blob)
+        # the probe for the first byte and one request per part
+        self.assertEqual(self.server.hits['GET /document/1/content'], 5)
+
+    def test_mmap(self):
+        retv = self.download(parts=3, use_mmap=True)
+        self.assertEqual(retv['parts'], 3)
+        self.assertEqual(self.downloaded(), self.blob)
+
+    def test_no_ranges(self):
+        self.ranges = False
+        retv = self.download(parts=4)
+        self.assertEqual(retv['parts'], 1)
+        self.assertEqual(self.downloaded(), self.blob)
+
+    def test_chunk_size(self):
+        reports = list()
+        self.download(parts=2, chunk_size=1000,
+                      callback=lambda done, total: reports.append(done))
+        self.assertEqual(len(reports), 10)
+        self.assertEqual(max(reports), len(self.blob))
+
+    def test_small_content_chunk_size(self):
+        reports = list()
+        retv = self.sdms.download_document(1, self.dest, parts=2, chunk_size=1000,
+                                           callback=lambda done, total:
+                                           reports.append(done))
+        self.assertEqual(retv['parts'], 1)
+        self.assertEqual(reports, range(1000, 11000, 1000))
+
+
+class TestResumableDownload(DownloadWrapper):
+
+    def setUp(self):
+        DownloadWrapper.setUp(self)
+        self.blob = os.urandom(10000)
+        self.route('GET /document/1',
+                   lambda handler, query: ok({'id': 1, 'version': 1}))
+        self.route('GET /document/1/version/1',
+                   lambda handler, query: content(handler, self.blob))
+
+    def interrupted(self, data, offset, length):
+        """leave the part file and state of an interrupted run."""
+        with open(self.dest + '.part', 'wb') as ofh:
+            ofh.write(data)
+        with open(self.dest + '.part.json', 'w') as ofh:
+            json.dump({'url': '/document/:id/version/:version',
+                       'argdict': {'id': 1, 'version': 1},
+                       'length': length, 'offset': offset}, ofh)
+
+    def fetched(self):
+        return self.server.hits.get('GET /document/1/version/1', 0)
+
+    def check(self, retv, resumed):
+        self.assertEqual((retv['size'], retv['resumed']), (len(self.blob), resumed))
+        with open(self.dest, 'rb') as ifh:
+            self.assertEqual(ifh.read(), self.blob)
+        self.assertFalse(os.path.exists(self.dest + '.part'))
+        self.assertFalse(os.path.exists(self.dest + '.part.json'))
+
+    def test_download(self):
+        retv = resumable_download(self.sdms, 1, self.dest, checkpoint=1000)
+        self.check(retv, 0)
+
+    def test_resume(self):
+        self.interrupted(self.blob[:4000], 4000, len(self.blob))
+        self.check(resumable_download(self.sdms, 1, self.dest), 4000)
+        self.assertEqual(self.fetched(), 1)
+
+    def test_after_last_checkpoint(self):
+        # data after the offset of the last checkpoint is dropped
+        self.interrupted(self.blob[:4000] + 'garbage', 4000, len(self.blob))
+        self.check(resumable_download(self.sdms, 1, self.dest), 4000)
+
+    def test_stopped_before_rename(self):
+        self.interrupted(self.blob, len(self.blob), len(self.blob))
+        self.check(resumable_download(self.sdms, 1, self.dest), len(self.blob))
+        self.assertEqual(self.fetched(), 0)
+
+    def test_complete_without_length(self):
+        # the server answers 416 for a range after the end
+        self.interrupted(self.blob, len(self.blob), None)
+        self.check(resumable_download(self.sdms, 1, self.dest), len(self.blob))
+        self.assertEqual(self.fetched(), 1)
+
+    def test_longer_than_content(self):
+        self.interrupted(self.blob + 'x' * 2000, 12000, None)
+        self.check(resumable_download(self.sdms, 1, self.dest), 0)
+
+    def test_changed_content(self):
+        self.interrupted(self.blob[:4000], 4000, 20000)
+        self.check(resumable_download(self.sdms, 1, self.dest), 0)
+        self.assertEqual(self.fetched(), 2)
+
+    def test_stale_length(self):
+        self.interrupted('', 0, 20000)
+        self.check(resumable_download(self.sdms, 1, self.dest), 0)
+
+    def test_expected_checksum(self):
+        self.assertRaises(SeedDMSException, resumable_download, self.sdms, 1,
+                          self.dest, checksum='md5', expected_checksum='0' * 32)
+        self.assertFalse(os.path.exists(self.dest + '.part'))
+        self.assertFalse(os.path.exists(self.dest))
+
+    def test_download_document(self):
+        digest = hashlib.md5(self.blob).hexdigest()
+        retv = self.sdms.download_document(1, self.dest, resume=True,
+                                           checksum='md5',
+                                           expected_checksum=digest)
+        self.assertEqual(retv['checksum'], digest)
+
+        self.assertRaises(ValueError, self.sdms.download_document, 1, self.dest,
+                          resume=True, parts=4)
+        self.assertRaises(ValueError, self.sdms.download_document, 1, self.dest,
+                          resume=True, expected_checksum=digest)
+
+if __name__ == '__main__':
+    unittest.main()
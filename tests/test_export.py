@@ -0,0 +1,218 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""test_export.py -
+
+classes:
+
+BlobStore
+Exporter
+
+Uses a stub client, no DMS is needed.
+"""
+
+__author__ = "John van Zantvoort"
+
+import os
+import stat
+import shutil
+import hashlib
+import tempfile
+import threading
+import unittest
+
+from seeddms.exceptions import SeedDMSException
+from seeddms.export import BlobStore, Exporter
+
+
+def md5(data):
+    return hashlib.md5(data).hexdigest()
+
+
+class StubClient(object):
+    """folder DMS/a with two documents of the same content and one other;
+    ``failing`` maps a document id to the exception its download raises
+    after removing the partial file. Without ``checksums`` the versions
+    have no checksum."""
+
+    def __init__(self):
+        self.content = {10: 'same content', 11: 'same content', 12: 'other content'}
+        self.names = {10: 'report', 11: 'copy of report', 12: 'notes'}
+        self.parents = {10: 1, 11: 2, 12: 2}
+        self.failing = dict()
+        self.checksums = True
+        self.downloads = list()
+        self.lock = threading.Lock()
+
+    def get_folder(self, folder_id):
+        return {'id': folder_id, 'name': 'DMS', 'type': 'folder'}
+
+    def get_folder_children(self, folder_id):
+        retv = list()
+        if folder_id == 1:
+            retv.append({'id': 2, 'name': 'a', 'type': 'folder'})
+        for idn, parent in sorted(self.parents.items()):
+            if parent == folder_id:
+                retv.append({'id': idn, 'name': self.names[idn], 'type': 'document'})
+        return retv
+
+    def get_document_versions(self, document_id):
+        data = self.content[document_id]
+        latest = {'version': 2, 'size': len(data), 'date': '2018-01-01 10:00:00',
+                  'origfilename': 'scan.PDF'}
+        if self.checksums:
+            latest['checksum'] = md5(data)
+        return [{'version': 1, 'size': len(data) - 1, 'date': '2017-01-01 10:00:00'},
+                latest]
+
+    def download_document(self, document_id, dest, version=None, checksum=None,
+                          parts=1):
+        with self.lock:
+            self.downloads.append(document_id)
+        if document_id in self.failing:
+            os.unlink(dest)
+            raise self.failing[document_id]
+        data = self.content[document_id]
+        with open(dest, 'wb') as ofh:
+            ofh.write(data)
+        return {'size': len(data), 'checksum': md5(data)}
+
+
+class StoreWrapper(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.store = BlobStore(os.path.join(self.tmpdir, 'store'))
+
+    def tearDown(self):
+        self.store.close()
+        shutil.rmtree(self.tmpdir)
+
+    def stored(self, data):
+        path = self.store.tempfile()
+        with open(path, 'wb') as ofh:
+            ofh.write(data)
+        self.store.add(path, md5(data))
+        return md5(data)
+
+
+class TestBlobStore(StoreWrapper):
+
+    def test_add(self):
+        path = self.store.tempfile()
+        with open(path, 'wb') as ofh:
+            ofh.write('content')
+        self.assertTrue(self.store.add(path, md5('content')))
+        blob = self.store.blob_path(md5('content'))
+        self.assertTrue(self.store.has(md5('content')))
+        self.assertFalse(os.stat(blob).st_mode & stat.S_IWUSR)
+
+        path = self.store.tempfile()
+        self.assertFalse(self.store.add(path, md5('content')))
+        self.assertFalse(os.path.exists(path))
+
+    def test_lookup(self):
+        digest = self.stored('content')
+        self.store.record(12, 3, 7, '2018-07-09 18:15:53', digest)
+        self.assertEqual(self.store.lookup(12, 3, 7, '2018-07-09 18:15:53'), digest)
+        self.assertEqual(self.store.lookup(12, 3, 7, '2018-07-10 09:00:00'), None)
+        self.assertEqual(self.store.lookup(12, 4, 7, '2018-07-09 18:15:53'), None)
+
+        self.store.record(13, 1, 7, '2018-07-09 18:15:53', md5('lost'))
+        self.assertEqual(self.store.lookup(13, 1, 7, '2018-07-09 18:15:53'), None)
+
+    def test_link(self):
+        digest = self.stored('content')
+        blob = self.store.blob_path(digest)
+        dest = os.path.join(self.tmpdir, 'exported')
+
+        self.store.link(digest, dest)
+        self.assertTrue(os.path.samefile(blob, dest))
+        self.store.link(digest, dest, 'symlink')
+        self.assertEqual(os.readlink(dest), blob)
+        self.store.link(digest, dest, 'copy')
+        self.assertFalse(os.path.islink(dest))
+        self.assertFalse(os.path.samefile(blob, dest))
+        with open(dest) as ifh:
+            self.assertEqual(ifh.read(), 'content')
+
+    def test_relink(self):
+        dest = os.path.join(self.tmpdir, 'exported')
+        self.store.link(self.stored('first'), dest)
+        self.store.link(self.stored('second'), dest)
+        with open(dest) as ifh:
+            self.assertEqual(ifh.read(), 'second')
+
+
+class TestExporter(StoreWrapper):
+
+    def setUp(self):
+        StoreWrapper.setUp(self)
+        self.sdms = StubClient()
+        self.target = os.path.join(self.tmpdir, 'export')
+
+    def export(self):
+        return Exporter(self.sdms, self.store, workers=2).run(1, self.target)
+
+    def exported(self, *names):
+        return os.path.join(self.target, *names)
+
+    def test_export(self):
+        self.sdms.checksums = False
+        stats = self.export()
+        self.assertEqual((stats['documents'], stats['downloaded'],
+                          stats['deduplicated'], stats['failed']), (3, 3, 1, 0))
+        self.assertTrue(os.path.samefile(self.exported('report.PDF'),
+                                         self.exported('a', 'copy of report.PDF')))
+        with open(self.exported('a', 'notes.PDF')) as ifh:
+            self.assertEqual(ifh.read(), 'other content')
+        self.assertEqual(os.listdir(os.path.join(self.store.path, 'tmp')), [])
+
+    def test_reexport(self):
+        self.export()
+        self.sdms.downloads = list()
+        stats = self.export()
+        self.assertEqual((stats['documents'], stats['skipped']), (3, 3))
+        self.assertEqual(self.sdms.downloads, [])
+
+    def test_known_checksum(self):
+        self.export()
+        self.sdms.content[13] = 'other content'
+        self.sdms.names[13] = 'notes again'
+        self.sdms.parents[13] = 1
+        self.sdms.downloads = list()
+        stats = self.export()
+        self.assertEqual(stats['skipped'], 4)
+        self.assertEqual(self.sdms.downloads, [])
+        self.assertTrue(os.path.samefile(self.exported('notes again.PDF'),
+                                         self.exported('a', 'notes.PDF')))
+
+    def test_failed_download(self):
+        self.sdms.failing[12] = SeedDMSException("storage unavailable")
+        stats = self.export()
+        self.assertEqual((stats['documents'], stats['failed']), (2, 1))
+        self.assertEqual(stats['errors'],
+                         [(self.exported('a', 'notes.PDF'), 'storage unavailable')])
+        self.assertEqual(os.listdir(os.path.join(self.store.path, 'tmp')), [])
+
+    def test_name_with_extension(self):
+        self.sdms.content[13] = 'scanned report'
+        self.sdms.names[13] = 'report.PDF'
+        self.sdms.parents[13] = 1
+        stats = self.export()
+        self.assertEqual(stats['documents'], 4)
+        with open(self.exported('report.PDF')) as ifh:
+            self.assertEqual(ifh.read(), 'same content')
+        with open(self.exported('report-13.PDF')) as ifh:
+            self.assertEqual(ifh.read(), 'scanned report')
+
+    def test_unexpected_error(self):
+        # a document without content makes get_document_versions fail
+        self.sdms.names[13] = 'broken'
+        self.sdms.parents[13] = 2
+        stats = self.export()
+        self.assertEqual((stats['documents'], stats['failed']), (3, 1))
+        self.assertEqual([path for path, _ in stats['errors']],
+                         [self.exported('a', 'broken')])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -29,11 +29,65 @@ get_folder_id
 
 __author__ = "John van Zantvoort"
 
+import io
+import os
 import unittest
+from multiprocessing.pool import ThreadPool
 import seeddms
 
+from seeddms.cache import MemoryCache
 from tests.common import SeedDMSWrapper
+from tests.standin import StandinWrapper, ok
 from tests.vars import *
 
+class TestUploadDocument(SeedDMSWrapper):
+
+    def test_upload_download_buffer(self):
+        folder_id = self.sdms.get_folder_id(CONST_TARGETFOLDER)
+        content = os.urandom(256 * 1024)
+
+        retv = self.sdms.upload_document(folder_id, io.BytesIO(content),
+                                         name='upload_buffer.bin')
+        document_id = retv['id']
+
+        ofh = io.BytesIO()
+        self.sdms.download_document(document_id, ofh)
+        self.sdms.delete_document(document_id)
+
+        self.assertEqual(content, ofh.getvalue())
+
+class TestFolderPath(SeedDMSWrapper):
+
+    def test_lookup_folder_id(self):
+        folder_id = self.sdms.get_folder_id(CONST_TARGETFOLDER)
+        path = self.sdms.get_folder_path_str(folder_id)
+
+        self.assertEqual(folder_id, self.sdms.lookup_folder_id(path))
+        self.assertEqual(folder_id, self.sdms.folderdict.lookup_path(path))
+
+class TestSharedClient(SeedDMSWrapper):
+
+    def test_shared_client(self):
+        folder_id = self.sdms.get_folder_id(CONST_TARGETFOLDER)
+        pool = ThreadPool(8)
+        retv = pool.map(lambda x: self.sdms.get_folder(folder_id)['id'],
+                        range(32))
+        pool.close()
+        self.assertEqual(set(retv), set([folder_id]))
+
+        result = self.sdms.rest_get("/folder/:id", argdict={'id': folder_id})
+        self.assertEqual(list(result), list(result),
+                         "results can be iterated more than once")
+
+class TestSetInheritsAccess(StandinWrapper):
+
+    def test_put(self):
+        self.sdms.response_cache = MemoryCache()
+        self.route('PUT /folder/7/setInherit', lambda handler, query: ok(''))
+        self.sdms.set_folder_inherits_access(7)
+        self.sdms.set_folder_inherits_access(7)
+        self.assertEqual(self.server.hits, {'POST /login': 1,
+                                            'PUT /folder/7/setInherit': 2})
+
 if __name__ == '__main__':
     unittest.main()
@@ -7,15 +7,22 @@ functions:
 do_login
 do_logout
 
+The stand-in tests run against :mod:`tests.standin`, no DMS is needed.
 """
 
 __author__ = "John van Zantvoort"
 
+import os
+import shutil
+import tempfile
 import unittest
 
 import seeddms
+from seeddms.resilience import RetryPolicy
+from seeddms.sessionstore import SessionStore
 
 from tests.common import SeedDMSWrapper
+from tests.standin import StandinWrapper, ok, failed
 from tests.vars import *
 
 class TestLogin(SeedDMSWrapper):
@@ -24,5 +31,107 @@ class TestLogin(SeedDMSWrapper):
     def test_login(self):
         self.do_login(CONST_USERNAME, CONST_PASSWORD)
 
+class TestRelogin(SeedDMSWrapper):
+
+    def test_relogin(self):
+        self.sdms.retry = RetryPolicy(backoff=0.1)
+        self.sdms.cookies = None
+        retv = self.sdms.get_account()
+        self.assertEqual(retv.get('login'), CONST_USERNAME)
+        self.assertEqual(self.sdms.retry.stats['relogins'], 1)
+
+class TestReloginStatuses(StandinWrapper):
+
+    def setUp(self):
+        StandinWrapper.setUp(self)
+        self.sdms.retry = RetryPolicy(backoff=0)
+        self.route('GET /document/5', lambda handler, query: ok({'id': 5}))
+        self.route('GET /document/6',
+                   lambda handler, query: failed('No access', 403))
+
+    def test_expired_session(self):
+        self.server.sessions.clear()
+        self.assertEqual(self.sdms.get_document(5), {'id': 5})
+        self.assertEqual(self.server.logins, 2)
+        self.assertEqual(self.sdms.retry.stats['relogins'], 1)
+
+    def test_access_denied(self):
+        self.assertRaises(seeddms.exceptions.SeedDMSException,
+                          self.sdms.get_document, 6)
+        self.assertEqual(self.server.logins, 1)
+        self.assertEqual(self.server.hits['GET /document/6'], 1)
+        self.assertEqual(self.sdms.retry.stats['relogins'], 0)
+
+class TestSessionStore(SeedDMSWrapper):
+
+    def setUp(self):
+        SeedDMSWrapper.setUp(self)
+        self.tmpdir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_session_store(self):
+        path = os.path.join(self.tmpdir, 'session')
+        clients = list()
+        for _ in range(2):
+            test_sdms = seeddms.SeedDMS(baseurl=CONST_BASEURL,
+                                        username=CONST_USERNAME,
+                                        password=CONST_PASSWORD,
+                                        session_store=SessionStore(path))
+            test_sdms.do_login()
+            clients.append(test_sdms)
+
+        self.assertEqual(clients[0].cookies.get_dict(),
+                         clients[1].cookies.get_dict(),
+                         "the second client reuses the stored session")
+        self.assertEqual(clients[1].get_account().get('login'), CONST_USERNAME)
+
+        clients[1].do_logout()
+        self.assertEqual(SessionStore(path).read(), {})
+
+class TestStandinSessionStore(StandinWrapper):
+
+    def setUp(self):
+        StandinWrapper.setUp(self)
+        self.tmpdir = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmpdir, 'session')
+        self.logins = self.server.logins
+
+    def tearDown(self):
+        StandinWrapper.tearDown(self)
+        shutil.rmtree(self.tmpdir)
+
+    def stored_client(self, **kwargs):
+        client = self.client(session_store=SessionStore(self.path), **kwargs)
+        client.do_login()
+        return client
+
+    def test_shared_login(self):
+        first = self.stored_client()
+        second = self.stored_client()
+        self.assertEqual(self.server.logins - self.logins, 1)
+        self.assertEqual(first.cookies.get_dict(), second.cookies.get_dict())
+        self.assertEqual(second.get_account().get('login'), 'admin')
+
+    def test_stale_session(self):
+        SessionStore(self.path).save(self.baseurl, 'admin',
+                                     {'mydms_session': 'stale'})
+        client = self.stored_client()
+        self.assertEqual(self.server.logins - self.logins, 1)
+        cookies = SessionStore(self.path).load(self.baseurl, 'admin')['cookies']
+        self.assertNotEqual(cookies, {'mydms_session': 'stale'})
+        self.assertIn(cookies['mydms_session'], self.server.sessions)
+        self.assertEqual(client.cookies.get_dict(), cookies)
+
+    def test_renewed_once(self):
+        first = self.stored_client(retry=RetryPolicy(backoff=0))
+        second = self.stored_client(retry=RetryPolicy(backoff=0))
+        self.server.sessions.clear()
+        for client in (first, second):
+            self.assertEqual(client.get_account().get('login'), 'admin')
+        self.assertEqual(self.server.logins - self.logins, 2)
+        self.assertEqual(first.cookies.get_dict(), second.cookies.get_dict())
+
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,202 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""test_replica.py -
+
+classes:
+
+Replica
+
+Uses a stub client, no DMS is needed.
+"""
+
+__author__ = "John van Zantvoort"
+
+import os
+import shutil
+import datetime
+import tempfile
+import threading
+import unittest
+
+from seeddms.exceptions import SeedDMSException
+from seeddms.replica import Replica
+
+
+class StubClient(object):
+    """folder tree DMS/a/b with a document in every folder."""
+
+    targetfolder = 1
+
+    def __init__(self):
+        self.folders = {1: {'id': 1, 'name': 'DMS', 'parent': None},
+                        2: {'id': 2, 'name': 'a', 'parent': 1},
+                        3: {'id': 3, 'name': 'b', 'parent': 2}}
+        self.documents = dict()
+        self.attributes = dict()
+        self.failing = set()
+        self.failing_folders = set()
+        self.fetched = list()
+        self.lock = threading.Lock()
+        for idn, folder, name, date, category, language in (
+                (10, 1, 'manual', '2018-01-05 10:00:00', 'reference', 'english'),
+                (11, 2, 'grammar', '2018-03-01 10:00:00', 'reference', 'te reo maori'),
+                (12, 3, 'notes', '2017-06-01 10:00:00', 'draft', 'english')):
+            self.documents[idn] = {'id': idn, 'type': 'document', 'folder': folder,
+                                   'name': name, 'date': date, 'version': 1,
+                                   'mimetype': 'application/pdf', 'comment': '',
+                                   'categories': [{'id': 1, 'name': category}]}
+            self.attributes[idn] = [{'id': 1, 'name': 'language', 'value': language}]
+
+    def get_folder(self, folder_id):
+        return dict(self.folders[folder_id], type='folder', date='2017-01-01')
+
+    def get_folder_children(self, folder_id):
+        if folder_id in self.failing_folders:
+            raise SeedDMSException("request to /folder/%d/children raised a "
+                                   "500 error" % folder_id)
+        retv = [self.get_folder(idn) for idn, row in self.folders.items()
+                if row['parent'] == folder_id]
+        for row in self.documents.values():
+            if row['folder'] == folder_id:
+                listed = dict(row)
+                del listed['categories']
+                retv.append(listed)
+        return retv
+
+    def get_document(self, document_id):
+        with self.lock:
+            self.fetched.append(document_id)
+        if document_id in self.failing:
+            raise SeedDMSException("request to /document/%d raised a 500 error"
+                                   % document_id)
+        return dict(self.documents[document_id])
+
+    def get_document_versions(self, document_id):
+        row = self.documents[document_id]
+        return [{'version': row['version'], 'date': row['date'], 'size': 100}]
+
+    def get_document_attributes(self, document_id):
+        return self.attributes[document_id]
+
+
+class ReplicaWrapper(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.sdms = StubClient()
+        self.replica = Replica(self.sdms, os.path.join(self.tmpdir, 'replica.db'))
+
+    def tearDown(self):
+        self.replica.close()
+        shutil.rmtree(self.tmpdir)
+
+
+class TestSync(ReplicaWrapper):
+
+    def test_incremental(self):
+        stats = self.replica.sync()
+        self.assertEqual((stats['documents_fetched'], stats['failed']), (3, 0))
+
+        self.sdms.fetched = list()
+        stats = self.replica.sync()
+        self.assertEqual((stats['folders_skipped'], stats['documents_skipped']),
+                         (1, 1))
+        self.assertEqual(self.sdms.fetched, [])
+
+    def test_changed_document(self):
+        self.replica.sync()
+        self.sdms.documents[10]['comment'] = 'second edition'
+        self.sdms.documents[10]['categories'] = [{'id': 2, 'name': 'archive'}]
+        self.sdms.fetched = list()
+        self.replica.sync()
+        self.assertEqual(self.sdms.fetched, [10])
+        self.assertEqual(self.replica.get_document(10)['comment'], 'second edition')
+
+    def test_deleted_document(self):
+        self.replica.sync()
+        del self.sdms.documents[12]
+        stats = self.replica.sync(full=True)
+        self.assertEqual(stats['deleted'], 1)
+        self.assertEqual(self.replica.get_document(12), None)
+
+    def test_full(self):
+        self.replica.sync()
+        self.sdms.attributes[11] = [{'id': 1, 'name': 'language', 'value': 'english'}]
+        self.sdms.fetched = list()
+        self.replica.sync(full=True)
+        self.assertEqual(sorted(self.sdms.fetched), [10, 11, 12])
+        self.assertEqual(self.replica.get_document_attributes(11)[0]['value'], 'english')
+
+    def test_failed_document(self):
+        self.sdms.failing.add(11)
+        stats = self.replica.sync()
+        self.assertEqual((stats['documents_fetched'], stats['failed']), (2, 1))
+        self.assertEqual([idn for idn, _ in stats['errors']], [11])
+
+        # the folder of the failed document is crawled again
+        self.sdms.failing.clear()
+        self.sdms.fetched = list()
+        stats = self.replica.sync()
+        self.assertEqual(self.sdms.fetched, [11])
+        self.assertNotEqual(self.replica.get_document(11), None)
+
+    def test_failed_nested_document(self):
+        self.sdms.failing.add(12)
+        self.replica.sync()
+        self.sdms.failing.clear()
+        for _ in range(2):
+            self.sdms.fetched = list()
+            self.replica.sync()
+        self.assertEqual(self.replica.get_document(12)['name'], 'notes')
+        self.assertEqual(self.sdms.fetched, [])
+
+    def test_failed_nested_listing(self):
+        self.sdms.failing_folders.add(3)
+        self.assertRaises(SeedDMSException, self.replica.sync)
+        self.sdms.failing_folders.clear()
+        self.sdms.fetched = list()
+        self.replica.sync()
+        self.assertEqual(self.sdms.fetched, [12])
+
+
+class TestFindDocuments(ReplicaWrapper):
+
+    def setUp(self):
+        ReplicaWrapper.setUp(self)
+        self.replica.sync()
+
+    def find(self, **kwargs):
+        return [row['id'] for row in self.replica.find_documents(**kwargs)]
+
+    def test_folder(self):
+        self.assertEqual(self.find(folder_id=2), [11, 12])
+        self.assertEqual(self.find(folder_id=3), [12])
+
+    def test_attributes(self):
+        self.assertEqual(self.find(attributes={'language': 'english'}), [10, 12])
+        self.assertEqual(self.find(attributes={'language': ['english', 'te reo maori']}),
+                         [11, 10, 12])
+
+    def test_categories(self):
+        self.assertEqual(self.find(categories='reference'), [11, 10])
+        self.assertEqual(self.find(categories=1), [11, 10, 12])
+        self.assertEqual(self.find(categories=['reference', 'draft']), [])
+
+    def test_dates(self):
+        self.assertEqual(self.find(modified_after=datetime.datetime(2018, 1, 1)),
+                         [11, 10])
+        self.assertEqual(self.find(modified_before='2018-01-01'), [12])
+
+    def test_combined(self):
+        self.assertEqual(self.find(folder_id=2, attributes={'language': 'english'},
+                                   name='n%'), [12])
+        self.assertEqual(self.find(limit=1), [11])
+
+    def test_moved_folder(self):
+        # ancestry follows a folder that moved
+        self.sdms.folders[3]['parent'] = 1
+        self.replica.sync(full=True)
+        self.assertEqual(self.find(folder_id=2), [11])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,259 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""test_resilience.py -
+
+classes:
+
+Limiter
+CircuitBreaker
+
+Both are tested on their own, their use by the client runs against
+:mod:`tests.standin`, no DMS is needed.
+"""
+
+__author__ = "John van Zantvoort"
+
+import time
+import threading
+import unittest
+from StringIO import StringIO
+
+from seeddms.exceptions import SeedDMSException, CircuitOpenError
+from seeddms.resilience import Limiter, CircuitBreaker
+from tests.standin import StandinWrapper, content, ok, failed
+
+
+class TestLimiter(unittest.TestCase):
+
+    def test_rate(self):
+        limiter = Limiter(rate=20, burst=1)
+        started = time.time()
+        for _ in range(3):
+            limiter.acquire()
+            limiter.release(0.01)
+        self.assertGreaterEqual(time.time() - started, 0.09)
+        self.assertEqual(limiter.stats['requests'], 3)
+        self.assertEqual(limiter.stats['throttled'], 2)
+
+    def test_concurrency(self):
+        limiter = Limiter(concurrency=1)
+        limiter.acquire()
+        acquired = threading.Event()
+
+        def wait():
+            limiter.acquire()
+            acquired.set()
+
+        thread = threading.Thread(target=wait)
+        thread.start()
+        self.assertFalse(acquired.wait(0.1))
+        limiter.release(0.01)
+        self.assertTrue(acquired.wait(0.5))
+        thread.join()
+        self.assertEqual(limiter.in_flight, 1)
+
+    def test_deadline(self):
+        limiter = Limiter(concurrency=1)
+        limiter.acquire()
+        self.assertRaises(SeedDMSException, limiter.acquire, time.time() + 0.05)
+        self.assertEqual(limiter.in_flight, 1)
+
+    def test_overloaded(self):
+        limiter = Limiter(concurrency=8, max_concurrency=16)
+        limiter.acquire()
+        limiter.release(0.1, overloaded=True)
+        self.assertEqual((limiter.limit, limiter.stats['decreases']), (4, 1))
+
+    def test_slow_request(self):
+        limiter = Limiter(concurrency=4, max_concurrency=8)
+        limiter.acquire()
+        limiter.release(0.1)
+        limiter.acquire()
+        limiter.release(1.0)
+        self.assertEqual(limiter.limit, 2)
+
+    def test_increase(self):
+        limiter = Limiter(concurrency=2, max_concurrency=3)
+        for _ in range(4):
+            limiter.acquire()
+            limiter.release(0.1)
+        self.assertEqual((limiter.limit, limiter.stats['increases']), (3, 1))
+
+    def test_fixed(self):
+        limiter = Limiter(concurrency=2)
+        limiter.acquire()
+        limiter.release(0.1, overloaded=True)
+        self.assertEqual(limiter.limit, 2)
+
+    def test_not_sent(self):
+        limiter = Limiter(concurrency=1, max_concurrency=4)
+        limiter.acquire()
+        limiter.release(None)
+        self.assertEqual((limiter.in_flight, limiter.latency), (0, None))
+
+
+class TestCircuitBreaker(unittest.TestCase):
+
+    template = '/document/:id/content'
+
+    def setUp(self):
+        self.breaker = CircuitBreaker(min_requests=4, reset_timeout=0.1)
+
+    def send(self, failure):
+        probe = self.breaker.allow(self.template)
+        self.breaker.record(self.template, failure, probe)
+        return probe
+
+    def trip(self):
+        for failure in (False, True, True, False):
+            self.send(failure)
+
+    def test_open(self):
+        for failure in (False, True, False):
+            self.send(failure)
+        self.assertEqual(self.breaker.state(self.template), 'closed')
+        self.send(True)
+        self.assertEqual(self.breaker.state(self.template), 'open')
+        self.assertRaises(CircuitOpenError, self.breaker.allow, self.template)
+        self.assertEqual(self.breaker.states()[self.template]['rejected'], 1)
+        # other endpoints are not affected
+        self.assertEqual(self.breaker.allow('/folder/:id'), False)
+
+    def test_min_requests(self):
+        for _ in range(3):
+            self.send(True)
+        self.assertEqual(self.breaker.state(self.template), 'closed')
+
+    def test_window(self):
+        breaker = CircuitBreaker(min_requests=2, window=0.05)
+        breaker.record(self.template, True, breaker.allow(self.template))
+        time.sleep(0.1)
+        breaker.record(self.template, True, breaker.allow(self.template))
+        self.assertEqual(breaker.state(self.template), 'closed')
+
+    def test_not_sent(self):
+        for _ in range(4):
+            self.send(None)
+        self.assertEqual(self.breaker.states()[self.template]['requests'], 0)
+
+    def test_probe_closes(self):
+        self.trip()
+        time.sleep(0.15)
+        self.assertEqual(self.breaker.state(self.template), 'half-open')
+        probe = self.breaker.allow(self.template)
+        self.assertTrue(probe)
+        # only one probe at a time
+        self.assertRaises(CircuitOpenError, self.breaker.allow, self.template)
+        self.breaker.record(self.template, False, probe)
+        self.assertEqual(self.breaker.state(self.template), 'closed')
+        self.assertEqual(self.send(False), False)
+
+    def test_probe_opens(self):
+        self.trip()
+        time.sleep(0.15)
+        self.assertTrue(self.send(True))
+        self.assertEqual(self.breaker.state(self.template), 'open')
+        self.assertRaises(CircuitOpenError, self.breaker.allow, self.template)
+
+    def test_probe_not_sent(self):
+        self.trip()
+        time.sleep(0.15)
+        self.assertTrue(self.send(None))
+        self.assertEqual(self.breaker.state(self.template), 'half-open')
+        self.assertTrue(self.send(False))
+        self.assertEqual(self.breaker.state(self.template), 'closed')
+
+    def test_reset(self):
+        self.trip()
+        self.breaker.reset(self.template)
+        self.assertEqual(self.breaker.state(self.template), 'closed')
+        self.assertEqual(self.breaker.states(), {})
+
+
+class SlowLimiter(Limiter):
+    """uses up the whole deadline waiting for a slot."""
+
+    def acquire(self, deadline=None):
+        if deadline is not None:
+            time.sleep(max(0, deadline - time.time()) + 0.01)
+        return Limiter.acquire(self)
+
+
+class TestClientLimits(StandinWrapper):
+
+    def setUp(self):
+        StandinWrapper.setUp(self)
+        self.route('GET /document/1/content',
+                   lambda handler, query: content(handler, 'x' * 200000))
+
+    def stream(self, sdms, limiter):
+        sdms.do_login()
+        in_flight = list()
+        sdms.rest_stream('/document/:id/content', StringIO(), argdict={'id': 1},
+                         chunk_size=8192,
+                         callback=lambda size, total: in_flight.append(limiter.in_flight))
+        return in_flight
+
+    def test_download_holds_slot(self):
+        limiter = Limiter(concurrency=2)
+        in_flight = self.stream(self.client(limits={'download': limiter}), limiter)
+        self.assertTrue(in_flight)
+        self.assertEqual(set(in_flight), set([1]))
+        self.assertEqual(limiter.in_flight, 0)
+        self.assertEqual(limiter.stats['requests'], 1)
+
+    def test_download_uses_read_limit(self):
+        limiter = Limiter(concurrency=2)
+        in_flight = self.stream(self.client(limits={'read': limiter}), limiter)
+        self.assertEqual(set(in_flight), set([1]))
+        self.assertEqual(limiter.in_flight, 0)
+
+    def test_failed_download_releases_slot(self):
+        limiter = Limiter(concurrency=2)
+        sdms = self.client(limits={'download': limiter})
+        sdms.do_login()
+        self.route('GET /document/1/content',
+                   lambda handler, query: (404, {}, 'no such document'))
+        self.assertRaises(SeedDMSException, sdms.download_document, 1, StringIO())
+        self.assertEqual(limiter.in_flight, 0)
+
+    def test_server_error(self):
+        for status in (500, 503, 429):
+            limiter = Limiter(concurrency=8, max_concurrency=16)
+            sdms = self.client(limits={'read': limiter})
+            sdms.do_login()
+            self.route('GET /folder/1',
+                       lambda handler, query: failed('overloaded', status))
+            self.assertRaises(SeedDMSException, sdms.get_folder, 1)
+            self.assertEqual((limiter.limit, limiter.stats['decreases']), (4, 1))
+
+    def test_deadline_spent_waiting(self):
+        limiter = SlowLimiter(concurrency=2)
+        sdms = self.client(limits={'read': limiter})
+        sdms.do_login()
+        with sdms.deadline(0.05):
+            self.assertRaises(SeedDMSException, sdms.rest_get, '/account')
+        self.assertEqual(limiter.in_flight, 0)
+        self.assertEqual(self.server.hits.get('GET /account', 0), 0)
+
+
+class TestClientBreaker(StandinWrapper):
+
+    def test_failing_endpoint(self):
+        breaker = CircuitBreaker(min_requests=2, reset_timeout=0.1)
+        sdms = self.client(breaker=breaker)
+        sdms.do_login()
+        self.route('GET /folder/1', lambda handler, query: failed('storage', 500))
+        for _ in range(2):
+            self.assertRaises(SeedDMSException, sdms.get_folder, 1)
+        self.assertRaises(CircuitOpenError, sdms.get_folder, 1)
+        self.assertEqual(self.server.hits['GET /folder/1'], 2)
+        self.assertEqual(breaker.state('/folder/:id'), 'open')
+
+        self.route('GET /folder/1', lambda handler, query: ok({'id': 1}))
+        time.sleep(0.15)
+        self.assertEqual(sdms.get_folder(1)['id'], 1)
+        self.assertEqual(breaker.state('/folder/:id'), 'closed')
+
+if __name__ == '__main__':
+    unittest.main()
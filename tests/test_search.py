@@ -6,6 +6,8 @@ functions:
 
 do_search
 do_search_by_attr
+iter_search
+batch_search
 
 """
 
@@ -14,7 +16,9 @@ __author__ = "John van Zantvoort"
 import unittest
 import seeddms
 
+from seeddms.exceptions import SeedDMSException
 from tests.common import SeedDMSWrapper
+from tests.standin import StandinWrapper, ok, failed
 from tests.vars import *
 
 ## class TestGetLockedDocuments(SeedDMSWrapper):
@@ -23,5 +27,49 @@ from tests.vars import *
 ##         retv = self.sdms.get_locked_documents()
 ##         self.assertTrue(isinstance(retv, list), "get_locked_documents returns a list item")
 
+class TestBatchSearch(SeedDMSWrapper):
+
+    def test_batch_search(self):
+        retv = self.sdms.batch_search([{'query': 'DMS'}, {'query': 'DMS'}])
+        self.assertEqual(len(retv['queries']), 2, "one entry per query")
+        keys = [(x.get('type'), x.get('id')) for x in retv['results']]
+        self.assertEqual(len(keys), len(set(keys)), "results are unique")
+
+class TestIterSearch(StandinWrapper):
+
+    def setUp(self):
+        StandinWrapper.setUp(self)
+        self.rows = [{'type': 'document', 'id': idn, 'name': 'doc%d' % idn}
+                     for idn in range(250)]
+
+    def search(self, offsets=True, fail_at=None):
+        def handler(handler, query):
+            offset = int(query.get('offset', 0)) if offsets else 0
+            if fail_at is not None and offset >= fail_at:
+                return failed('search failed')
+            if 'limit' in query:
+                return ok(self.rows[offset:offset + int(query['limit'])])
+            return ok(self.rows[offset:])
+        self.route('GET /search', handler)
+
+    def ids(self, **kwargs):
+        return [row['id'] for row in self.sdms.iter_search(query='doc', **kwargs)]
+
+    def test_pages(self):
+        self.search()
+        self.assertEqual(self.ids(page_size=100), range(250))
+        self.assertEqual(self.server.hits['GET /search'], 3)
+        self.assertEqual(self.ids(page_size=100, offset=20, limit=150), range(20, 170))
+
+    def test_offset_ignored(self):
+        self.search(offsets=False)
+        self.assertEqual(self.ids(page_size=100), range(250))
+        self.assertEqual(self.ids(page_size=100, limit=120), range(120))
+        self.assertRaises(SeedDMSException, self.ids, page_size=100, offset=20)
+
+    def test_failed_page(self):
+        self.search(fail_at=100)
+        self.assertRaises(SeedDMSException, self.ids, page_size=100)
+
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,87 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""test_sessionpool.py -
+
+classes:
+
+SessionPool
+
+Runs against :mod:`tests.standin`, no DMS is needed.
+"""
+
+__author__ = "John van Zantvoort"
+
+import unittest
+
+from seeddms.exceptions import SeedDMSException
+from seeddms.sessionpool import SessionPool
+from tests.standin import start_server
+
+
+class TestSessionPool(unittest.TestCase):
+
+    def setUp(self):
+        self.server, self.baseurl = start_server()
+        self.passwords = {'alice': 'secret', 'bob': 'secret', 'carol': 'secret'}
+        self.pool = SessionPool(self.baseurl, self.passwords, max_sessions=2)
+
+    def tearDown(self):
+        self.pool.close()
+        self.server.shutdown()
+        self.server.server_close()
+
+    def test_shared_adapter(self):
+        alice = self.pool.get('alice')
+        bob = self.pool.get('bob')
+        self.assertIsNot(alice, bob)
+        for client in (alice, bob):
+            self.assertIs(client.session.get_adapter(self.baseurl), self.pool.adapter)
+            self.assertTrue(client.rest_get('/account').success)
+        # both users went through the one connection pool of the host
+        self.assertEqual(len(self.pool.adapter.poolmanager.pools), 1)
+        self.assertEqual(len(self.server.sessions), 2)
+
+    def test_reuse(self):
+        client = self.pool.get('alice')
+        self.assertIs(self.pool['alice'], client)
+        self.assertEqual((self.pool.stats['hits'], self.pool.stats['logins']), (1, 1))
+        self.assertEqual(self.server.logins, 1)
+
+    def test_eviction(self):
+        self.pool.get('alice')
+        self.pool.get('bob')
+        self.pool.get('alice')
+        self.pool.get('carol')
+        # bob was used least recently
+        self.assertNotIn('bob', self.pool)
+        self.assertEqual((len(self.pool), self.pool.stats['evictions']), (2, 1))
+        self.assertEqual(self.server.hits['GET /logout'], 1)
+        self.assertEqual(len(self.server.sessions), 2)
+
+        self.pool.get('bob')
+        self.assertEqual(self.pool.stats['logins'], 4)
+
+    def test_discard(self):
+        self.pool.get('alice')
+        self.pool.discard('alice')
+        self.assertNotIn('alice', self.pool)
+        self.assertEqual(self.server.sessions, set())
+        self.pool.discard('alice')
+
+    def test_close(self):
+        self.pool.get('alice')
+        self.pool.get('bob')
+        self.pool.close()
+        self.assertEqual((len(self.pool), self.server.sessions), (0, set()))
+
+    def test_unknown_user(self):
+        self.assertRaises(SeedDMSException, self.pool.get, 'dave')
+        self.assertNotIn('dave', self.pool)
+
+    def test_password_function(self):
+        pool = SessionPool(self.baseurl, lambda username: username[::-1])
+        self.assertEqual(pool.get('alice').password, 'ecila')
+        pool.close()
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,97 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""test_tree.py -
+
+functions:
+
+walk
+
+Uses a stub client, no DMS is needed.
+"""
+
+__author__ = "John van Zantvoort"
+
+import threading
+import unittest
+
+from seeddms.exceptions import SeedDMSException
+from seeddms.tree import walk
+
+
+class StubClient(object):
+    """folders DMS, DMS/aotearoa, DMS/aotearoa/2014 and DMS/archive with one
+    document each; listing a folder in ``failing`` raises an exception."""
+
+    def __init__(self):
+        self.folders = {1: ('DMS', None), 2: ('aotearoa', 1), 3: ('archive', 1),
+                        4: ('2014', 2)}
+        self.failing = set()
+        self.listed = list()
+        self.lock = threading.Lock()
+
+    def get_folder(self, folder_id):
+        if folder_id not in self.folders:
+            return None
+        return {'id': folder_id, 'name': self.folders[folder_id][0],
+                'type': 'folder'}
+
+    def get_folder_children(self, folder_id):
+        with self.lock:
+            self.listed.append(folder_id)
+        if folder_id in self.failing:
+            raise SeedDMSException("failed to list folder %s" % folder_id)
+        retv = [{'id': idn, 'name': name, 'type': 'folder'}
+                for idn, (name, parent) in sorted(self.folders.items())
+                if parent == folder_id]
+        retv.append({'id': folder_id + 10, 'name': 'notes', 'type': 'document'})
+        return retv
+
+
+class TestWalk(unittest.TestCase):
+
+    def setUp(self):
+        self.sdms = StubClient()
+
+    def walked(self, **kwargs):
+        retv = dict()
+        for folder, folders, documents in walk(self.sdms, 1, **kwargs):
+            retv[folder['id']] = ([x['id'] for x in folders],
+                                  [x['id'] for x in documents])
+        return retv
+
+    def test_walk(self):
+        self.assertEqual(self.walked(), {1: ([2, 3], [11]), 2: ([4], [12]),
+                                         3: ([], [13]), 4: ([], [14])})
+
+    def test_maxdepth(self):
+        self.assertEqual(self.walked(maxdepth=0).keys(), [1])
+        self.assertEqual(sorted(self.walked(maxdepth=1)), [1, 2, 3])
+        self.assertNotIn(4, self.sdms.listed)
+
+    def test_folder_filter(self):
+        walked = self.walked(folder_filter=lambda row: row['name'] != 'archive')
+        self.assertEqual(sorted(walked), [1, 2, 4])
+        # the folder is listed, not descended into
+        self.assertEqual(walked[1][0], [2, 3])
+        self.assertNotIn(3, self.sdms.listed)
+
+    def test_prune(self):
+        found = list()
+        for folder, folders, _ in walk(self.sdms, 1):
+            found.append(folder['id'])
+            folders[:] = [x for x in folders if x['name'] != 'aotearoa']
+        self.assertEqual(sorted(found), [1, 3])
+        self.assertEqual(sorted(self.sdms.listed), [1, 3])
+
+    def test_failing_listing(self):
+        self.sdms.failing.add(4)
+        self.assertRaises(SeedDMSException, self.walked)
+
+        self.sdms.failing = set([1])
+        self.assertRaises(SeedDMSException, self.walked)
+
+    def test_unknown_top(self):
+        self.assertEqual(list(walk(self.sdms, 5)), [])
+
+if __name__ == '__main__':
+    unittest.main()
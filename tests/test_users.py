@@ -123,5 +123,16 @@ class TestGetLockedDocuments(SeedDMSWrapper):
         retv = self.sdms.get_locked_documents()
         self.assertTrue(isinstance(retv, list), "get_locked_documents returns a list item")
 
+class TestDirectory(SeedDMSWrapper):
+
+    def test_get_user_by_name_cached(self):
+        self.sdms.get_user_by_name('admin')
+        misses = self.sdms.directory.misses
+
+        test_data = self.sdms.get_user_by_name('admin')
+
+        self.assertEqual(misses, self.sdms.directory.misses)
+        self.assertEqual(test_data.get('login'), 'admin')
+
 if __name__ == '__main__':
     unittest.main()